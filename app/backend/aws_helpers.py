@@ -5,10 +5,173 @@
     Series of helper functions for working with AWS
 
 """
+import io
+import os
+import time
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import boto3
+import boto3.session
+import pandas as pd
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from s3_object_cache import S3ObjectCache
+from stream_compression import infer_compression, CompressingReader, DecompressingWriter
 
+# transfers of files above MULTIPART_THRESHOLD are split into parts of MULTIPART_CHUNKSIZE,
+# sent MAX_CONCURRENCY at a time
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 16 * 1024 * 1024
+MAX_CONCURRENCY = 10
 
-def save_to_AWS(local_file, s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret):
+# max number of objects transferred at the same time by 'upload_many' / 'download_many'
+MAX_TRANSFER_WORKERS = 8
+
+# size of the connection pool of each client (enough for the parts of MAX_TRANSFER_WORKERS
+# concurrent transfers)
+MAX_POOL_CONNECTIONS = MAX_TRANSFER_WORKERS * MAX_CONCURRENCY
+
+TRANSFER_CONFIG = TransferConfig(multipart_threshold=MULTIPART_THRESHOLD,
+                                 multipart_chunksize=MULTIPART_CHUNKSIZE,
+                                 max_concurrency=MAX_CONCURRENCY,
+                                 use_threads=True)
+
+# local cache of S3 objects (see 'get_object_cache'); the directory and size cap can be set
+# with the S3_CACHE_DIR and S3_CACHE_MAX_BYTES env vars
+DEFAULT_S3_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    "..", "..", "tweets", "s3_cache")
+DEFAULT_S3_CACHE_MAX_BYTES = 10 * 1024 ** 3
+
+# sessions and clients of this process, by credentials (see 'get_session' and 'get_client')
+_SESSIONS = {}
+_CLIENTS = {}
+_OBJECT_CACHE = None
+_LOCK = threading.Lock()
+
+
+class FilesystemClient:
+    """
+    Stand-in for an S3 client that stores objects as files under a local directory
+    ("<root>/<bucket>/<key>"), for running the scripts (or testing them) without S3.
+    Only has the transfer methods used by these helpers.
+
+    Arg:
+        root: directory (str) of the objects
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, Bucket, Key):
+        return os.path.join(self.root, Bucket, *Key.split("/"))
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, **kwargs):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # written to a temporary file first, so an object is never half-written
+        with open(path + ".tmp", "wb") as f:
+            shutil.copyfileobj(Fileobj, f)
+
+        os.replace(path + ".tmp", path)
+
+    def download_fileobj(self, Bucket, Key, Fileobj, **kwargs):
+        with open(self._path(Bucket, Key), "rb") as f:
+            shutil.copyfileobj(f, Fileobj)
+
+    def upload_file(self, Filename, Bucket, Key, **kwargs):
+        with open(Filename, "rb") as f:
+            self.upload_fileobj(f, Bucket, Key)
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        with open(Filename, "wb") as f:
+            self.download_fileobj(Bucket, Key, f)
+
+    def head_object(self, Bucket, Key, **kwargs):
+        # the ETag changes whenever the file is rewritten
+        stat = os.stat(self._path(Bucket, Key))
+
+        return {"ETag": f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+                "ContentLength": stat.st_size}
+
+
+def get_session(AWS_access, AWS_secret):
+    """
+    Gets the boto3 session of this process for a set of credentials, creating it on first use
+
+    Args:
+        AWS_access: AWS access key
+        AWS_secret: AWS secret key
+    Returns:
+        session: boto3 Session
+    """
+    with _LOCK:
+        key = (AWS_access, AWS_secret)
+
+        if key not in _SESSIONS:
+            _SESSIONS[key] = boto3.session.Session(aws_access_key_id=AWS_access,
+                                                   aws_secret_access_key=AWS_secret)
+
+        return _SESSIONS[key]
+
+
+def get_client(AWS_resource, AWS_access, AWS_secret, endpoint_url=None):
+    """
+    Gets the client of this process for an AWS resource, creating it on first use. Clients are
+    thread-safe, so one client (and its pool of connections) is shared by the whole process.
+
+    Args:
+        AWS_resource: the AWS resource used (e.g., "s3", "ec2", "dynamodb")
+        AWS_access: AWS access key
+        AWS_secret: AWS secret key
+        endpoint_url: URL (str) of an S3-compatible endpoint to use instead of AWS (optional,
+        defaults to the AWS_ENDPOINT_URL env var)
+    Returns:
+        client: boto3 client, or if the AWS_FILESYSTEM_ROOT env var is set, a FilesystemClient
+        that stores the objects under that directory
+    """
+    if os.environ.get("AWS_FILESYSTEM_ROOT"):
+        return FilesystemClient(os.environ["AWS_FILESYSTEM_ROOT"])
+
+    if endpoint_url is None:
+        endpoint_url = os.environ.get("AWS_ENDPOINT_URL")
+
+    session = get_session(AWS_access, AWS_secret)
+
+    # sessions aren't thread-safe, so clients are created under the lock
+    with _LOCK:
+        key = (AWS_resource, AWS_access, AWS_secret, endpoint_url)
+
+        if key not in _CLIENTS:
+            _CLIENTS[key] = session.client(AWS_resource,
+                                           endpoint_url=endpoint_url,
+                                           config=Config(max_pool_connections=MAX_POOL_CONNECTIONS,
+                                                         retries={"max_attempts": 5, "mode": "standard"}))
+
+        return _CLIENTS[key]
+
+
+def get_object_cache():
+    """
+    Gets the local cache of S3 objects of this process, opening it on first use
+
+    Returns:
+        cache: S3ObjectCache
+    """
+    global _OBJECT_CACHE
+
+    with _LOCK:
+        if _OBJECT_CACHE is None:
+            _OBJECT_CACHE = S3ObjectCache(os.environ.get("S3_CACHE_DIR", DEFAULT_S3_CACHE_DIR),
+                                          int(os.environ.get("S3_CACHE_MAX_BYTES",
+                                                             DEFAULT_S3_CACHE_MAX_BYTES)))
+
+        return _OBJECT_CACHE
+
+
+def save_to_AWS(local_file, s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret, compression=None):
     """
 
     Saves a local file to AWS
@@ -20,14 +183,18 @@ def save_to_AWS(local_file, s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_s
         AWS_bucket: name of S3 bucket
         AWS_access: AWS access key
         AWS_secret: AWS secret key
+        compression: compress the file as it is uploaded (no compressed local file): None,
+        "infer" (from the extension of 's3_file', e.g. ".zst"), "gzip" or "zstd" (str)
+    Returns:
+        num_bytes: number of bytes (int) uploaded, i.e. the compressed size if the file is
+        compressed on the way
 
     """
+    compression = infer_compression(s3_file, compression)
 
-    # connect boto3 wih AWS
+    # connect boto3 wih AWS (reusing the client of this process)
     try:
-        s3 = boto3.client(AWS_resource,
-                          aws_access_key_id=AWS_access,
-                          aws_secret_access_key=AWS_secret)
+        s3 = get_client(AWS_resource, AWS_access, AWS_secret)
     except Exception as e:
         print("Connection with AWS unsuccessful")
         print(e)
@@ -35,16 +202,25 @@ def save_to_AWS(local_file, s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_s
 
     # upload data to AWS
     try:
-        s3.upload_file(local_file, AWS_bucket, s3_file)
+        if compression is None:
+            s3.upload_file(local_file, AWS_bucket, s3_file,
+                           Config=TRANSFER_CONFIG)
+            num_bytes = os.path.getsize(local_file)
+        else:
+            with open(local_file, "rb") as f:
+                reader = CompressingReader(f, compression)
+                s3.upload_fileobj(reader, AWS_bucket, s3_file,
+                                  Config=TRANSFER_CONFIG)
+            num_bytes = reader.bytes_out
     except Exception as e:
         print("Error in uploading data to AWS")
         print(e)
         raise ValueError("Please fix error in uploading data to AWS")
-    finally:
-        return None
+
+    return num_bytes
 
 
-def load_from_AWS(local_file, s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret):
+def load_from_AWS(local_file, s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret, compression=None):
     """
 
     Loads a file from an AWS resource (likely to be 's3')
@@ -56,24 +232,406 @@ def load_from_AWS(local_file, s3_file, AWS_resource, AWS_bucket, AWS_access, AWS
         AWS_bucket: name of S3 bucket
         AWS_access: AWS access key
         AWS_secret: AWS secret key
+        compression: decompress the file as it is downloaded (no compressed local file): None,
+        "infer" (from the extension of 's3_file', e.g. ".zst"), "gzip" or "zstd" (str)
     """
-    # connect boto3 wih AWS
+    compression = infer_compression(s3_file, compression)
+
+    # connect boto3 wih AWS (reusing the client of this process)
     try:
-        s3 = boto3.client(AWS_resource,
-                          aws_access_key_id=AWS_access,
-                          aws_secret_access_key=AWS_secret)
+        s3 = get_client(AWS_resource, AWS_access, AWS_secret)
     except Exception as e:
         print("Connection with AWS unsuccessful")
         print(e)
         raise ValueError("Please fix connection error to AWS resource")
 
     try:
-        s3.download_file(Bucket=AWS_bucket, Key=s3_file, Filename=local_file)
+        if compression is None:
+            s3.download_file(Bucket=AWS_bucket, Key=s3_file, Filename=local_file,
+                             Config=TRANSFER_CONFIG)
+        else:
+            with open(local_file, "wb") as f:
+                writer = DecompressingWriter(f, compression)
+                s3.download_fileobj(AWS_bucket, s3_file, writer,
+                                    Config=TRANSFER_CONFIG)
+                writer.close()
 
     except Exception as e:
         print("Unable to download file from AWS to local storage")
         print(e)
         raise ValueError("Please fix error")
 
-    finally:
-        return None
+
+def save_fileobj_to_AWS(fileobj, s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret, compression="infer"):
+    """
+
+    Saves the content of a file-like object (e.g., an io.BytesIO buffer) to AWS, without a local file
+
+    Args:
+        fileobj: binary file-like object to read the content from
+        s3_file: path (str) of file within the S3 bucket
+        AWS_resource: the AWS resource used (e.g., "s3", "ec2", "dynamodb")
+        AWS_bucket: name of S3 bucket
+        AWS_access: AWS access key
+        AWS_secret: AWS secret key
+        compression: compress the content as it is uploaded: "infer" (from the extension
+        of 's3_file', e.g. ".gz"), None, "gzip" or "zstd" (str)
+    Returns:
+        num_bytes: number of bytes (int) uploaded
+
+    """
+    compression = infer_compression(s3_file, compression)
+
+    if isinstance(fileobj, io.BytesIO):
+        fileobj.seek(0)
+        num_bytes = fileobj.getbuffer().nbytes
+    else:
+        num_bytes = None
+
+    if compression is not None:
+        fileobj = CompressingReader(fileobj, compression)
+
+    s3 = get_client(AWS_resource, AWS_access, AWS_secret)
+
+    try:
+        s3.upload_fileobj(fileobj, AWS_bucket, s3_file,
+                          Config=TRANSFER_CONFIG)
+    except Exception as e:
+        print("Error in uploading data to AWS")
+        print(e)
+        raise ValueError("Please fix error in uploading data to AWS")
+
+    if compression is not None:
+        num_bytes = fileobj.bytes_out
+
+    return num_bytes
+
+
+def load_fileobj_from_AWS(s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret, compression="infer"):
+    """
+
+    Loads a file from AWS into memory, without a local file
+
+    Args:
+        s3_file: path (str) of file within the S3 bucket
+        AWS_resource: the AWS resource used (e.g., "s3", "ec2", "dynamodb")
+        AWS_bucket: name of S3 bucket
+        AWS_access: AWS access key
+        AWS_secret: AWS secret key
+        compression: decompress the content as it is downloaded: "infer" (from the extension
+        of 's3_file', e.g. ".gz"), None, "gzip" or "zstd" (str)
+    Returns:
+        buffer: the (decompressed) content of the file (io.BytesIO, at position 0)
+
+    """
+    compression = infer_compression(s3_file, compression)
+    buffer = io.BytesIO()
+    target = DecompressingWriter(buffer, compression) if compression is not None else buffer
+
+    s3 = get_client(AWS_resource, AWS_access, AWS_secret)
+
+    try:
+        s3.download_fileobj(AWS_bucket, s3_file, target,
+                            Config=TRANSFER_CONFIG)
+
+        if compression is not None:
+            target.close()
+    except Exception as e:
+        print("Unable to download file from AWS")
+        print(e)
+        raise ValueError("Please fix error")
+
+    buffer.seek(0)
+
+    return buffer
+
+
+def save_df_to_AWS(df, s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret, compression="infer", **to_csv_kwargs):
+    """
+
+    Saves a pandas df to AWS as a .csv file, serialized in memory (no local file)
+
+    Args:
+        df: pandas df to save
+        s3_file: path (str) of file within the S3 bucket
+        AWS_resource, AWS_bucket, AWS_access, AWS_secret: see 'save_fileobj_to_AWS'
+        compression: see 'save_fileobj_to_AWS'
+        to_csv_kwargs: args of 'df.to_csv' (e.g., index=False)
+    Returns:
+        num_bytes: number of bytes (int) uploaded
+
+    """
+    buffer = io.BytesIO(df.to_csv(**to_csv_kwargs).encode("utf-8"))
+
+    return save_fileobj_to_AWS(buffer, s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret,
+                               compression=compression)
+
+
+def load_df_from_AWS(s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret, compression="infer", **read_csv_kwargs):
+    """
+
+    Loads a .csv file from AWS into a pandas df, in memory (no local file)
+
+    Args:
+        s3_file: path (str) of file within the S3 bucket
+        AWS_resource, AWS_bucket, AWS_access, AWS_secret: see 'load_fileobj_from_AWS'
+        compression: see 'load_fileobj_from_AWS'
+        read_csv_kwargs: args of 'pd.read_csv' (e.g., usecols)
+    Returns:
+        df: pandas df
+
+    """
+    buffer = load_fileobj_from_AWS(s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret,
+                                   compression=compression)
+
+    return pd.read_csv(buffer, **read_csv_kwargs)
+
+
+def exists_in_AWS(s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret):
+    """
+
+    Checks whether a file exists in AWS (errors other than a missing file are raised)
+
+    Args:
+        s3_file: path (str) of file within the S3 bucket
+        AWS_resource: the AWS resource used (e.g., "s3", "ec2", "dynamodb")
+        AWS_bucket: name of S3 bucket
+        AWS_access: AWS access key
+        AWS_secret: AWS secret key
+    Returns:
+        exists: does the file exist? (bool)
+
+    """
+    s3 = get_client(AWS_resource, AWS_access, AWS_secret)
+
+    try:
+        s3.head_object(Bucket=AWS_bucket, Key=s3_file)
+    except FileNotFoundError:
+        return False
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+    return True
+
+
+def _run_transfers(transfers, max_workers):
+    """
+    Runs transfers on a pool of threads, timing each of them
+
+    Args:
+        transfers: dict of s3_file (str) -> function (no args) that transfers the object and
+        returns its result (dict with at least "num_bytes")
+        max_workers: max number of transfers (int) at the same time
+    Returns:
+        results: dict of s3_file -> result of the transfer, with its "seconds" added
+        failures: dict of s3_file -> exception, for the transfers that failed
+    """
+    def timed(transfer):
+        start = time.perf_counter()
+        result = transfer()
+        result["seconds"] = time.perf_counter() - start
+
+        return result
+
+    results = {}
+    failures = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(transfers)))) as executor:
+        futures = {s3_file: executor.submit(timed, transfer)
+                   for s3_file, transfer in transfers.items()}
+
+        for s3_file, future in futures.items():
+            try:
+                results[s3_file] = future.result()
+            except Exception as e:
+                failures[s3_file] = e
+
+    return (results, failures)
+
+
+def upload_many(uploads, AWS_resource, AWS_bucket, AWS_access, AWS_secret, max_workers=MAX_TRANSFER_WORKERS):
+    """
+
+    Uploads several objects to AWS at the same time, on a pool of threads (sharing the client
+    of this process). A failed upload doesn't stop the others.
+
+    Args:
+        uploads: list of (source, s3_file) tuples; a source is the path (str) of a local file, a
+        pandas df (uploaded as .csv, see 'save_df_to_AWS') or a binary file-like object
+        AWS_resource: the AWS resource used (e.g., "s3", "ec2", "dynamodb")
+        AWS_bucket: name of S3 bucket
+        AWS_access: AWS access key
+        AWS_secret: AWS secret key
+        max_workers: max number of uploads (int) at the same time
+    Returns:
+        results: dict of s3_file -> {"seconds": time of the upload (float), "num_bytes": bytes uploaded (int)},
+        for the uploaded objects
+        failures: dict of s3_file -> exception, for the objects that couldn't be uploaded
+
+    """
+    def upload(source, s3_file):
+        if isinstance(source, str):
+            get_client(AWS_resource, AWS_access, AWS_secret).upload_file(source, AWS_bucket, s3_file,
+                                                                         Config=TRANSFER_CONFIG)
+            num_bytes = os.path.getsize(source)
+        elif isinstance(source, pd.DataFrame):
+            num_bytes = save_df_to_AWS(source, s3_file, AWS_resource,
+                                       AWS_bucket, AWS_access, AWS_secret)
+        else:
+            num_bytes = save_fileobj_to_AWS(source, s3_file, AWS_resource,
+                                            AWS_bucket, AWS_access, AWS_secret)
+
+        return {"num_bytes": num_bytes}
+
+    return _run_transfers({s3_file: (lambda source=source, s3_file=s3_file: upload(source, s3_file))
+                           for source, s3_file in uploads},
+                          max_workers)
+
+
+def download_many(downloads, AWS_resource, AWS_bucket, AWS_access, AWS_secret, max_workers=MAX_TRANSFER_WORKERS):
+    """
+
+    Downloads several objects from AWS at the same time, on a pool of threads (sharing the
+    client of this process). A failed download doesn't stop the others.
+
+    Args:
+        downloads: list of (s3_file, local_file) tuples; if local_file is None, the object is
+        downloaded into memory (see 'load_fileobj_from_AWS')
+        AWS_resource: the AWS resource used (e.g., "s3", "ec2", "dynamodb")
+        AWS_bucket: name of S3 bucket
+        AWS_access: AWS access key
+        AWS_secret: AWS secret key
+        max_workers: max number of downloads (int) at the same time
+    Returns:
+        results: dict of s3_file -> {"seconds": time of the download (float), "num_bytes": size of the
+        local file or of the (decompressed) buffer (int), "buffer": content of the object (io.BytesIO),
+        for in-memory downloads},
+        for the downloaded objects
+        failures: dict of s3_file -> exception, for the objects that couldn't be downloaded
+
+    """
+    def download(s3_file, local_file):
+        if local_file is None:
+            buffer = load_fileobj_from_AWS(s3_file, AWS_resource,
+                                           AWS_bucket, AWS_access, AWS_secret)
+
+            return {"num_bytes": buffer.getbuffer().nbytes, "buffer": buffer}
+
+        get_client(AWS_resource, AWS_access, AWS_secret).download_file(Bucket=AWS_bucket, Key=s3_file,
+                                                                       Filename=local_file,
+                                                                       Config=TRANSFER_CONFIG)
+
+        return {"num_bytes": os.path.getsize(local_file)}
+
+    return _run_transfers({s3_file: (lambda s3_file=s3_file, local_file=local_file: download(s3_file, local_file))
+                           for s3_file, local_file in downloads},
+                          max_workers)
+
+
+def fetch_from_AWS(s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret):
+    """
+
+    Gets a local copy of a file in AWS, through the local cache of S3 objects: the file is only
+    downloaded if it isn't cached, or has changed in AWS since it was cached
+
+    Args:
+        s3_file: path (str) of file within the S3 bucket
+        AWS_resource: the AWS resource used (e.g., "s3", "ec2", "dynamodb")
+        AWS_bucket: name of S3 bucket
+        AWS_access: AWS access key
+        AWS_secret: AWS secret key
+    Returns:
+        path: path (str) of the cached copy of the file (to be read, not modified or deleted)
+
+    """
+    s3 = get_client(AWS_resource, AWS_access, AWS_secret)
+
+    try:
+        return get_object_cache().fetch(s3, AWS_bucket, s3_file, TRANSFER_CONFIG)
+    except Exception as e:
+        print("Unable to download file from AWS to local storage")
+        print(e)
+        raise ValueError("Please fix error")
+
+
+def cache_uploaded_file(local_file, s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret):
+    """
+
+    Moves a local file that has been uploaded to AWS into the local cache of S3 objects
+    (instead of deleting it), so that it isn't downloaded again by a later stage or run
+
+    Args:
+        local_file: path (str) of the uploaded local file (it is consumed)
+        s3_file: path (str) of the file within the S3 bucket
+        AWS_resource: the AWS resource used (e.g., "s3", "ec2", "dynamodb")
+        AWS_bucket: name of S3 bucket
+        AWS_access: AWS access key
+        AWS_secret: AWS secret key
+    Returns:
+        path: path (str) of the cached copy of the file
+
+    """
+    s3 = get_client(AWS_resource, AWS_access, AWS_secret)
+
+    return get_object_cache().add(s3, AWS_bucket, s3_file, local_file)
+
+
+def restore_from_AWS(local_file, s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret):
+    """
+
+    Replaces a local file that records the state of incremental runs (e.g. a store of tweet IDs,
+    or a manifest of partitions) with its copy in AWS, if there is one, so that a run on a fresh
+    machine picks up where the last run left off. The copy is fetched through the local cache
+    of S3 objects, so it is only downloaded if this machine hasn't seen it yet.
+
+    Args:
+        local_file: path (str) of the local file (it doesn't have to exist yet)
+        s3_file: path (str) of file within the S3 bucket
+        AWS_resource: the AWS resource used (e.g., "s3", "ec2", "dynamodb")
+        AWS_bucket: name of S3 bucket
+        AWS_access: AWS access key
+        AWS_secret: AWS secret key
+    Returns:
+        restored: was there a copy in AWS? (bool); if not, the local file is left as is
+
+    """
+    if not exists_in_AWS(s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret):
+        return False
+
+    cached_path = fetch_from_AWS(s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret)
+
+    # the cached copy is only to be read, while the local file is updated by the run
+    tmp_path = local_file + ".tmp"
+    shutil.copyfile(cached_path, tmp_path)
+    os.replace(tmp_path, local_file)
+
+    return True
+
+
+def save_state_to_AWS(local_file, s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret):
+    """
+
+    Saves a local file that records the state of incremental runs to AWS (see 'restore_from_AWS'),
+    and puts a copy of it in the local cache of S3 objects, so that the next run on this machine
+    doesn't download it again
+
+    Args:
+        local_file: path (str) of the local file (it is kept)
+        s3_file: path (str) of file within the S3 bucket
+        AWS_resource: the AWS resource used (e.g., "s3", "ec2", "dynamodb")
+        AWS_bucket: name of S3 bucket
+        AWS_access: AWS access key
+        AWS_secret: AWS secret key
+    Returns:
+        num_bytes: number of bytes (int) uploaded
+
+    """
+    num_bytes = save_to_AWS(local_file, s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret)
+
+    tmp_path = local_file + ".tmp"
+    shutil.copyfile(local_file, tmp_path)
+    cache_uploaded_file(tmp_path, s3_file, AWS_resource, AWS_bucket, AWS_access, AWS_secret)
+
+    return num_bytes
@@ -0,0 +1,504 @@
+"""
+
+    run_benchmarks.py
+
+    Benchmarks the preprocessing hot paths on synthetic tweets (see 'synthetic_tweets.py'):
+
+        - throughput (rows/sec) of each preprocessing function, both the original per-row
+          functions (see 'reference_preprocessing.py') and their column-level replacements
+        - end-to-end rows/sec and peak memory of preprocessing a hydrated tweets .csv file,
+          loading the whole file and streaming it in chunks (each run in a fresh process,
+          so its peak memory is measured on its own)
+        - compression of the hydrated and preprocessed tweets .csv files with gzip and zstd:
+          bytes saved, CPU time to compress and decompress, and the time to upload the file
+          (compressing it on the way) at a few network bandwidths, against the uncompressed file.
+          Real artifacts can be benchmarked too, with '--compression-files'.
+
+    Results are saved as JSON, so runs of different versions can be compared:
+
+        python run_benchmarks.py --sizes 10000 100000 1000000
+        python run_benchmarks.py --compression-files ../../../tweets/hydrated_tweets/*.csv
+        python run_benchmarks.py --compare results/old.json results/new.json
+
+"""
+import os
+import sys
+import io
+import json
+import time
+import argparse
+import platform
+import datetime
+import resource
+import tempfile
+import subprocess
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+import preprocess_tweets  # noqa: E402
+import reference_preprocessing  # noqa: E402
+import stream_compression  # noqa: E402
+from stream_compression import CompressingReader, DecompressingWriter  # noqa: E402
+from tweet_text import TweetTextNormalizer, TweetTextAnalyzer  # noqa: E402
+from synthetic_tweets import generate_tweets  # noqa: E402
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+DEFAULT_RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+
+# the original per-row functions are slow, so they are timed on at most this many rows
+DEFAULT_MAX_PER_ROW = 20000
+
+# rows per chunk in the streaming end-to-end benchmark
+DEFAULT_STREAMING_CHUNK_SIZE = 20000
+
+# (compression, level) pairs of the compression benchmark (zstd ones are skipped if the
+# 'zstandard' package isn't installed)
+COMPRESSION_SETTINGS = [("gzip", 1), ("gzip", 6), ("zstd", 1), ("zstd", 3), ("zstd", 9)]
+
+# network bandwidths (MB/s) that the upload times of the compression benchmark are estimated at
+DEFAULT_BANDWIDTHS = [10, 100]
+
+
+def _peak_rss_bytes():
+    """
+    Returns:
+        peak_rss: peak resident memory of this process so far, in bytes (int)
+    """
+    # on Linux, ru_maxrss carries over the parent's peak into a spawned child,
+    # while the VmHWM of the process itself is reset
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is in bytes on macOS, in kilobytes on Linux
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def _time_rows(func, num_rows):
+    """
+    Times a function that processes 'num_rows' rows
+
+    Args:
+        func: function to time (no args)
+        num_rows: number of rows processed by 'func' (int)
+    Returns:
+        result: dict with the number of rows, seconds and rows/sec
+    """
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+
+    return {"rows": num_rows,
+            "seconds": seconds,
+            "rows_per_sec": num_rows / seconds if seconds > 0 else float("inf")}
+
+
+def benchmark_functions(tweets_df, max_per_row=DEFAULT_MAX_PER_ROW):
+    """
+    Measures the throughput of each preprocessing function
+
+    Args:
+        tweets_df: pandas df of hydrated tweets
+        max_per_row: max number of rows (int) to time the original per-row functions on
+    Returns:
+        results: dict of function name -> dict with the rows, seconds and rows/sec
+    """
+    sample_df = tweets_df.iloc[:max_per_row]
+    texts = list(sample_df["full_text"])
+    timestamps = list(sample_df["created_at"])
+    places = list(sample_df["place"])
+    location_dicts = [preprocess_tweets.try_literal_eval(place)
+                      for place in places]
+
+    normalizer = TweetTextNormalizer()
+    analyzer = TweetTextAnalyzer(normalizer)
+    num_sample = len(texts)
+    num_rows = tweets_df.shape[0]
+
+    return {
+        # original per-row functions
+        "clean_text": _time_rows(lambda: [reference_preprocessing.clean_text(text) for text in texts], num_sample),
+        "remove_emoji": _time_rows(lambda: [reference_preprocessing.remove_emoji(text) for text in texts], num_sample),
+        "parse_hashtags": _time_rows(lambda: [reference_preprocessing.parse_hashtags(text) for text in texts], num_sample),
+        "count_hashtags": _time_rows(lambda: [reference_preprocessing.count_hashtags(text) for text in texts], num_sample),
+        "try_literal_eval": _time_rows(lambda: [preprocess_tweets.try_literal_eval(place) for place in places], num_sample),
+        "parse_location": _time_rows(lambda: [preprocess_tweets.parse_location(location_dict)
+                                              for location_dict in location_dicts], num_sample),
+        "parse_dates": _time_rows(lambda: [reference_preprocessing.parse_dates(timestamp) for timestamp in timestamps], num_sample),
+
+        # replacements, on all the rows
+        "TweetTextNormalizer.tokenize": _time_rows(lambda: [normalizer.tokenize(text) for text in tweets_df["full_text"]],
+                                                   num_rows),
+        "TweetTextAnalyzer.analyze_series": _time_rows(lambda: analyzer.analyze_series(tweets_df["full_text"]),
+                                                       num_rows),
+        "PlaceDecoder.decode_column": _time_rows(lambda: preprocess_tweets.PlaceDecoder().decode_column(tweets_df["place"]),
+                                                 num_rows),
+        "parse_dates_column": _time_rows(lambda: preprocess_tweets.parse_dates_column(tweets_df["created_at"]),
+                                         num_rows),
+    }
+
+
+def _run_end_to_end(input_path, output_path, mode, chunk_size):
+    """
+    Preprocesses a hydrated tweets .csv file (run in a fresh process)
+
+    Args:
+        input_path: path (str) of the hydrated tweets .csv file
+        output_path: path (str) of the preprocessed .csv file to write
+        mode: "whole_file" (load the whole file) or "streaming" (str)
+        chunk_size: number of rows per chunk (int) in "streaming" mode
+    Returns:
+        seconds: wall time of the preprocessing (float)
+        baseline_rss: peak memory before preprocessing, in bytes (int)
+        peak_rss: peak memory after preprocessing, in bytes (int)
+    """
+    baseline_rss = _peak_rss_bytes()
+    start = time.perf_counter()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "streaming":
+            preprocess_tweets.preprocess_tweets_csv_streaming(input_path,
+                                                              output_path,
+                                                              chunk_size)
+        else:
+            tweets_df = pd.read_csv(input_path)[
+                preprocess_tweets.TWEET_COLUMNS]
+            preprocess_tweets.preprocess_tweets_df(
+                tweets_df).to_csv(output_path)
+
+    seconds = time.perf_counter() - start
+
+    return (seconds, baseline_rss, _peak_rss_bytes())
+
+
+def benchmark_end_to_end(tweets_df, work_dir, chunk_size=DEFAULT_STREAMING_CHUNK_SIZE):
+    """
+    Measures the end-to-end rows/sec and peak memory of preprocessing a hydrated tweets .csv file
+
+    Args:
+        tweets_df: pandas df of hydrated tweets
+        work_dir: directory (str) to write the input and output files to
+        chunk_size: number of rows per chunk (int) when streaming
+    Returns:
+        results: dict of mode -> dict with the rows, seconds, rows/sec, peak memory and
+        peak memory above the baseline of a fresh process (in bytes)
+    """
+    input_path = os.path.join(work_dir, "hydrated_tweets.csv")
+    output_path = os.path.join(work_dir, "preprocessed_tweets.csv")
+    tweets_df.to_csv(input_path)
+
+    num_rows = tweets_df.shape[0]
+    results = {}
+
+    for mode in ["whole_file", "streaming"]:
+
+        # "spawn" so that the child doesn't inherit this process's memory
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            seconds, baseline_rss, peak_rss = executor.submit(
+                _run_end_to_end, input_path, output_path, mode, chunk_size).result()
+
+        results[mode] = {"rows": num_rows,
+                         "seconds": seconds,
+                         "rows_per_sec": num_rows / seconds,
+                         "peak_rss_bytes": peak_rss,
+                         "peak_rss_above_baseline_bytes": peak_rss - baseline_rss,
+                         "input_bytes": os.path.getsize(input_path),
+                         "output_bytes": os.path.getsize(output_path)}
+
+    return results
+
+
+class _NullWriter(io.RawIOBase):
+    """
+    Binary sink that only counts the bytes written to it
+    """
+
+    def __init__(self):
+        self.num_bytes = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.num_bytes += len(b)
+        return len(b)
+
+
+def benchmark_compression(paths, bandwidths=DEFAULT_BANDWIDTHS):
+    """
+    Measures how well, and how fast, files compress with each of the COMPRESSION_SETTINGS.
+    The upload time of a compressed file is estimated as the time to compress it plus the
+    time to send the compressed bytes, as the compression is streamed into the upload
+    (and likewise for a download); the uncompressed file only has the time to send it.
+
+    Args:
+        paths: paths (list of str) of the files to compress
+        bandwidths: network bandwidths (list of float), in MB/s
+    Returns:
+        results: dict of filename -> dict of "<compression>-<level>" (or "none") -> dict with
+        the bytes, bytes saved, ratio, compress / decompress seconds and MB/s, and the
+        estimated upload and download seconds at each bandwidth
+    """
+    results = {}
+
+    for path in paths:
+        num_bytes = os.path.getsize(path)
+        file_results = {"none": {"bytes": num_bytes,
+                                 "bytes_saved": 0,
+                                 "ratio": 1.0,
+                                 "compress_seconds": 0.0,
+                                 "decompress_seconds": 0.0}}
+
+        for compression, level in COMPRESSION_SETTINGS:
+            if compression == "zstd" and stream_compression.zstandard is None:
+                continue
+
+            compressed = io.BytesIO()
+            start = time.perf_counter()
+
+            with open(path, "rb") as f:
+                reader = CompressingReader(f, compression, level)
+
+                for block in iter(lambda: reader.read(stream_compression.BLOCK_SIZE), b""):
+                    compressed.write(block)
+
+            compress_seconds = time.perf_counter() - start
+
+            sink = _NullWriter()
+            start = time.perf_counter()
+            writer = DecompressingWriter(sink, compression)
+            writer.write(compressed.getbuffer())
+            writer.close()
+            decompress_seconds = time.perf_counter() - start
+
+            if sink.num_bytes != num_bytes:
+                raise ValueError(
+                    f"{compression}-{level} didn't round-trip {path}")
+
+            compressed_bytes = compressed.getbuffer().nbytes
+            file_results[f"{compression}-{level}"] = {"bytes": compressed_bytes,
+                                                      "bytes_saved": num_bytes - compressed_bytes,
+                                                      "ratio": num_bytes / compressed_bytes,
+                                                      "compress_seconds": compress_seconds,
+                                                      "decompress_seconds": decompress_seconds,
+                                                      "compress_mb_per_sec": num_bytes / 1e6 / compress_seconds,
+                                                      "decompress_mb_per_sec": num_bytes / 1e6 / decompress_seconds}
+
+        for result in file_results.values():
+            for bandwidth in bandwidths:
+                transfer_seconds = result["bytes"] / 1e6 / bandwidth
+                result[f"upload_seconds_at_{bandwidth:g}_mb_per_sec"] = result["compress_seconds"] + \
+                    transfer_seconds
+                result[f"download_seconds_at_{bandwidth:g}_mb_per_sec"] = result["decompress_seconds"] + \
+                    transfer_seconds
+
+        results[os.path.basename(path)] = file_results
+
+    return results
+
+
+def _git_commit():
+    """
+    Returns:
+        commit: hash of the current git commit (str), or None if not in a git repo
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BENCHMARKS_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(sizes, max_per_row=DEFAULT_MAX_PER_ROW, chunk_size=DEFAULT_STREAMING_CHUNK_SIZE, seed=0,
+                   compression_files=None, bandwidths=DEFAULT_BANDWIDTHS):
+    """
+    Runs all of the benchmarks for each number of rows
+
+    Args:
+        sizes: numbers of synthetic tweets to benchmark on (list of int)
+        max_per_row: max number of rows (int) to time the original per-row functions on
+        chunk_size: number of rows per chunk (int) in the streaming end-to-end benchmark
+        seed: seed of the synthetic tweets (int)
+        compression_files: paths (list of str) of real files to run the compression benchmark on (optional)
+        bandwidths: network bandwidths (list of float), in MB/s, of the compression benchmark
+    Returns:
+        results: dict with the run's metadata and results, keyed by number of rows
+        (and the compression results of 'compression_files', under "files")
+    """
+    results = {"created_at": datetime.datetime.utcnow().isoformat(),
+               "git_commit": _git_commit(),
+               "python": platform.python_version(),
+               "pandas": pd.__version__,
+               "numpy": np.__version__,
+               "platform": platform.platform(),
+               "cpu_count": os.cpu_count(),
+               "seed": seed,
+               "streaming_chunk_size": chunk_size,
+               "bandwidths_mb_per_sec": bandwidths,
+               "sizes": {}}
+
+    for size in sizes:
+        print(f"Benchmarking on {size} synthetic tweets...")
+        tweets_df = generate_tweets(size, seed=seed)
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            results["sizes"][str(size)] = {
+                "functions": benchmark_functions(tweets_df, max_per_row),
+                "end_to_end": benchmark_end_to_end(tweets_df, work_dir, chunk_size),
+            }
+
+            # the input and output files of the end-to-end benchmark
+            results["sizes"][str(size)]["compression"] = benchmark_compression(
+                [os.path.join(work_dir, "hydrated_tweets.csv"),
+                 os.path.join(work_dir, "preprocessed_tweets.csv")],
+                bandwidths)
+
+        print_results(size, results["sizes"][str(size)])
+
+    if compression_files:
+        print(f"Benchmarking the compression of {len(compression_files)} files...")
+        results["files"] = {"compression": benchmark_compression(compression_files, bandwidths)}
+
+        print_compression_results(results["files"]["compression"])
+
+    return results
+
+
+def print_results(size, size_results):
+    """
+    Prints the results for one number of rows
+    """
+    print(f"\n{size} tweets")
+
+    for name, result in size_results["functions"].items():
+        print(
+            f"    {name:<36} {result['rows_per_sec']:>14,.0f} rows/sec  ({result['rows']} rows)")
+
+    for mode, result in size_results["end_to_end"].items():
+        print(f"    end-to-end ({mode}): {result['rows_per_sec']:,.0f} rows/sec, "
+              f"peak memory {result['peak_rss_bytes'] / 2 ** 20:,.0f} MiB "
+              f"(+{result['peak_rss_above_baseline_bytes'] / 2 ** 20:,.0f} MiB)")
+
+    print_compression_results(size_results.get("compression", {}))
+
+    print()
+
+
+def print_compression_results(compression_results):
+    """
+    Prints the results of the compression benchmark
+    """
+    for filename, file_results in compression_results.items():
+        print(
+            f"    compression of {filename} ({file_results['none']['bytes'] / 2 ** 20:,.1f} MiB):")
+
+        upload_keys = [key for key in file_results["none"]
+                       if key.startswith("upload_seconds_at_")]
+
+        for name, result in file_results.items():
+            uploads = ", ".join(f"{result[key]:.2f}s at {key[len('upload_seconds_at_'):].replace('_mb_per_sec', '')} MB/s"
+                                for key in upload_keys)
+            print(f"        {name:<8} {result['ratio']:>5.1f}x, saves {result['bytes_saved'] / 2 ** 20:>8,.1f} MiB, "
+                  f"compress {result['compress_seconds']:.2f}s, decompress {result['decompress_seconds']:.2f}s, "
+                  f"upload {uploads}")
+
+
+def compare_results(old_results, new_results, threshold=0.1):
+    """
+    Compares two benchmark runs and flags the rows/sec that got slower by more than 'threshold'
+
+    Args:
+        old_results: results of the baseline run (dict, as saved by this script)
+        new_results: results of the new run (dict, as saved by this script)
+        threshold: relative slowdown (float) that counts as a regression
+    Returns:
+        regressions: list of (size, benchmark name, old rows/sec, new rows/sec)
+    """
+    regressions = []
+
+    for size, new_size_results in new_results["sizes"].items():
+        old_size_results = old_results["sizes"].get(size)
+
+        if old_size_results is None:
+            continue
+
+        for group in ["functions", "end_to_end"]:
+            for name, new_result in new_size_results[group].items():
+                old_result = old_size_results[group].get(name)
+
+                if old_result is None:
+                    continue
+
+                old_speed = old_result["rows_per_sec"]
+                new_speed = new_result["rows_per_sec"]
+
+                print(
+                    f"{size:>8} {name:<36} {old_speed:>14,.0f} -> {new_speed:>14,.0f} rows/sec ({new_speed / old_speed:.2f}x)")
+
+                if new_speed < old_speed * (1 - threshold):
+                    regressions.append((size, name, old_speed, new_speed))
+
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the preprocessing of tweets")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="numbers of synthetic tweets to benchmark on")
+    parser.add_argument("--max-per-row", type=int, default=DEFAULT_MAX_PER_ROW,
+                        help="max number of rows to time the original per-row functions on")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_STREAMING_CHUNK_SIZE,
+                        help="rows per chunk in the streaming end-to-end benchmark")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the synthetic tweets")
+    parser.add_argument("--output", default=None,
+                        help="path of the JSON results file (default: results/benchmark_<UTC time>.json)")
+    parser.add_argument("--compression-files", nargs="+", default=None,
+                        help="real files (e.g. hydrated or preprocessed tweets .csv files) to run the compression benchmark on")
+    parser.add_argument("--bandwidths", type=float, nargs="+", default=DEFAULT_BANDWIDTHS,
+                        help="network bandwidths (MB/s) to estimate the upload / download times at")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), default=None,
+                        help="compare two JSON results files instead of running the benchmarks")
+    args = parser.parse_args()
+
+    if args.compare is not None:
+        with open(args.compare[0], "r") as f:
+            old_results = json.load(f)
+        with open(args.compare[1], "r") as f:
+            new_results = json.load(f)
+
+        regressions = compare_results(old_results, new_results)
+
+        for size, name, old_speed, new_speed in regressions:
+            print(
+                f"Regression on {size} tweets: {name} went from {old_speed:,.0f} to {new_speed:,.0f} rows/sec")
+
+        sys.exit(1 if regressions else 0)
+
+    results = run_benchmarks(args.sizes, args.max_per_row,
+                             args.chunksize, args.seed,
+                             args.compression_files, args.bandwidths)
+
+    output_path = args.output
+    if output_path is None:
+        os.makedirs(DEFAULT_RESULTS_DIR, exist_ok=True)
+        output_path = os.path.join(DEFAULT_RESULTS_DIR,
+                                   f"benchmark_{datetime.datetime.utcnow().strftime('%Y-%m-%dT%H%M%S')}.json")
+
+    with open(output_path, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"Saved benchmark results to {output_path}")
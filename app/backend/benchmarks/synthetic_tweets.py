@@ -0,0 +1,169 @@
+"""
+
+    synthetic_tweets.py
+
+    Deterministic generator of synthetic hydrated tweets, for benchmarking the preprocessing.
+    The tweets have the same cols as the hydrated tweets .csv file, with realistic mixes of
+    words, hashtags (including squished ones, e.g. "#covid#vaccine"), mentions, links, emojis
+    and punctuation, and a skewed distribution of places (most tweets share a few places).
+
+"""
+import numpy as np
+import pandas as pd
+
+# vocabulary of the tweets
+WORDS = ["covid", "coronavirus", "vaccine", "mask", "masks", "lockdown", "quarantine", "cases",
+         "deaths", "hospital", "testing", "positive", "negative", "pandemic", "virus", "health",
+         "stay", "home", "safe", "work", "school", "family", "today", "week", "news", "update",
+         "new", "first", "dose", "shot", "appointment", "wait", "people", "finally", "please",
+         "the", "a", "an", "and", "is", "in", "of", "to", "for", "on", "it", "this", "that",
+         "are", "be", "we", "you", "I", "my", "our", "just", "not", "so", "get", "got",
+         "Stay", "The", "New", "COVID", "CDC", "WHO", "USA", "NYC", "LA", "vacunas", "café"]
+
+HASHTAGS = ["#COVID19", "#covid", "#coronavirus", "#vaccine", "#StayHome", "#lockdown",
+            "#quarantine", "#WearAMask", "#pandemic", "#COVID19#vaccine", "#stayhome#staysafe"]
+
+EMOJIS = ["😷", "😂", "🙏", "❤️", "💉", "🦠", "😭", "👍🏽", "🎉", "🇺🇸"]
+
+PUNCTUATION_SUFFIXES = ["!", "!!", ".", "...", ",", "?", ":", ")", "'s", "%"]
+
+URL_CHARS = np.array(list("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"))
+
+# kinds of tokens in a tweet, with their probabilities
+TOKEN_KINDS = ["word", "hashtag", "mention", "url", "emoji", "punctuated_word", "newline"]
+TOKEN_KIND_PROBABILITIES = [0.70, 0.08, 0.05, 0.04, 0.06, 0.05, 0.02]
+
+# (place id, country code, full name) of the places tweets are from
+PLACES = [("96683cc9126741d1", "US", "United States"),
+          ("3b77caf94bfc81fe", "US", "Los Angeles, CA"),
+          ("01a9a39529b27f36", "US", "Manhattan, NY"),
+          ("011add077f4d2da3", "US", "Brooklyn, NY"),
+          ("1d9a5370a355ab0c", "US", "Chicago, IL"),
+          ("e0060cda70f5f341", "US", "Houston, TX"),
+          ("5c62ffb0f0f3479d", "US", "Phoenix, AZ"),
+          ("4ec01c9dbc693497", "US", "Florida, USA"),
+          ("fbd6d2f5a4e4a15e", "US", "California, USA"),
+          ("7d62cffe6f98f349", "US", "San Jose, CA"),
+          ("315b740b108481f6", "GB", "London, England"),
+          ("3797791ff9c0e4c6", "CA", "Toronto, Ontario"),
+          ("b850c1bfd38f30e0", "IN", "Mumbai, India"),
+          ("01864a8a64df9dc4", "AU", "Melbourne, Victoria"),
+          ("0c2e6999105f8070", "NG", "Lagos, Nigeria"),
+          ("09f6a7707f18e0b1", "FR", "Paris, France")]
+
+# share of tweets that have a place
+PLACE_PROBABILITY = 0.35
+
+START_TIMESTAMP = "2020-03-20"
+END_TIMESTAMP = "2021-02-09"
+TWITTER_TIMESTAMP_FORMAT = "%a %b %d %H:%M:%S +0000 %Y"
+
+
+def _place_repr(place_id, country_code, full_name):
+    """
+    Returns the "place" field of a hydrated tweet, as stored in the .csv file (the repr of a dict)
+    """
+    name = full_name.split(",")[0]
+
+    return repr({"id": place_id,
+                 "url": f"https://api.twitter.com/1.1/geo/id/{place_id}.json",
+                 "place_type": "city" if "," in full_name else "country",
+                 "name": name,
+                 "full_name": full_name,
+                 "country_code": country_code,
+                 "country": "United States" if country_code == "US" else country_code,
+                 "contained_within": [],
+                 "attributes": {}})
+
+
+def _token_pools():
+    """
+    Returns the tokens each kind of token (in TOKEN_KINDS) is drawn from
+    """
+    return [np.array(WORDS, dtype=object),
+            np.array(HASHTAGS, dtype=object),
+            np.array(["@" + word for word in WORDS], dtype=object),
+            None,  # links are generated
+            np.array(EMOJIS, dtype=object),
+            np.array([word + suffix for word in WORDS for suffix in PUNCTUATION_SUFFIXES], dtype=object),
+            np.array(["\n"], dtype=object)]
+
+
+def _generate_texts(rng, num_rows):
+    """
+    Generates the "full_text" field of 'num_rows' tweets
+    """
+    num_tokens = rng.poisson(14, size=num_rows) + 1
+    total_tokens = int(num_tokens.sum())
+
+    kinds = rng.choice(len(TOKEN_KINDS), size=total_tokens,
+                       p=TOKEN_KIND_PROBABILITIES)
+    tokens = np.empty(total_tokens, dtype=object)
+
+    for kind, pool in enumerate(_token_pools()):
+        is_kind = kinds == kind
+        num_kind = int(is_kind.sum())
+
+        if pool is None:
+            url_chars = rng.choice(URL_CHARS, size=(num_kind, 10))
+            tokens[is_kind] = ["https://t.co/" + "".join(chars)
+                               for chars in url_chars]
+        else:
+            tokens[is_kind] = pool[rng.integers(0, len(pool), size=num_kind)]
+
+    tokens = tokens.tolist()
+    ends = np.cumsum(num_tokens).tolist()
+    starts = [0] + ends[:-1]
+
+    return [" ".join(tokens[start:end]) for start, end in zip(starts, ends)]
+
+
+def generate_tweets(num_rows, seed=0):
+    """
+    Generates a df of synthetic hydrated tweets. The same 'num_rows' and 'seed'
+    always give the same tweets.
+
+    Args:
+        num_rows: number of tweets (int)
+        seed: seed of the random number generator (int)
+    Returns:
+        tweets_df: pandas df of hydrated tweets
+    """
+    rng = np.random.default_rng(seed)
+
+    # places follow a Zipf-like distribution (a few places are very common)
+    place_weights = 1 / np.arange(1, len(PLACES) + 1)
+    place_weights = place_weights / place_weights.sum()
+    place_reprs = np.array([_place_repr(*place)
+                            for place in PLACES], dtype=object)
+
+    place_idx = rng.choice(len(PLACES), size=num_rows, p=place_weights)
+    has_place = rng.random(num_rows) < PLACE_PROBABILITY
+    places = np.where(has_place, place_reprs[place_idx], None)
+
+    # timestamps, spread over the period of the dataset
+    start = pd.Timestamp(START_TIMESTAMP)
+    num_seconds = int(
+        (pd.Timestamp(END_TIMESTAMP) - start).total_seconds())
+    timestamps = start + \
+        pd.to_timedelta(rng.integers(0, num_seconds, size=num_rows), unit="s")
+
+    # tweet IDs are increasing
+    ids = 1240000000000000000 + \
+        np.cumsum(rng.integers(1, 10 ** 9, size=num_rows))
+    user_ids = rng.integers(10 ** 6, 10 ** 9, size=num_rows)
+
+    tweets_df = pd.DataFrame({
+        "user": [repr({"id": int(user_id), "screen_name": f"user{user_id}"}) for user_id in user_ids],
+        "created_at": pd.Series(timestamps).dt.strftime(TWITTER_TIMESTAMP_FORMAT),
+        "id": ids,
+        "full_text": _generate_texts(rng, num_rows),
+        "geo": None,
+        "coordinates": None,
+        "place": places,
+        "retweet_count": rng.geometric(0.3, size=num_rows) - 1,
+        "favorite_count": rng.geometric(0.1, size=num_rows) - 1,
+        "lang": "en",
+    })
+
+    return tweets_df
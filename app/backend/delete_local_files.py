@@ -2,6 +2,64 @@
 
     delete_local_files.py
 
-    Deletes local versions of .csv files, to save space
+    Deletes local versions of files, to save space: evicts the least recently used files of the
+    local caches (the cache of S3 objects, see 's3_object_cache.py', and the cache of IEEE .csv
+    files of 'scrape_tweets_daily.py') until each cache fits in its size cap
 
 """
+import os
+import argparse
+import datetime
+from file_cache import FileCache, IEEE_CACHE_PATH, IEEE_CACHE_MAX_BYTES
+from aws_helpers import get_object_cache
+
+
+def prune_cache(name, cache, max_bytes=None):
+    """
+    Arg:
+        name: name (str) of the cache, for printing
+        cache: cache to prune (FileCache or S3ObjectCache)
+        max_bytes: size cap (int); the cache's own cap if None
+    Returns:
+        evicted: keys of the evicted files (list of str)
+    """
+    total_bytes = cache.total_bytes()
+
+    if isinstance(cache, FileCache):
+        evicted = cache.evict(max_bytes)
+        cache.save()
+    else:
+        evicted = cache.prune(max_bytes)
+
+    for key in evicted:
+        print(f"Deleted {key}")
+
+    print(
+        f"Deleted {len(evicted)} files ({total_bytes - cache.total_bytes()} bytes) from the {name}, {len(cache)} files ({cache.total_bytes()} bytes) are left")
+
+    return evicted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Deletes the least recently used files of the local caches")
+    parser.add_argument("--max-bytes", type=int, default=None,
+                        help="size cap of each cache, in bytes (default: the cap of the cache)")
+    parser.add_argument("--all", action="store_true",
+                        help="delete all the cached files")
+    args = parser.parse_args()
+
+    # set the working dir to the dir of this script, for the relative paths
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    max_bytes = 0 if args.all else args.max_bytes
+
+    try:
+        prune_cache("cache of S3 objects", get_object_cache(), max_bytes)
+
+        if os.path.exists(IEEE_CACHE_PATH):
+            prune_cache("cache of IEEE .csv files",
+                        FileCache(IEEE_CACHE_PATH, IEEE_CACHE_MAX_BYTES), max_bytes)
+    finally:
+        print(
+            f"Finished with the execution of 'delete_local_files.py' at (in UTC time): {datetime.datetime.utcnow()}")
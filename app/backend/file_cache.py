@@ -0,0 +1,346 @@
+"""
+
+    file_cache.py
+
+    Local, on-disk cache of downloaded files. Files are stored by the hash of their content
+    (so identical files are only stored once), and looked up by a key such as their URL.
+    The cache has a size cap: when it is exceeded, the least recently used files are evicted.
+
+"""
+import os
+import json
+import time
+import fcntl
+import hashlib
+import threading
+from collections import Counter
+import requests
+
+# size of the blocks that files are hashed / downloaded in
+BLOCK_SIZE = 1024 * 1024
+
+# default size cap of a cache (5 GB)
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3
+
+# local cache of the IEEE .csv files of 'scrape_tweets_daily.py' (pruned by 'delete_local_files.py')
+IEEE_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               "..", "..", "tweets", "IEEE_cache")
+IEEE_CACHE_MAX_BYTES = 20 * 1024 ** 3
+
+
+class FileCache:
+    """
+    On-disk cache of files, with LRU eviction. The cache directory holds the files
+    (in "objects/", named by the sha256 of their content and an optional suffix, e.g. their
+    extension) and an index ("index.json") of key -> {"sha256", "suffix", "size", "last_used", <metadata>}.
+    It is safe to use from several threads of the same process, and several processes can share
+    the cache directory: the index is saved under a file lock ("index.lock"), merged with the
+    entries the other processes have saved since.
+
+    Args:
+        cache_dir: directory (str) of the cache (created if it doesn't exist)
+        max_bytes: size cap of the cache, in bytes (int)
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.lock_path = os.path.join(cache_dir, "index.lock")
+        self.max_bytes = max_bytes
+        self.lock = threading.RLock()
+        self.counts = Counter(hits=0, misses=0, evictions=0)
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.index = self._read_index()
+
+        # keys removed since the last save, not to be merged back from the saved index
+        self.removed = set()
+
+    def _object_path(self, sha256, suffix=""):
+        return os.path.join(self.objects_dir, sha256 + suffix)
+
+    def _read_index(self):
+        """
+        Returns:
+            index: the saved index (dict), without the entries whose file has been deleted
+            outside of the cache (or by another process)
+        """
+        if not os.path.exists(self.index_path):
+            return {}
+
+        with open(self.index_path, "r") as f:
+            index = json.load(f)
+
+        return {key: entry for key, entry in index.items()
+                if os.path.exists(self._object_path(entry["sha256"], entry.get("suffix", "")))}
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.index
+
+    def __len__(self):
+        with self.lock:
+            return len(self.index)
+
+    def entry(self, key):
+        """
+        Arg:
+            key: key of a file (str)
+        Returns:
+            entry: copy of the index entry of the file (dict), None if it isn't cached
+        """
+        with self.lock:
+            entry = self.index.get(key)
+
+            return dict(entry) if entry is not None else None
+
+    def get(self, key):
+        """
+        Looks up a file, and marks it as recently used
+
+        Arg:
+            key: key of a file (str)
+        Returns:
+            path: path (str) of the cached file, None if it isn't cached
+        """
+        with self.lock:
+            entry = self.index.get(key)
+
+            if entry is None:
+                self.counts["misses"] += 1
+                return None
+
+            self.counts["hits"] += 1
+            entry["last_used"] = time.time()
+
+            return self._object_path(entry["sha256"], entry.get("suffix", ""))
+
+    def put(self, key, path, suffix="", **metadata):
+        """
+        Moves a file into the cache (the file at 'path' is consumed), then evicts the least
+        recently used files if the cache is over its size cap
+
+        Args:
+            key: key of the file (str)
+            path: path (str) of the file; it should be on the same filesystem as the cache
+            suffix: suffix (str) of the name of the cached file, e.g. its extension (".jsonl.gz"),
+            so that readers can tell its format from its name
+            metadata: (JSON-serializable) info to store with the file, e.g. its ETag
+        Returns:
+            cached_path: path (str) of the cached file
+        """
+        sha256 = hashlib.sha256()
+
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+                sha256.update(block)
+
+        return self._put_hashed(key, path, sha256.hexdigest(), suffix, **metadata)
+
+    def _put_hashed(self, key, path, sha256, suffix="", **metadata):
+        cached_path = self._object_path(sha256, suffix)
+
+        with self.lock:
+            if os.path.exists(cached_path):
+                os.remove(path)
+            else:
+                os.replace(path, cached_path)
+
+            self.index[key] = {"sha256": sha256,
+                               "suffix": suffix,
+                               "size": os.path.getsize(cached_path),
+                               "last_used": time.time(),
+                               **metadata}
+            self.removed.discard(key)
+
+            self.evict(keep=key)
+            self.save()
+
+        return cached_path
+
+    def remove(self, key):
+        """
+        Removes a file from the cache (its content is deleted once no other key uses it)
+
+        Arg:
+            key: key of a cached file (str)
+        Returns:
+            freed: number of bytes (int) freed, 0 if another key still uses the content
+        """
+        with self.lock:
+            return self._remove(key, self._num_users())
+
+    def _num_users(self):
+        """
+        Returns:
+            num_users: number of keys (Counter) using each cached file, by (sha256, suffix)
+        """
+        return Counter((entry["sha256"], entry.get("suffix", "")) for entry in self.index.values())
+
+    def _remove(self, key, num_users):
+        # 'num_users' is updated, so that several files can be removed with a single count
+        entry = self.index.pop(key)
+        self.removed.add(key)
+
+        content = (entry["sha256"], entry.get("suffix", ""))
+        num_users[content] -= 1
+
+        if num_users[content] > 0:
+            return 0
+
+        os.remove(self._object_path(*content))
+
+        return entry["size"]
+
+    def total_bytes(self):
+        """
+        Returns:
+            total_bytes: size of the cached files, in bytes (int)
+        """
+        with self.lock:
+            sizes = {(entry["sha256"], entry.get("suffix", "")): entry["size"]
+                     for entry in self.index.values()}
+
+            return sum(sizes.values())
+
+    def evict(self, max_bytes=None, keep=None):
+        """
+        Evicts the least recently used files until the cache fits in 'max_bytes'
+
+        Args:
+            max_bytes: size cap (int); the cache's own cap if None
+            keep: key (str) of a file not to evict, e.g. the one just added
+        Returns:
+            evicted: keys of the evicted files (list of str)
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        evicted = []
+
+        with self.lock:
+            by_last_use = sorted(self.index,
+                                 key=lambda k: self.index[k]["last_used"])
+
+            # running total, rather than adding up the sizes again after each removal
+            total_bytes = self.total_bytes()
+            num_users = self._num_users()
+
+            for key in by_last_use:
+                if total_bytes <= max_bytes:
+                    break
+                if key == keep:
+                    continue
+
+                total_bytes -= self._remove(key, num_users)
+                evicted.append(key)
+
+            self.counts["evictions"] += len(evicted)
+
+        return evicted
+
+    def save(self):
+        """
+        Writes the index of the cache (atomically, through a temporary file). Under the file
+        lock, the saved index is read again and its entries are merged in, so that the entries
+        saved by other processes in the meantime aren't lost: the ones this cache doesn't have
+        (unless it has removed them) are added, and for keys in both, the most recently used
+        entry is kept. Entries whose file another process has evicted are dropped.
+        """
+        with self.lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            try:
+                for key, entry in self._read_index().items():
+                    if key in self.removed:
+                        continue
+                    if key not in self.index or entry["last_used"] > self.index[key]["last_used"]:
+                        self.index[key] = entry
+
+                # drop the entries whose file another process has evicted
+                self.index = {key: entry for key, entry in self.index.items()
+                              if os.path.exists(self._object_path(entry["sha256"], entry.get("suffix", "")))}
+
+                tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+
+                with open(tmp_path, "w") as f:
+                    json.dump(self.index, f)
+
+                os.replace(tmp_path, self.index_path)
+                self.removed.clear()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def hit_rate(self):
+        """
+        Returns:
+            hit_rate: share of the lookups that found the file in the cache (float)
+        """
+        num_lookups = self.counts["hits"] + self.counts["misses"]
+
+        return self.counts["hits"] / num_lookups if num_lookups > 0 else 0.0
+
+
+def fetch_url(cache, url, revalidate=True, session=None, timeout=60):
+    """
+    Returns a local copy of the file at 'url', downloading it only if needed.
+    A cached file is revalidated with a conditional request (using its ETag / Last-Modified),
+    and the server's "304 Not Modified" answer means the cached file is used as is.
+
+    Args:
+        cache: FileCache to store the file in (keyed by its URL)
+        url: URL (str) of the file
+        revalidate: check with the server that the cached file hasn't changed (bool); if False,
+        a cached file is used without any request (for files that never change)
+        session: requests Session to make the request with (optional)
+        timeout: timeout of the request, in seconds (float)
+    Returns:
+        path: path (str) of the local copy of the file
+    """
+    http = session if session is not None else requests
+    entry = cache.entry(url)
+
+    if entry is not None and not revalidate:
+        path = cache.get(url)
+
+        # the file may have been evicted since the lookup, if so download it
+        if path is not None:
+            return path
+
+        entry = None
+
+    headers = {}
+
+    if entry is not None and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry is not None and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    with http.get(url, headers=headers, stream=True, timeout=timeout) as response:
+
+        if response.status_code == 304 and entry is not None:
+            path = cache.get(url)
+
+            # the file may have been evicted since, if so download it again
+            return path if path is not None else fetch_url(cache, url, revalidate, session, timeout)
+
+        response.raise_for_status()
+
+        with cache.lock:
+            cache.counts["misses"] += 1
+
+        # download into the cache dir, hashing the content on the way
+        sha256 = hashlib.sha256()
+        tmp_path = os.path.join(cache.cache_dir,
+                                f"download_{threading.get_ident()}.tmp")
+
+        with open(tmp_path, "wb") as f:
+            for block in response.iter_content(BLOCK_SIZE):
+                sha256.update(block)
+                f.write(block)
+
+        with cache.lock:
+            cache.counts["downloaded_bytes"] += os.path.getsize(tmp_path)
+
+        return cache._put_hashed(url, tmp_path, sha256.hexdigest(),
+                                 etag=response.headers.get("ETag"),
+                                 last_modified=response.headers.get("Last-Modified"))
@@ -0,0 +1,148 @@
+"""
+
+    fresh_tweet_collector.py
+
+    Long-running collector of fresh tweets: keeps one stream of tweets open, holds the most
+    recent N tweets in an in-memory ring buffer and hands a snapshot of the buffer to a callback
+    (e.g. one that uploads it for the dashboard) at regular intervals. The stream is only
+    reopened if it fails, so the cost of connecting is paid once rather than once per tweet.
+
+"""
+import time
+from collections import deque, Counter
+
+
+class FreshTweetCollector:
+    """
+    Collects tweets from a stream into a ring buffer of the most recent 'buffer_size' tweets,
+    and flushes snapshots of the buffer every 'flush_interval' seconds. Flushes happen as tweets
+    arrive (a quiet stream delays the next flush until its next tweet), and once more at the end
+    of a run.
+
+    Counts of the run are kept in 'counts':
+        tweets: number of tweets received
+        connections: number of times the stream was opened
+        stream_errors: number of errors of the stream
+        snapshots: number of snapshots flushed
+        snapshot_errors: number of snapshots that couldn't be flushed
+
+    Args:
+        open_stream: function (no args) that opens the stream and returns an iterator of
+        tweets (dicts), e.g. lambda: twarc.filter(track=...), or a fake stream for tests
+        on_snapshot: function called with a snapshot of the buffer (list of tweets, oldest first)
+        buffer_size: number of most recent tweets (int) to keep
+        flush_interval: number of seconds (float) between snapshots; if None, only the
+        snapshot at the end of a run is flushed
+        max_reconnects: max number of times in a row (int) the stream is reopened after an error
+        reconnect_wait: number of seconds (float) to wait before reopening the stream, doubled
+        after each consecutive error
+        clock, sleep: time functions (for tests)
+    """
+
+    def __init__(self, open_stream, on_snapshot, buffer_size=1000, flush_interval=300,
+                 max_reconnects=5, reconnect_wait=5, clock=time.monotonic, sleep=time.sleep):
+        self.open_stream = open_stream
+        self.on_snapshot = on_snapshot
+        self.buffer = deque(maxlen=buffer_size)
+        self.flush_interval = flush_interval
+        self.max_reconnects = max_reconnects
+        self.reconnect_wait = reconnect_wait
+        self.clock = clock
+        self.sleep = sleep
+        self.counts = Counter(tweets=0, connections=0, stream_errors=0,
+                              snapshots=0, snapshot_errors=0)
+        self.last_flush = None
+
+    def snapshot(self):
+        """
+        Returns:
+            tweets: copy of the buffered tweets (list of dicts), oldest first
+        """
+        return list(self.buffer)
+
+    def flush(self):
+        """
+        Hands a snapshot of the buffer to 'on_snapshot'. A failed flush is counted and printed,
+        rather than raised, so that the collector keeps running.
+
+        Returns:
+            flushed: was the snapshot flushed? (bool)
+        """
+        self.last_flush = self.clock()
+
+        try:
+            self.on_snapshot(self.snapshot())
+        except Exception as e:
+            print("Error in flushing a snapshot of the fresh tweets")
+            print(e)
+            self.counts["snapshot_errors"] += 1
+            return False
+
+        self.counts["snapshots"] += 1
+        return True
+
+    def _flush_due(self):
+        return self.flush_interval is not None and \
+            self.clock() - self.last_flush >= self.flush_interval
+
+    def run(self, duration=None, max_tweets=None):
+        """
+        Collects tweets until 'duration' seconds have passed or 'max_tweets' tweets have been
+        received (or, if neither is given, until the stream ends or the process is stopped),
+        then flushes a last snapshot
+
+        Args:
+            duration: number of seconds (float) to collect for (optional)
+            max_tweets: number of tweets (int) to collect (optional)
+        Returns:
+            num_tweets: number of tweets (int) received in this run
+        """
+        start = self.clock()
+        self.last_flush = start
+        num_tweets = 0
+        num_errors = 0
+        stream = None
+
+        def is_done():
+            return (duration is not None and self.clock() - start >= duration) or \
+                (max_tweets is not None and num_tweets >= max_tweets)
+
+        try:
+            while not is_done():
+                if stream is None:
+                    stream = iter(self.open_stream())
+                    self.counts["connections"] += 1
+
+                try:
+                    tweet = next(stream)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    self.counts["stream_errors"] += 1
+                    num_errors += 1
+
+                    if num_errors > self.max_reconnects:
+                        raise
+
+                    print(
+                        f"Error in the stream of tweets, reopening it ({num_errors} of {self.max_reconnects})")
+                    print(e)
+                    self.sleep(self.reconnect_wait * 2 ** (num_errors - 1))
+                    stream = None
+                    continue
+
+                num_errors = 0
+                num_tweets += 1
+                self.counts["tweets"] += 1
+                self.buffer.append(tweet)
+
+                if self._flush_due():
+                    self.flush()
+        finally:
+            # closes the connection of a generator-based stream (e.g. twarc's)
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
+
+        self.flush()
+
+        return num_tweets
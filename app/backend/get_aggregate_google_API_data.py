@@ -2,27 +2,30 @@
 
     get_aggregate_google_API_data.py
 
-    This data aggregates the Google API data stored in AWS. It assumes the existence of an existing aggregate datasets
+    This data aggregates the Google API data stored in AWS, into an append-only store with one partition per day
+    (see 'google_trends_store.py')
 
-    It loads the most recent aggregate dataset, the most recent daily scrapes of data, and appends the most recent scrape
-    to the most recent aggregate dataset
+    It loads the most recent daily scrapes of data, and appends them to the aggregate dataset as a new partition.
+    The first time, the store is bootstrapped from the most recent (legacy) aggregate dataset file.
 
     Args:
         - Date: a date, in the format of %Y-%m-%d (e.g., 2020-03-20)
 
-    Assumes that there is an existing aggregate dataset and that the most recent version has already been scraped
-    (via 'get_google_API_data.py')
+    Assumes that the most recent version has already been scraped (via 'get_google_API_data.py'), and the first
+    time, that there is an aggregate dataset file up to the previous date
 
 """
 import os
 import sys
 import re
-import boto3
 import pytrends
 from pytrends.request import TrendReq
 import pandas as pd
 import datetime
 import re
+from run_metrics import RunMetrics
+from aws_helpers import download_many
+from google_trends_store import GoogleTrendsStore
 
 if __name__ == "__main__":
 
@@ -35,19 +38,15 @@ if __name__ == "__main__":
     INTEREST_OVER_TIME_FILENAME = "interest_over_time_"
     INTEREST_BY_REGION_FILENAME = "interest_by_region_"
 
-    LOCAL_SCRAPES_DIR = "../../tweets/google_API_scrapes/"
     AGGREGATE_GOOGLE_DIR = "aggregate_google_API_data/"
     AWS_SCRAPES_DIR = "google_API_scrapes/"
 
-    LOCAL_AGGREGATE_TIME_PATH = LOCAL_SCRAPES_DIR + "aggregate_interest_over_time_"
-    LOCAL_AGGREGATE_REGION_PATH = LOCAL_SCRAPES_DIR + "aggregate_interest_by_region_"
+    AWS_PARTITIONS_PATH = AGGREGATE_GOOGLE_DIR + "partitions/"
 
+    # legacy aggregate files (one growing file per kind of data), only read to bootstrap the partitions
     AWS_AGGREGATE_TIME_PATH = AGGREGATE_GOOGLE_DIR + "aggregate_interest_over_time_"
     AWS_AGGREGATE_REGION_PATH = AGGREGATE_GOOGLE_DIR + "aggregate_interest_by_region_"
 
-    LOCAL_TIME_FILENAME = LOCAL_SCRAPES_DIR + INTEREST_OVER_TIME_FILENAME
-    LOCAL_REGION_FILENAME = LOCAL_SCRAPES_DIR + INTEREST_BY_REGION_FILENAME
-
     AWS_TIME_FILENAME = AWS_SCRAPES_DIR + INTEREST_OVER_TIME_FILENAME
     AWS_REGION_FILENAME = AWS_SCRAPES_DIR + INTEREST_BY_REGION_FILENAME
 
@@ -63,74 +62,99 @@ if __name__ == "__main__":
     print(
         f"The provided date is: {DATE_FORMATTED} and the previous date is {PREV_DATE_FORMATTED}")
 
-    # get filenames, of preexisting file, the most recent data scrape, and the next aggregate file
+    # get filenames, of preexisting file and the most recent data scrape
     PREV_AGG_DATA_FILENAME = f"{START_DATE}_{PREV_DATE_FORMATTED}.csv"
 
-    NEW_FILE_SCRAPE_TIME = AWS_TIME_FILENAME + DATE_FORMATTED
-    NEW_FILE_SCRAPE_REGION = AWS_REGION_FILENAME + DATE_FORMATTED
+    NEW_FILE_SCRAPE_TIME = AWS_TIME_FILENAME + DATE_FORMATTED + ".csv"
+    NEW_FILE_SCRAPE_REGION = AWS_REGION_FILENAME + DATE_FORMATTED + ".csv"
+
+    # record per-stage metrics of the run
+    METRICS_PATH = "../../tweets/run_metrics/"
+    metrics = RunMetrics("get_aggregate_google_API_data.py", METRICS_PATH)
+    metrics.info["date"] = DATE_FORMATTED
+    metrics.save_on_exit()
+
+    # the aggregate data is an append-only store of one partition per day (see 'google_trends_store.py'),
+    # so only today's scrapes are downloaded, and only today's partition is uploaded
+    store = GoogleTrendsStore(AWS_PARTITIONS_PATH,
+                              "s3",
+                              AWS_BUCKET,
+                              AWS_ACCESS,
+                              AWS_SECRET)
+
+    # load today's time and region data (the files are downloaded into memory and parsed from there,
+    # with no local copies), and the first time, the previous aggregate files to bootstrap the store from
+    with metrics.stage("download") as stage:
+        with stage.s3_transfer():
+            store.load()
 
-    NEW_AGG_DATA_FILENAME = f"{START_DATE}_{DATE_FORMATTED}.csv"
+        bootstrap = store.is_empty()
 
-    # connect with AWS S3
-    s3 = boto3.client('s3',
-                      aws_access_key_id=AWS_ACCESS,
-                      aws_secret_access_key=AWS_SECRET)
+        s3_files = [NEW_FILE_SCRAPE_TIME,
+                    NEW_FILE_SCRAPE_REGION]
 
-    # load pre-existing data:
+        if bootstrap:
+            print(
+                f"Bootstrapping the partitioned aggregate data from the aggregate files up to {PREV_DATE_FORMATTED}")
 
-    # load previous aggregate data
-    s3.download_file(Bucket=AWS_BUCKET,
-                     Key=AWS_AGGREGATE_TIME_PATH + PREV_AGG_DATA_FILENAME,
-                     Filename=LOCAL_AGGREGATE_TIME_PATH + PREV_AGG_DATA_FILENAME)
+            s3_files += [AWS_AGGREGATE_TIME_PATH + PREV_AGG_DATA_FILENAME,
+                         AWS_AGGREGATE_REGION_PATH + PREV_AGG_DATA_FILENAME]
 
-    s3.download_file(Bucket=AWS_BUCKET,
-                     Key=AWS_AGGREGATE_REGION_PATH + PREV_AGG_DATA_FILENAME,
-                     Filename=AWS_AGGREGATE_REGION_PATH + PREV_AGG_DATA_FILENAME)
+        with stage.s3_transfer(num_transfers=len(s3_files)):
+            downloaded, failures = download_many([(s3_file, None) for s3_file in s3_files],
+                                                 "s3",
+                                                 AWS_BUCKET,
+                                                 AWS_ACCESS,
+                                                 AWS_SECRET)
 
-    # load today's time and region data
-    s3.download_file(Bucket=AWS_BUCKET,
-                     Key=NEW_FILE_SCRAPE_TIME,
-                     Filename=LOCAL_TIME_FILENAME + DATE_FORMATTED + ".csv")
+        if len(failures) > 0:
+            for s3_file, e in failures.items():
+                print(f"Error in downloading {s3_file}")
+                print(e)
 
-    s3.download_file(Bucket=AWS_BUCKET,
-                     Key=NEW_FILE_SCRAPE_REGION,
-                     Filename=LOCAL_REGION_FILENAME + DATE_FORMATTED + ".csv")
+            raise ValueError(
+                f"{len(failures)} of the {len(s3_files)} files couldn't be downloaded")
+
+        buffers = [downloaded[s3_file]["buffer"] for s3_file in s3_files]
+        stage.bytes_read = sum(result["num_bytes"]
+                               for result in downloaded.values())
 
     # load as dfs
-    prev_agg_time_df = pd.read_csv(
-        LOCAL_AGGREGATE_TIME_PATH + PREV_AGG_DATA_FILENAME)
-    prev_agg_region_df = pd.read_csv(
-        AWS_AGGREGATE_REGION_PATH + PREV_AGG_DATA_FILENAME)
-
-    new_time_df = pd.read_csv(LOCAL_TIME_FILENAME + DATE_FORMATTED + ".csv")
-    new_region_df = pd.read_csv(
-        LOCAL_REGION_FILENAME + DATE_FORMATTED + ".csv")
-
-    # remove local copies
-    os.remove(LOCAL_AGGREGATE_TIME_PATH + PREV_AGG_DATA_FILENAME)
-    os.remove(AWS_AGGREGATE_REGION_PATH + PREV_AGG_DATA_FILENAME)
-    os.remove(LOCAL_TIME_FILENAME + DATE_FORMATTED + ".csv")
-    os.remove(LOCAL_REGION_FILENAME + DATE_FORMATTED + ".csv")
-
-    # add 'date' col to region df
-    new_region_df['date'] = DATE_FORMATTED
-
-    # append new dfs to running aggregate dfs
-    new_agg_time_df = prev_agg_time_df.append(new_time_df)
-    new_agg_region_df = prev_agg_region_df.append(new_region_df)
-
-    # save new dfs, locally
-    new_agg_time_df.to_csv(LOCAL_AGGREGATE_TIME_PATH +
-                           f"{START_DATE}_{DATE_FORMATTED}.csv")
-    new_agg_region_df.to_csv(
-        LOCAL_AGGREGATE_REGION_PATH + f"{START_DATE}_{DATE_FORMATTED}.csv")
-
-    # export to AWS
-    s3.upload_file(LOCAL_AGGREGATE_TIME_PATH +
-                   f"{START_DATE}_{DATE_FORMATTED}.csv",
-                   AWS_BUCKET, AWS_AGGREGATE_TIME_PATH + f"{START_DATE}_{DATE_FORMATTED}.csv")
-    s3.upload_file(LOCAL_AGGREGATE_REGION_PATH + f"{START_DATE}_{DATE_FORMATTED}.csv",
-                   AWS_BUCKET, AWS_AGGREGATE_REGION_PATH + f"{START_DATE}_{DATE_FORMATTED}.csv")
+    with metrics.stage("load") as stage:
+        dfs = [pd.read_csv(buffer) for buffer in buffers]
+        new_time_df, new_region_df = dfs[:2]
+
+        stage.rows_out = sum(df.shape[0] for df in dfs)
+
+    with metrics.stage("aggregate") as stage:
+        stage.rows_in = stage.rows_out = new_time_df.shape[0] + \
+            new_region_df.shape[0]
+
+        # add 'date' col to region df
+        new_region_df['date'] = DATE_FORMATTED
+
+    # export today's partition to AWS (its files at the same time, serialized in memory), then the
+    # manifest, so that the partition is only listed once it has been written
+    with metrics.stage("upload") as stage:
+        stage.rows_in = stage.rows_out = sum(df.shape[0] for df in dfs)
+
+        with stage.s3_transfer(num_transfers=len(dfs) + 1):
+            uploaded = {}
+
+            if bootstrap:
+                prev_agg_time_df, prev_agg_region_df = dfs[2:]
+                uploaded.update(store.bootstrap(prev_agg_time_df, prev_agg_region_df,
+                                                START_DATE, PREV_DATE_FORMATTED))
+
+            uploaded.update(store.append_day(DATE_FORMATTED,
+                                             new_time_df, new_region_df))
+            store.save()
+
+        stage.bytes_written = sum(result["num_bytes"]
+                                  for result in uploaded.values())
+
+    metrics.info.update(bootstrapped=bootstrap,
+                        num_partitions=len(store.manifest.partitions))
 
     print(
         f"Finished running 'get_aggregate_google_API_data.py' at (in UTC time): {datetime.datetime.utcnow()}")
@@ -12,11 +12,12 @@
 import os
 import sys
 import re
-import boto3
 import pytrends
 from pytrends.request import TrendReq
 import pandas as pd
 import datetime
+from run_metrics import RunMetrics
+from aws_helpers import upload_many
 
 if __name__ == "__main__":
 
@@ -31,12 +32,8 @@ if __name__ == "__main__":
     INTEREST_OVER_TIME_FILENAME = "interest_over_time_"
     INTEREST_BY_REGION_FILENAME = "interest_by_region_"
 
-    LOCAL_SCRAPES_DIR = "../../tweets/google_API_scrapes/"
     AWS_SCRAPES_DIR = "google_API_scrapes/"
 
-    LOCAL_TIME_FILENAME = LOCAL_SCRAPES_DIR + INTEREST_OVER_TIME_FILENAME
-    LOCAL_REGION_FILENAME = LOCAL_SCRAPES_DIR + INTEREST_BY_REGION_FILENAME
-
     AWS_TIME_FILENAME = AWS_SCRAPES_DIR + INTEREST_OVER_TIME_FILENAME
     AWS_REGION_FILENAME = AWS_SCRAPES_DIR + INTEREST_BY_REGION_FILENAME
 
@@ -49,33 +46,54 @@ if __name__ == "__main__":
         raise ValueError(
             "DATE has incorrect format (must be in yyyy-mm-dd format)")
 
-    # log into S3
-    s3 = boto3.client('s3',
-                      aws_access_key_id=AWS_ACCESS,
-                      aws_secret_access_key=AWS_SECRET)
+    # record per-stage metrics of the run
+    METRICS_PATH = "../../tweets/run_metrics/"
+    metrics = RunMetrics("get_google_API_data.py", METRICS_PATH)
+    metrics.info["date"] = DATE
+    metrics.save_on_exit()
 
     print(f"Getting Google API trends data for {DATE}")
 
     try:
-        # start API call
-        pytrends_API = TrendReq()
+        with metrics.stage("trends_API") as stage:
+            # start API call
+            pytrends_API = TrendReq()
+
+            pytrends_API.build_payload(
+                kw_list=KEYWORDS, geo="US", timeframe=f"{DATE} {DATE}")
+
+            # get trends over time and by region
+            interest_over_time_df = pytrends_API.interest_over_time()
+            interest_by_region_df = pytrends_API.interest_by_region()
+
+            stage.rows_out = interest_over_time_df.shape[0] + \
+                interest_by_region_df.shape[0]
+
+        # upload to AWS, both at the same time (the dfs are serialized in memory, with no local copies)
+        with metrics.stage("upload") as stage:
+            stage.rows_in = stage.rows_out = interest_over_time_df.shape[0] + \
+                interest_by_region_df.shape[0]
+
+            uploads = [(interest_over_time_df, AWS_TIME_FILENAME + DATE + ".csv"),
+                       (interest_by_region_df, AWS_REGION_FILENAME + DATE + ".csv")]
 
-        pytrends_API.build_payload(
-            kw_list=KEYWORDS, geo="US", timeframe=f"{DATE} {DATE}")
+            with stage.s3_transfer(num_transfers=len(uploads)):
+                uploaded, failures = upload_many(uploads,
+                                                 "s3",
+                                                 AWS_BUCKET,
+                                                 AWS_ACCESS,
+                                                 AWS_SECRET)
 
-        # get trends over time and by region, and export locally:
-        pytrends_API.interest_over_time().to_csv(LOCAL_TIME_FILENAME + DATE + ".csv")
-        pytrends_API.interest_by_region().to_csv(LOCAL_REGION_FILENAME + DATE + ".csv")
+            stage.bytes_written = sum(result["num_bytes"]
+                                      for result in uploaded.values())
 
-        # upload to AWS
-        s3.upload_file(LOCAL_TIME_FILENAME + DATE + ".csv",
-                       AWS_BUCKET, AWS_TIME_FILENAME + DATE + ".csv")
-        s3.upload_file(LOCAL_REGION_FILENAME + DATE + ".csv",
-                       AWS_BUCKET, AWS_REGION_FILENAME + DATE + ".csv")
+            if len(failures) > 0:
+                for s3_file, e in failures.items():
+                    print(f"Error in uploading {s3_file}")
+                    print(e)
 
-        # delete local versions of the file
-        os.remove(LOCAL_TIME_FILENAME + DATE + ".csv")
-        os.remove(LOCAL_REGION_FILENAME + DATE + ".csv")
+                raise ValueError(
+                    f"{len(failures)} of the {len(uploads)} files couldn't be uploaded")
 
         print(f"Finished getting Google API trends data for {DATE}")
 
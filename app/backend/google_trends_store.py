@@ -0,0 +1,248 @@
+"""
+
+    google_trends_store.py
+
+    Append-only, date-partitioned store of the aggregate Google Trends data in S3. Each day of
+    data is one partition (a .csv file per kind of data, interest over time and interest by
+    region), listed in a small JSON manifest. A daily run only writes the partition of its day
+    and the manifest, rather than rewriting the whole aggregate dataset, and readers download
+    only the partitions of the dates they ask for, lazily, as they are iterated over.
+
+"""
+import io
+import pandas as pd
+from aws_helpers import exists_in_AWS, load_fileobj_from_AWS, save_fileobj_to_AWS, \
+    upload_many, download_many, MAX_TRANSFER_WORKERS
+from partition_manifest import PartitionManifest
+from stream_compression import compressed_path
+
+# kinds of Google Trends data, each with its own file per partition
+TRENDS_KINDS = ["interest_over_time", "interest_by_region"]
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+def _to_csv_buffer(df):
+    return io.BytesIO(df.to_csv(index=False).encode("utf-8"))
+
+
+def _drop_index_columns(df):
+    """
+    Arg:
+        df: pandas df read from a .csv file
+    Returns:
+        df: the df without the unnamed index cols written by 'df.to_csv' (e.g., "Unnamed: 0")
+    """
+    return df.loc[:, [not str(col).startswith("Unnamed:") for col in df.columns]]
+
+
+class GoogleTrendsStore:
+    """
+    Date-partitioned store of Google Trends data, in the S3 dir 'prefix':
+        <prefix>manifest.json
+        <prefix><kind>/<partition name>.csv (one file per kind of data, see TRENDS_KINDS)
+
+    A partition is one day (named by its date, e.g. "2021-02-09"), or a range of days for the
+    partition bootstrapped from a legacy aggregate file. Its manifest entry has its "min_date",
+    "max_date", "s3_keys" and "num_rows" (by kind). Writing a partition that already exists
+    (e.g. re-running a day) replaces it. The manifest is written last, so a partition that is
+    only half-written is never listed.
+
+    Call 'load' before using the store.
+
+    Args:
+        prefix: S3 dir (str) of the store, e.g. "aggregate_google_API_data/partitions/"
+        AWS_resource: the AWS resource used (e.g., "s3", "ec2", "dynamodb")
+        AWS_bucket: name of S3 bucket
+        AWS_access: AWS access key
+        AWS_secret: AWS secret key
+        compression: compression of the partition files: None, "gzip" or "zstd" (str)
+    """
+
+    def __init__(self, prefix, AWS_resource, AWS_bucket, AWS_access, AWS_secret, compression=None):
+        self.prefix = prefix
+        self.AWS_args = (AWS_resource, AWS_bucket, AWS_access, AWS_secret)
+        self.compression = compression
+        self.manifest = None
+
+    @property
+    def manifest_key(self):
+        return self.prefix + MANIFEST_FILENAME
+
+    def partition_key(self, kind, name):
+        """
+        Args:
+            kind: one of TRENDS_KINDS (str)
+            name: name of the partition (str)
+        Returns:
+            s3_file: path (str) of the partition's file within the S3 bucket
+        """
+        return compressed_path(f"{self.prefix}{kind}/{name}.csv", self.compression)
+
+    def load(self):
+        """
+        Loads the manifest from S3 (an empty manifest if the store doesn't exist yet)
+
+        Returns:
+            manifest: PartitionManifest
+        """
+        if exists_in_AWS(self.manifest_key, *self.AWS_args):
+            self.manifest = PartitionManifest.from_json(
+                load_fileobj_from_AWS(self.manifest_key, *self.AWS_args).getvalue())
+        else:
+            self.manifest = PartitionManifest()
+
+        return self.manifest
+
+    def is_empty(self):
+        """
+        Returns:
+            is_empty: does the store have no partitions? (bool)
+        """
+        return len(self.manifest.partitions) == 0
+
+    def write_partition(self, name, dfs, min_date, max_date):
+        """
+        Uploads the files of a partition (all at the same time) and adds it to the manifest.
+        Call 'save' to write the manifest.
+
+        Args:
+            name: name of the partition (str)
+            dfs: dict of kind (one of TRENDS_KINDS) -> pandas df
+            min_date: first date (str, yyyy-mm-dd) of the partition
+            max_date: last date (str, yyyy-mm-dd) of the partition
+        Returns:
+            uploaded: dict of s3_file -> result of the upload (see 'aws_helpers.upload_many')
+        """
+        s3_keys = {kind: self.partition_key(kind, name) for kind in TRENDS_KINDS}
+
+        uploaded, failures = upload_many([(_to_csv_buffer(dfs[kind]), s3_keys[kind])
+                                          for kind in TRENDS_KINDS],
+                                         *self.AWS_args)
+
+        if len(failures) > 0:
+            for s3_file, e in failures.items():
+                print(f"Error in uploading {s3_file}")
+                print(e)
+
+            raise ValueError(
+                f"{len(failures)} of the {len(TRENDS_KINDS)} files of partition {name} couldn't be uploaded")
+
+        self.manifest.add_partition(name,
+                                    min_date=min_date,
+                                    max_date=max_date,
+                                    s3_keys=s3_keys,
+                                    num_rows={kind: int(dfs[kind].shape[0]) for kind in TRENDS_KINDS})
+
+        return uploaded
+
+    def append_day(self, date, interest_over_time_df, interest_by_region_df):
+        """
+        Writes the partition of one day of data (call 'save' to write the manifest)
+
+        Args:
+            date: date (str, yyyy-mm-dd) of the data
+            interest_over_time_df: pandas df of the day's interest over time
+            interest_by_region_df: pandas df of the day's interest by region (with a 'date' col)
+        Returns:
+            uploaded: see 'write_partition'
+        """
+        return self.write_partition(date,
+                                    {"interest_over_time": interest_over_time_df,
+                                     "interest_by_region": interest_by_region_df},
+                                    date, date)
+
+    def bootstrap(self, interest_over_time_df, interest_by_region_df, start_date, end_date):
+        """
+        Writes a legacy aggregate dataset (one growing file per kind of data) as the first partition
+        of the store (call 'save' to write the manifest)
+
+        Args:
+            interest_over_time_df: pandas df of the legacy aggregate interest over time
+            interest_by_region_df: pandas df of the legacy aggregate interest by region
+            start_date: first date (str, yyyy-mm-dd) of the legacy dataset
+            end_date: last date (str, yyyy-mm-dd) of the legacy dataset
+        Returns:
+            uploaded: see 'write_partition'
+        """
+        return self.write_partition(f"{start_date}_{end_date}",
+                                    {"interest_over_time": _drop_index_columns(interest_over_time_df),
+                                     "interest_by_region": _drop_index_columns(interest_by_region_df)},
+                                    start_date, end_date)
+
+    def save(self):
+        """
+        Uploads the manifest
+        """
+        save_fileobj_to_AWS(io.BytesIO(self.manifest.to_json().encode("utf-8")),
+                            self.manifest_key,
+                            *self.AWS_args)
+
+    def partitions(self, start_date=None, end_date=None):
+        """
+        Args:
+            start_date: first date (str, yyyy-mm-dd) to include (optional)
+            end_date: last date (str, yyyy-mm-dd) to include (optional)
+        Returns:
+            partitions: manifest entries (list of dicts) of the partitions with data between
+            'start_date' and 'end_date', by date
+        """
+        return sorted([partition for partition in self.manifest.partitions
+                       if (start_date is None or partition["max_date"] >= start_date) and
+                       (end_date is None or partition["min_date"] <= end_date)],
+                      key=lambda partition: (partition["min_date"], partition["max_date"]))
+
+    def iter_partitions(self, kind, start_date=None, end_date=None, batch_size=MAX_TRANSFER_WORKERS):
+        """
+        Downloads partitions lazily, 'batch_size' at a time, as they are iterated over
+
+        Args:
+            kind: one of TRENDS_KINDS (str)
+            start_date, end_date: see 'partitions'
+            batch_size: number of partitions (int) downloaded at the same time
+        Yields:
+            df: pandas df of one partition, by date
+        """
+        s3_keys = [partition["s3_keys"][kind]
+                   for partition in self.partitions(start_date, end_date)]
+
+        for batch_start in range(0, len(s3_keys), batch_size):
+            batch = s3_keys[batch_start:batch_start + batch_size]
+
+            downloaded, failures = download_many([(s3_file, None) for s3_file in batch],
+                                                 *self.AWS_args)
+
+            if len(failures) > 0:
+                for s3_file, e in failures.items():
+                    print(f"Error in downloading {s3_file}")
+                    print(e)
+
+                raise ValueError(
+                    f"{len(failures)} partitions of {kind} couldn't be downloaded")
+
+            for s3_file in batch:
+                yield pd.read_csv(downloaded[s3_file]["buffer"])
+
+    def read(self, kind, start_date=None, end_date=None):
+        """
+        Args:
+            kind: one of TRENDS_KINDS (str)
+            start_date, end_date: see 'partitions'
+        Returns:
+            df: pandas df of the data between 'start_date' and 'end_date', concatenated across
+            partitions (an empty df if there is no data)
+        """
+        dfs = list(self.iter_partitions(kind, start_date, end_date))
+
+        if len(dfs) == 0:
+            return pd.DataFrame()
+
+        df = pd.concat(dfs, ignore_index=True)
+
+        # the partition bootstrapped from a legacy file spans many dates
+        if (start_date is not None or end_date is not None) and "date" in df.columns:
+            dates = df["date"].astype(str).str[:10]
+            df = df[dates.between(start_date or dates.min(),
+                                  end_date or dates.max())].reset_index(drop=True)
+
+        return df
@@ -5,25 +5,47 @@
     This script takes tweet IDs and uploads the hydrated tweets to our AWS S3 bucket
 """
 import os
-import csv
-import pandas as pd
+import sys
+import argparse
+import contextlib
 import datetime
 import twarc
 from twarc import Twarc
 import aws_helpers
-from aws_helpers import save_to_AWS, load_from_AWS
+from aws_helpers import save_to_AWS, fetch_from_AWS, cache_uploaded_file, restore_from_AWS, \
+    save_state_to_AWS
+from run_metrics import RunMetrics, file_size
+from tweet_id_store import TweetIDStore
+from tweet_id_file import TweetIDFile
+from tweet_chunks import JSONLChunkWriter, BackgroundUploader, ChunkCheckpoint, DEFAULT_CHUNK_SIZE
+from hydration_scheduler import HydrationScheduler, load_twitter_credentials
+from partition_manifest import PartitionManifest
+from tweet_projection import project_tweet
 
 
 if __name__ == "__main__":
 
+    # get args
+    parser = argparse.ArgumentParser(
+        description="Hydrates the scraped tweet IDs and uploads the tweets to AWS")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only hydrate the scraped tweet IDs that haven't been hydrated yet, "
+                        "and write their tweets as a new partition")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"number of tweets per output chunk (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--raw", action="store_true",
+                        help="also keep the full tweets (the chunks only have the projected fields "
+                        "that preprocessing uses), in separate chunks under 'raw/'")
+    args = parser.parse_args()
+
     # change dir to this file's directory
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
-    # get env vars
-    CONSUMER_KEY = os.environ["CONSUMER_KEY"]
-    CONSUMER_SECRET = os.environ["CONSUMER_SECRET"]
-    ACCESS_TOKEN = os.environ["ACCESS_TOKEN"]
-    ACCESS_TOKEN_SECRET = os.environ["ACCESS_TOKEN_SECRET"]
+    # get env vars (the Twitter credentials are either a JSON file of several credential sets,
+    # whose path is in TWITTER_CREDENTIALS_FILE, or one set in CONSUMER_KEY, CONSUMER_SECRET,
+    # ACCESS_TOKEN and ACCESS_TOKEN_SECRET)
+    TWITTER_CREDENTIALS = load_twitter_credentials(
+        os.environ.get("TWITTER_CREDENTIALS_FILE"))
 
     AWS_BUCKET = os.environ["AWS_BUCKET"]
     AWS_ACCESS = os.environ["AWS_ACCESS"]
@@ -36,69 +58,300 @@ if __name__ == "__main__":
     LOCAL_TWEET_PATH = "./../../tweets/"
 
     # local filenames of exports
-    ID_FILENAME = "scraped_tweet_IDs_2020-03-20_2021-02-09.csv"
-    TWEETS_FILENAME = "hydrated_tweets_2020-03-20_2021-02-09.csv"
+    # (the binary tweet ID file; files in the old .csv text format can be read too)
+    ID_FILENAME = "scraped_tweet_IDs_2020-03-20_2021-02-09.bin"
     LOCAL_EXPORT_ID_PATH = ID_PATH + ID_FILENAME
-    LOCAL_EXPORT_TWEETS_PATH = TWEETS_PATH + TWEETS_FILENAME
     AWS_EXPORT_ID_PATH = AWS_TWEET_DIR + "tweet_IDs/" + ID_FILENAME
-    AWS_EXPORT_TWEETS_PATH = AWS_TWEET_DIR + "hydrated_tweets/" + TWEETS_FILENAME
 
-    try:
-        # load text file from AWS
-        load_from_AWS(LOCAL_EXPORT_ID_PATH,
-                      AWS_EXPORT_ID_PATH,
-                      "s3",
-                      AWS_BUCKET,
-                      AWS_ACCESS,
-                      AWS_SECRET)
-    except Exception as e:
-        print("Error in loading tweet IDs from AWS")
-        print(e)
+    # the tweets are written as chunks "<TWEETS_PREFIX>_<chunk number>.jsonl.gz" (one projected tweet JSON
+    # per line, see 'tweet_projection.py'), and with '--raw', the full tweets as chunks with the same
+    # names in the "raw/" subdir. The chunks are listed in the manifest "manifest.json" of their dir, that
+    # 'preprocess_tweets.py' reads them from.
+    TWEETS_PREFIX = "hydrated_tweets_2020-03-20_2021-02-09"
+    LOCAL_EXPORT_TWEETS_DIR = TWEETS_PATH + TWEETS_PREFIX + "/"
+    AWS_EXPORT_TWEETS_DIR = AWS_TWEET_DIR + "hydrated_tweets/" + TWEETS_PREFIX + "/"
 
-    # create tweet ID list
-    tweet_ID_list = []
+    # store of all the tweet IDs scraped so far (written by 'scrape_tweets_daily.py')
+    ID_STORE_FILENAME = "scraped_tweet_IDs.npy"
+    LOCAL_ID_STORE_PATH = ID_PATH + ID_STORE_FILENAME
+    AWS_ID_STORE_PATH = AWS_TWEET_DIR + "tweet_IDs/" + ID_STORE_FILENAME
 
-    with open(LOCAL_EXPORT_ID_PATH, "r") as f:
-        datareader = csv.reader(f)
-        for row in datareader:
-            tweet_ID_list.append(row[0])
+    # store of all the tweet IDs hydrated so far, and partitions of tweets of incremental runs
+    # (both kept in AWS too, so that a run can start on any machine)
+    PARTITIONS_PATH = TWEETS_PATH + "partitions/"
+    MANIFEST_FILENAME = "manifest.json"
+    HYDRATED_IDS_FILENAME = "hydrated_tweet_IDs.npy"
+    LOCAL_MANIFEST_PATH = PARTITIONS_PATH + MANIFEST_FILENAME
+    LOCAL_HYDRATED_IDS_PATH = PARTITIONS_PATH + HYDRATED_IDS_FILENAME
+    AWS_PARTITIONS_PATH = AWS_TWEET_DIR + "hydrated_tweets/partitions/"
+    AWS_HYDRATED_IDS_PATH = AWS_PARTITIONS_PATH + HYDRATED_IDS_FILENAME
 
-    # connect twarc
-    t = Twarc(CONSUMER_KEY, CONSUMER_SECRET, ACCESS_TOKEN, ACCESS_TOKEN_SECRET)
+    RAW_DIRNAME = "raw/"
 
-    # hydrate tweets into generator object
-    try:
-        JSON_generator = t.hydrate(tweet_ID_list)
-    except Exception as e:
-        print("Error in hydrating tweets")
-        print(e)
-        raise ValueError("Please resolve hydration issue.")
+    # checkpoint of the hydration, to resume a run that was interrupted
+    LOCAL_CHECKPOINT_PATH = TWEETS_PATH + "hydration_checkpoint.json"
+
+    # record per-stage metrics of the run
+    METRICS_PATH = "./../../tweets/run_metrics/"
+    metrics = RunMetrics("hydrate_tweets.py", METRICS_PATH)
+    metrics.info.update(incremental=args.incremental,
+                        chunksize=args.chunksize,
+                        raw=args.raw)
+    metrics.save_on_exit()
+
+    os.makedirs(PARTITIONS_PATH, exist_ok=True)
+
+    # get the store of hydrated IDs and the manifest of partitions of the last run, wherever it ran
+    # (a full run lists its chunks in a new manifest)
+    with metrics.stage("restore") as stage:
+        restores = [(LOCAL_HYDRATED_IDS_PATH, AWS_HYDRATED_IDS_PATH)]
+        if args.incremental:
+            restores.append((LOCAL_MANIFEST_PATH, AWS_PARTITIONS_PATH + MANIFEST_FILENAME))
 
-    # get list of JSONs
-    JSON_list = []
-    while True:
         try:
-            JSON_list.append(next(JSON_generator))
-        except StopIteration:
-            break
+            with stage.s3_transfer(num_transfers=len(restores)):
+                for local_file, s3_file in restores:
+                    restore_from_AWS(local_file,
+                                     s3_file,
+                                     "s3",
+                                     AWS_BUCKET,
+                                     AWS_ACCESS,
+                                     AWS_SECRET)
+        except Exception as e:
+            print("Error in loading the hydrated tweet IDs and manifest from AWS")
+            print(e)
+            raise ValueError(
+                "Please fix the error in loading the hydrated tweet IDs and manifest from AWS")
 
-    # transform into pandas df
-    df = pd.DataFrame(JSON_list)
+        stage.bytes_read = sum(file_size(local_file)
+                               for local_file, _ in restores)
 
-    # save locally
-    df.to_csv(LOCAL_EXPORT_TWEETS_PATH)
+    hydrated_store = TweetIDStore(LOCAL_HYDRATED_IDS_PATH)
 
-    try:
-        # save to AWS
-        save_to_AWS(LOCAL_EXPORT_TWEETS_PATH,
-                    AWS_EXPORT_TWEETS_PATH,
+    if args.incremental:
+        # each chunk of this run is a new partition
+        TWEETS_PREFIX = f"hydrated_tweets_{datetime.datetime.utcnow().strftime('%Y-%m-%dT%H%M%S')}"
+        LOCAL_EXPORT_TWEETS_DIR = PARTITIONS_PATH
+        AWS_EXPORT_TWEETS_DIR = AWS_PARTITIONS_PATH
+    else:
+        # a full run rewrites all the chunks, so it lists them in a new manifest
+        LOCAL_MANIFEST_PATH = LOCAL_EXPORT_TWEETS_DIR + MANIFEST_FILENAME
+
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(LOCAL_MANIFEST_PATH)
+
+    manifest = PartitionManifest(LOCAL_MANIFEST_PATH)
+
+    with metrics.stage("download_IDs") as stage:
+        try:
+            # get the file of IDs (or, in incremental mode, the store of scraped IDs) through the
+            # local cache of S3 objects, so it is only downloaded if 'scrape_tweets_daily.py' didn't
+            # run on this machine, or the file has changed since
+            with stage.s3_transfer():
+                if args.incremental:
+                    LOCAL_ID_STORE_PATH = fetch_from_AWS(AWS_ID_STORE_PATH,
+                                                         "s3",
+                                                         AWS_BUCKET,
+                                                         AWS_ACCESS,
+                                                         AWS_SECRET)
+                else:
+                    LOCAL_EXPORT_ID_PATH = fetch_from_AWS(AWS_EXPORT_ID_PATH,
+                                                          "s3",
+                                                          AWS_BUCKET,
+                                                          AWS_ACCESS,
+                                                          AWS_SECRET)
+        except Exception as e:
+            print("Error in loading tweet IDs from AWS")
+            print(e)
+            stage.add_error(e)
+
+        stage.bytes_read = file_size(
+            LOCAL_ID_STORE_PATH if args.incremental else LOCAL_EXPORT_ID_PATH)
+
+    # create array of tweet IDs (memory-mapped, the IDs are only turned into strings batch by batch)
+    with metrics.stage("load_IDs") as stage:
+        if args.incremental:
+            # only keep the IDs that haven't been hydrated yet
+            scraped_store = TweetIDStore(LOCAL_ID_STORE_PATH)
+            tweet_IDs = hydrated_store.difference(scraped_store.ids)
+
+            stage.rows_in = len(scraped_store)
+            stage.bytes_read = file_size(LOCAL_ID_STORE_PATH)
+
+            print(
+                f"{len(tweet_IDs)} of the {len(scraped_store)} scraped tweet IDs haven't been hydrated yet")
+        else:
+            tweet_IDs = TweetIDFile(LOCAL_EXPORT_ID_PATH).ids
+
+            stage.bytes_read = file_size(LOCAL_EXPORT_ID_PATH)
+
+        stage.rows_out = len(tweet_IDs)
+
+    if args.incremental and len(tweet_IDs) == 0:
+        print("No new tweet IDs to hydrate today")
+        print(
+            f"Finished with the execution of 'hydrate_tweets.py' at (in UTC time): {datetime.datetime.utcnow()}")
+        sys.exit(0)
+
+    # upload each chunk of tweets as soon as it is complete, while the hydration continues
+    # (raw chunks go to the "raw/" subdir of the S3 dir, like the local dir), then move it
+    # into the local cache of S3 objects, for 'preprocess_tweets.py'
+    def upload_chunk(path):
+        s3_file = AWS_EXPORT_TWEETS_DIR + \
+            os.path.relpath(path, LOCAL_EXPORT_TWEETS_DIR).replace(os.sep, "/")
+
+        save_to_AWS(path,
+                    s3_file,
                     "s3",
                     AWS_BUCKET,
                     AWS_ACCESS,
                     AWS_SECRET)
+        cache_uploaded_file(path,
+                            s3_file,
+                            "s3",
+                            AWS_BUCKET,
+                            AWS_ACCESS,
+                            AWS_SECRET)
+
+    uploader = BackgroundUploader(upload_chunk, remove_after_upload=False)
+
+    # resume the previous run if it was interrupted while hydrating the same tweet IDs
+    checkpoint = ChunkCheckpoint(LOCAL_CHECKPOINT_PATH,
+                                 {"incremental": args.incremental,
+                                  "num_IDs": len(tweet_IDs),
+                                  "first_ID": int(tweet_IDs[0]) if len(tweet_IDs) > 0 else None,
+                                  "last_ID": int(tweet_IDs[-1]) if len(tweet_IDs) > 0 else None,
+                                  "chunksize": args.chunksize,
+                                  "raw": args.raw})
+
+    if checkpoint.resumed:
+        TWEETS_PREFIX = checkpoint.info["prefix"]
+
+        print(
+            f"Resuming the hydration at tweet ID {checkpoint.next_offset} of {len(tweet_IDs)}, after {len(checkpoint.chunks)} chunks")
+
+        # upload the chunks whose upload didn't finish (uploaded chunks have been moved to the cache)
+        for chunk in checkpoint.chunks:
+            for path in [chunk["path"], chunk.get("raw_path")]:
+                if path is not None and os.path.exists(path):
+                    uploader.submit(path)
+    else:
+        checkpoint.info["prefix"] = TWEETS_PREFIX
+        checkpoint.save()
+
+    metrics.info["resumed_at"] = checkpoint.next_offset
+
+    with metrics.stage("hydrate") as stage:
+        stage.rows_in = len(tweet_IDs) - checkpoint.next_offset
+
+        # connect twarc, once per credential set, and spread the lookups over the credential sets
+        twarcs = [Twarc(credentials["consumer_key"], credentials["consumer_secret"],
+                        credentials["access_token"], credentials["access_token_secret"])
+                  for credentials in TWITTER_CREDENTIALS]
+        scheduler = HydrationScheduler([lambda batch, t=t: list(t.hydrate(batch))
+                                        for t in twarcs])
+
+        print(
+            f"Hydrating {len(tweet_IDs) - checkpoint.next_offset} tweet IDs with {len(twarcs)} sets of credentials...")
+
+        # hydrate the tweets batch by batch, writing their projections (and with '--raw', the full tweets)
+        # to chunks as they are hydrated (the local chunks are moved to the cache once uploaded). A chunk is only
+        # completed at the end of a batch, so that the checkpoint can record the batch that the next
+        # chunk starts at.
+        with JSONLChunkWriter(LOCAL_EXPORT_TWEETS_DIR,
+                              TWEETS_PREFIX,
+                              args.chunksize,
+                              on_chunk_done=uploader.submit,
+                              auto_rotate=False,
+                              first_chunk=len(checkpoint.chunks)) as writer, \
+            (JSONLChunkWriter(LOCAL_EXPORT_TWEETS_DIR + RAW_DIRNAME,
+                              TWEETS_PREFIX,
+                              args.chunksize,
+                              on_chunk_done=uploader.submit,
+                              auto_rotate=False,
+                              first_chunk=len(checkpoint.chunks)) if args.raw else contextlib.nullcontext()) as raw_writer:
+
+            try:
+                for end, tweets in scheduler.hydrate_batches(tweet_IDs, checkpoint.next_offset):
+                    for tweet in tweets:
+                        writer.write(project_tweet(tweet))
+
+                        if raw_writer is not None:
+                            raw_writer.write(tweet)
+
+                    if writer.is_full() or end >= len(tweet_IDs):
+                        if writer.rotate() is not None:
+                            chunk = dict(writer.chunks[-1])
+
+                            if raw_writer is not None:
+                                chunk["raw_path"] = raw_writer.rotate()
+
+                            checkpoint.add_chunk(chunk, end)
+            except Exception as e:
+                print(
+                    f"Error in hydrating tweets (the run can be resumed from tweet ID {checkpoint.next_offset})")
+                print(e)
+                raise ValueError("Please resolve hydration issue.")
+            finally:
+                scheduler.close()
+
+        stage.rows_out = writer.num_records
+        metrics.info.update(num_credential_sets=len(twarcs),
+                            rate_limit_wait_seconds=sum(scheduler.wait_seconds))
+
+        print(
+            f"Hydrated {checkpoint.num_records()} of the {len(tweet_IDs)} tweet IDs, into {len(checkpoint.chunks)} chunks")
+
+    try:
+        with metrics.stage("upload") as stage:
+            # wait for the uploads of the last chunks to finish
+            uploaded, failures = uploader.wait()
+
+            stage.rows_in = stage.rows_out = checkpoint.num_records()
+            stage.bytes_written = uploader.uploaded_bytes
+            stage.s3_seconds += uploader.upload_seconds
+            stage.s3_transfers += len(uploaded)
+
+            if len(failures) > 0:
+                for path, e in failures.items():
+                    print(f"Error in uploading {path}")
+                    print(e)
+
+                raise ValueError(
+                    f"{len(failures)} of the {len(checkpoint.chunks)} chunks of tweets couldn't be uploaded")
+
+            # record the hydrated IDs (including those of deleted tweets, so they aren't
+            # requested again), only once the tweets have been exported
+            hydrated_store.merge(tweet_IDs)
+
+            # list the chunks in the manifest (the new partitions in incremental mode, all the
+            # chunks otherwise), only once they have been exported
+            for chunk in checkpoint.chunks:
+                chunk_filename = os.path.basename(chunk["path"])
+                raw_s3_key = AWS_EXPORT_TWEETS_DIR + RAW_DIRNAME + \
+                    chunk_filename if chunk.get("raw_path") else None
+                manifest.add_partition(chunk_filename,
+                                       s3_key=AWS_EXPORT_TWEETS_DIR + chunk_filename,
+                                       raw_s3_key=raw_s3_key,
+                                       num_rows=chunk["num_records"])
+
+            os.makedirs(os.path.dirname(LOCAL_MANIFEST_PATH), exist_ok=True)
+            manifest.save()
+
+            # the manifest first: if the store of hydrated IDs isn't uploaded, the next run only
+            # hydrates these tweets again, while tweets missing from the manifest are never preprocessed
+            with stage.s3_transfer(num_transfers=2):
+                for local_file, s3_file in [(LOCAL_MANIFEST_PATH, AWS_EXPORT_TWEETS_DIR + MANIFEST_FILENAME),
+                                            (LOCAL_HYDRATED_IDS_PATH, AWS_HYDRATED_IDS_PATH)]:
+                    stage.bytes_written += save_state_to_AWS(local_file,
+                                                             s3_file,
+                                                             "s3",
+                                                             AWS_BUCKET,
+                                                             AWS_ACCESS,
+                                                             AWS_SECRET)
 
-        # remove local version
-        os.remove(LOCAL_EXPORT_TWEETS_PATH)
+            # the run is complete, the next run starts from scratch
+            checkpoint.remove()
     except Exception as e:
         print("Error in exporting the local files to AWS")
         print(e)
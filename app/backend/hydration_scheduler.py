@@ -0,0 +1,195 @@
+"""
+
+    hydration_scheduler.py
+
+    Spreads the hydration of tweet IDs over several sets of Twitter API credentials. The IDs are
+    split into lookup batches (100 IDs, the max per request), the batches are assigned to the
+    credential sets in turn, and each credential set has its own token bucket so that it never
+    goes over its rate limit. The batches come out in the same order as the IDs, whatever
+    the number of credential sets (within a batch, the tweets are in the order the API returns
+    them, without the deleted ones).
+
+"""
+import os
+import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# rate limit of the lookup API, per credential set (900 requests per 15 minutes)
+LOOKUP_REQUESTS_PER_WINDOW = 900
+LOOKUP_WINDOW_SECONDS = 15 * 60
+
+# max number of tweet IDs per lookup request
+LOOKUP_BATCH_SIZE = 100
+
+# keys of a credential set
+CREDENTIAL_KEYS = ["consumer_key", "consumer_secret",
+                   "access_token", "access_token_secret"]
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter: holds at most 'capacity' tokens, refilled at 'rate' tokens
+    per second, and each request takes one token (waiting for it if the bucket is empty)
+
+    Args:
+        rate: number of tokens (float) added per second
+        capacity: max number of tokens (int), i.e. the max burst of requests
+        clock: function returning the current time in seconds (for tests)
+        sleep: function sleeping for a number of seconds (for tests)
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(capacity)
+        self.last_refill = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self):
+        """
+        Takes a token, waiting until one is available. The token is reserved before waiting
+        (the bucket can go below 0 tokens), so the wait is computed once: re-checking the
+        bucket after the wait could come up a rounding error short of a token, and wait again.
+
+        Returns:
+            waited: number of seconds (float) spent waiting
+        """
+        with self.lock:
+            self._refill()
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+        if wait > 0:
+            self.sleep(wait)
+
+        return wait
+
+
+class HydrationScheduler:
+    """
+    Hydrates tweet IDs with several lookup functions (one per credential set), each
+    rate-limited by its own token bucket
+
+    Args:
+        lookups: functions (list), one per credential set, that take a batch of tweet IDs
+        (list of str) and return the hydrated tweets (list of dicts)
+        requests_per_window: number of lookups (int) allowed per credential set per window
+        window_seconds: length of the rate limit window, in seconds (float)
+        burst: max number of lookups (int) a credential set can make at once; its bucket is
+        refilled at (requests_per_window - burst) / window_seconds tokens per second, so that
+        no window (however it is aligned) has more than 'requests_per_window' lookups
+        max_pending_batches: max number of batches (int) being looked up or waiting to be
+        yielded at a time (bounds the memory used); by default 4 per credential set
+        clock, sleep: time functions of the token buckets (for tests)
+    """
+
+    def __init__(self, lookups, requests_per_window=LOOKUP_REQUESTS_PER_WINDOW,
+                 window_seconds=LOOKUP_WINDOW_SECONDS, burst=1, max_pending_batches=None,
+                 clock=time.monotonic, sleep=time.sleep):
+        if len(lookups) == 0:
+            raise ValueError("Please provide at least one set of credentials")
+
+        if not 1 <= burst < requests_per_window:
+            raise ValueError(
+                f"Please set a burst between 1 and {requests_per_window - 1} (the rate limit minus one)")
+
+        self.lookups = lookups
+        self.buckets = [TokenBucket((requests_per_window - burst) / window_seconds, burst,
+                                    clock, sleep)
+                        for _ in lookups]
+        self.max_pending_batches = max_pending_batches or 4 * len(lookups)
+
+        # one thread per credential set, so each set makes one request at a time
+        self.executors = [ThreadPoolExecutor(max_workers=1) for _ in lookups]
+        self.counts = [0 for _ in lookups]
+        self.wait_seconds = [0.0 for _ in lookups]
+
+    def _lookup(self, idx, batch):
+        self.wait_seconds[idx] += self.buckets[idx].acquire()
+        self.counts[idx] += 1
+
+        return self.lookups[idx](batch)
+
+    def hydrate_batches(self, tweet_IDs, start=0, batch_size=LOOKUP_BATCH_SIZE):
+        """
+        Hydrates tweet IDs, batch by batch. Batch i goes to credential set i % (number of sets).
+
+        Args:
+            tweet_IDs: tweet IDs (numpy int64 array)
+            start: offset (int) of the first tweet ID to hydrate, e.g. to resume a run
+            batch_size: number of tweet IDs (int) per lookup
+        Yields:
+            end: offset (int) of the first tweet ID after the batch
+            tweets: hydrated tweets of the batch (list of dicts), in the order the API returned
+            them (deleted or protected tweets are missing); the batches are yielded in order
+        """
+        pending = deque()
+
+        for batch_number, batch_start in enumerate(range(start, len(tweet_IDs), batch_size)):
+            batch = [str(tweet_ID)
+                     for tweet_ID in tweet_IDs[batch_start:batch_start + batch_size].tolist()]
+            idx = batch_number % len(self.lookups)
+
+            pending.append((batch_start + len(batch),
+                            self.executors[idx].submit(self._lookup, idx, batch)))
+
+            if len(pending) >= self.max_pending_batches:
+                end, future = pending.popleft()
+                yield (end, future.result())
+
+        while pending:
+            end, future = pending.popleft()
+            yield (end, future.result())
+
+    def hydrate(self, tweet_IDs):
+        """
+        Arg:
+            tweet_IDs: tweet IDs (numpy int64 array)
+        Yields:
+            tweet: hydrated tweet (dict), batch by batch in the order of the IDs (within a batch,
+            in the order the API returned them; deleted or protected tweets are missing)
+        """
+        for _, tweets in self.hydrate_batches(tweet_IDs):
+            yield from tweets
+
+    def close(self):
+        for executor in self.executors:
+            executor.shutdown(wait=False)
+
+
+def load_twitter_credentials(path=None):
+    """
+    Loads the sets of Twitter API credentials: from a JSON file (a list of dicts with the keys
+    in CREDENTIAL_KEYS), or if 'path' is None, the single set in the CONSUMER_KEY, CONSUMER_SECRET,
+    ACCESS_TOKEN and ACCESS_TOKEN_SECRET env vars
+
+    Arg:
+        path: path (str) of the JSON file of credentials (optional)
+    Returns:
+        credentials: list of dicts with the keys in CREDENTIAL_KEYS
+    """
+    if path is None:
+        return [{key: os.environ[key.upper()] for key in CREDENTIAL_KEYS}]
+
+    with open(path, "r") as f:
+        credentials = json.load(f)
+
+    for idx, credential_set in enumerate(credentials):
+        missing = [key for key in CREDENTIAL_KEYS if key not in credential_set]
+
+        if missing:
+            raise ValueError(
+                f"Credential set {idx} in {path} is missing {missing}")
+
+    return credentials
@@ -0,0 +1,102 @@
+"""
+
+    partition_manifest.py
+
+    Small JSON manifest that keeps track of the partitions (files) of a dataset that is
+    written incrementally, one partition per run.
+
+"""
+import os
+import json
+import datetime
+
+
+class PartitionManifest:
+    """
+    Manifest of the partitions of a dataset, stored as a JSON file of the form
+    {"partitions": [{"name": ..., "created_at": ..., <metadata>}, ...]}
+
+    Arg:
+        path: path (str) of the manifest file (it doesn't have to exist yet); None for a
+        manifest that isn't stored locally (see 'from_json' and 'to_json')
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+
+        if path is not None and os.path.exists(path):
+            with open(path, "r") as f:
+                self.partitions = json.load(f)["partitions"]
+        else:
+            self.partitions = []
+
+    @classmethod
+    def from_json(cls, text):
+        """
+        Arg:
+            text: JSON (str or bytes) of a manifest, e.g. as downloaded from S3
+        Returns:
+            manifest: PartitionManifest, with no local path
+        """
+        manifest = cls()
+        manifest.partitions = json.loads(text)["partitions"]
+
+        return manifest
+
+    def to_json(self):
+        """
+        Returns:
+            text: JSON (str) of the manifest
+        """
+        return json.dumps({"partitions": self.partitions}, indent=2)
+
+    def partition_names(self):
+        """
+        Returns:
+            names: names of the partitions, in the order they were added (list of str)
+        """
+        return [partition["name"] for partition in self.partitions]
+
+    def has_partition(self, name):
+        """
+        Arg:
+            name: name of a partition (str)
+        Returns:
+            has_partition: is the partition in the manifest? (bool)
+        """
+        return name in self.partition_names()
+
+    def add_partition(self, name, **metadata):
+        """
+        Adds a partition to the manifest (replacing any partition with the same name).
+        Call 'save' to write the manifest.
+
+        Args:
+            name: name of the partition (str), e.g. its filename
+            metadata: any other (JSON-serializable) info about the partition, e.g. its number of rows
+        Returns:
+            partition: the manifest entry of the partition (dict)
+        """
+        partition = {"name": name,
+                     "created_at": datetime.datetime.utcnow().isoformat(),
+                     **metadata}
+
+        self.partitions = [p for p in self.partitions if p["name"] != name]
+        self.partitions.append(partition)
+
+        return partition
+
+    def save(self):
+        """
+        Writes the manifest to its path. The manifest is written to a temporary file first,
+        so an interrupted save never leaves a half-written manifest behind.
+        """
+        if self.path is None:
+            raise ValueError("Please give the manifest a path to save it to")
+
+        tmp_path = self.path + ".tmp"
+
+        with open(tmp_path, "w") as f:
+            f.write(self.to_json())
+
+        os.replace(tmp_path, self.path)
@@ -6,15 +6,43 @@
 
 """
 import os
+import sys
 import ast
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-import emoji
-import re
-import nltk
 import datetime
-from nltk.corpus import stopwords
 import aws_helpers
-from aws_helpers import save_to_AWS, load_from_AWS
+from aws_helpers import save_to_AWS, load_from_AWS, fetch_from_AWS, load_fileobj_from_AWS, \
+    restore_from_AWS, save_state_to_AWS
+from tweet_text import TweetTextAnalyzer
+from tweet_parquet import PreprocessedTweetsParquetWriter, write_preprocessed_tweets
+from partition_manifest import PartitionManifest
+from run_metrics import RunMetrics, file_size
+from tweet_id_store import TweetIDStore, isin_sorted
+from tweet_projection import PROJECTED_TWEET_COLUMNS, PROJECTED_TWEET_DTYPES, is_projected
+from stream_compression import COMPRESSION_EXTENSIONS, infer_compression, compressed_path, open_compressed
+
+# format of the "created_at" field in tweets (e.g., "Wed Oct 10 20:19:24 +0000 2018")
+TWITTER_TIMESTAMP_FORMAT = "%a %b %d %H:%M:%S %z %Y"
+
+# columns of the hydrated tweets that are kept for preprocessing
+TWEET_COLUMNS = ["user", "created_at", "id",
+                 "full_text", "geo", "coordinates",
+                 "place", "retweet_count", "favorite_count"]
+
+# columns derived from the "place" field
+LOCATION_COLUMNS = ["is_USA", "country", "state"]
+
+# columns derived from the "created_at" field
+DATE_COLUMNS = ["date", "year", "month", "day", "hour"]
+
+# place decoder and text analyzer, built once per process
+# (see 'get_place_decoder' and 'get_text_analyzer')
+_PLACE_DECODER = None
+_TEXT_ANALYZER = None
 
 
 def parse_location(location_dict):
@@ -46,186 +74,621 @@ def parse_location(location_dict):
             return (True, "US", state)
 
 
-def parse_dates(timestamp):
+def parse_dates_column(timestamps):
     """
-    Processes the date information and extracts date and time information
+    Column-level version of 'parse_dates' (see 'benchmarks/reference_preprocessing.py'), with
+    the same formatting. Parses every timestamp in one pass, using the explicit Twitter timestamp
+    format, and formats each distinct day only once. Timestamps that can't be parsed become nulls.
+
     Arg:
-        timestamp: timestamp of date + time (str)
+        timestamps: "created_at" column of the tweets df (pandas Series of str)
     Returns:
-        date: human-readable date (str) (e.g., "2021-02-09")
-        year: calendar year (int)
-        month: calendar month (str, "00" to "12")
-        day: calendar day (int)
-        hour: hour of day (int)
+        dates_df: pandas df, indexed like 'timestamps', with cols:
+            date: human-readable date (str) (e.g., "2021-02-9")
+            year: calendar year (Int16)
+            month: calendar month (str, "01" to "12")
+            day: calendar day (Int8)
+            hour: hour of day, in UTC (Int8)
+    """
+    parsed = pd.to_datetime(timestamps,
+                            format=TWITTER_TIMESTAMP_FORMAT,
+                            errors="coerce",
+                            utc=True)
+
+    # the tweets span few distinct days (unparsed timestamps get the code -1, i.e. the last,
+    # null, value of the formatted arrays)
+    codes, days = pd.factorize(parsed.dt.floor("D"))
+    dates = np.array([f"{day.year}-{day.month:02d}-{day.day}" for day in days] + [np.nan],
+                     dtype=object)
+    months = np.array([f"{day.month:02d}" for day in days] + [np.nan], dtype=object)
+
+    dates_df = pd.DataFrame({"date": dates[codes],
+                             "year": parsed.dt.year.astype("Int16"),
+                             "month": months[codes],
+                             "day": parsed.dt.day.astype("Int8"),
+                             "hour": parsed.dt.hour.astype("Int8")},
+                            index=timestamps.index)
 
+    return dates_df
+
+
+def try_literal_eval(text):
     """
-    hour = pd.to_datetime(timestamp).hour
-    dt_obj = pd.to_datetime(timestamp).date()
-    year = dt_obj.year
-    month = dt_obj.month
-    day = dt_obj.day
+    Tries to use ast's literal_eval function to 
+    evaluate a string into its literal representation (e.g., 'dict')
 
-    if month < 10:
-        month = f"0{month}"
+    Arg:
+        text: string representation
+    Returns:
+        eval: literal representation of parsed string
+    """
+    try:
+        eval = ast.literal_eval(text)
+    except Exception as e:
+        eval = None
 
-    month = str(month)
+    return eval
 
-    date = f"{year}-{month}-{day}"
 
-    return (date, year, month, day, hour)
+class PlaceDecoder:
+    """
+    Decodes the "place" column into location information. Most tweets share a small set of
+    places, so each distinct place is parsed only once and its location information is cached
+    (keyed by the place string, or by the place id for places that are already dicts).
+
+    Counts of the rows decoded are kept in 'counts':
+        rows: number of rows decoded
+        empty: number of rows without a place
+        parsed: number of distinct places parsed (i.e., cache misses)
+    """
 
+    def __init__(self):
+        self.cache = {}
+        self.counts = Counter()
+
+    @staticmethod
+    def cache_key(place):
+        """
+        Gets the key to cache a place's location information under
+
+        Arg:
+            place: value from "place" field from tweet data (str or dict)
+        Returns:
+            key: the place string, or the place id for dicts (hashable)
+        """
+        if isinstance(place, dict):
+            return ("id", place.get("id", repr(place)))
+
+        return place
+
+    def decode(self, place):
+        """
+        Gets the location information of a single place, without the cache
+
+        Arg:
+            place: value from "place" field from tweet data (str or dict)
+        Returns:
+            is_USA, country_location, state: see 'parse_location'
+        """
+        location_dict = place if isinstance(
+            place, dict) else try_literal_eval(place)
 
-def remove_emoji(text):
+        try:
+            return parse_location(location_dict)
+        except Exception as e:
+            print("Error in decoding the locations column and getting locations")
+            print(f"The location was: {location_dict}\n")
+            print(f"The error was: {e}\n")
+            if type(location_dict) == int:
+                return ("N/A", "N/A", "N/A")
+            else:
+                raise ValueError(
+                    "Please address error in decoding the locations column")
+
+    def decode_column(self, places):
+        """
+        Column-level version of 'parse_location'. Parses each distinct place that isn't
+        already cached and maps the location information back onto the rows.
+
+        Arg:
+            places: "place" column of the tweets df (pandas Series of str or dict)
+        Returns:
+            locations_df: pandas df, indexed like 'places', with one col per name in LOCATION_COLUMNS
+        """
+        try:
+            # codes[i] is the position of row i's place in 'distinct_places' (-1 if no place)
+            codes, distinct_places = pd.factorize(places)
+        except TypeError:
+            # dicts aren't hashable, so factorize their cache keys instead
+            codes, _ = pd.factorize(places.map(self.cache_key))
+            distinct_codes, first_positions = np.unique(
+                codes, return_index=True)
+            distinct_places = places.iloc[first_positions[distinct_codes >= 0]].values
+
+        num_distinct = len(distinct_places)
+
+        # last entry is for rows without a place (code -1)
+        is_USA_arr = np.empty(num_distinct + 1, dtype=object)
+        country_arr = np.empty(num_distinct + 1, dtype=object)
+        state_arr = np.empty(num_distinct + 1, dtype=object)
+        is_USA_arr[-1] = country_arr[-1] = state_arr[-1] = "N/A"
+
+        for idx, place in enumerate(distinct_places):
+            key = self.cache_key(place)
+            location = self.cache.get(key)
+
+            if location is None:
+                location = self.decode(place)
+                self.cache[key] = location
+                self.counts["parsed"] += 1
+
+            is_USA_arr[idx], country_arr[idx], state_arr[idx] = location
+
+        self.counts["rows"] += len(codes)
+        self.counts["empty"] += int((codes == -1).sum())
+
+        return pd.DataFrame({"is_USA": is_USA_arr.take(codes),
+                             "country": country_arr.take(codes),
+                             "state": state_arr.take(codes)},
+                            index=places.index)
+
+    def decode_flat_columns(self, country_codes, full_names):
+        """
+        Version of 'decode_column' for projected tweets, whose place is already split into
+        flat columns (no parsing needed). Each distinct (country code, full name) pair is
+        decoded once.
+
+        Args:
+            country_codes: "place_country_code" column of the tweets df (pandas Series of str)
+            full_names: "place_full_name" column of the tweets df (pandas Series of str)
+        Returns:
+            locations_df: pandas df, indexed like 'country_codes', with one col per name in LOCATION_COLUMNS
+        """
+        has_place = country_codes.notna()
+        keys = (country_codes + "\x00" + full_names.fillna("")).where(has_place)
+
+        # codes[i] is the number of row i's place, in order of first appearance (-1 if no place)
+        codes, _ = pd.factorize(keys)
+        distinct_codes, first_positions = np.unique(codes, return_index=True)
+        first_positions = first_positions[distinct_codes >= 0]
+
+        # last entry is for rows without a place (code -1)
+        is_USA_arr = np.empty(len(first_positions) + 1, dtype=object)
+        country_arr = np.empty(len(first_positions) + 1, dtype=object)
+        state_arr = np.empty(len(first_positions) + 1, dtype=object)
+        is_USA_arr[-1] = country_arr[-1] = state_arr[-1] = "N/A"
+
+        for idx, position in enumerate(first_positions):
+            full_name = full_names.iat[position]
+            key = ("flat", country_codes.iat[position], full_name)
+            location = self.cache.get(key)
+
+            if location is None:
+                location = self.decode({"country_code": country_codes.iat[position],
+                                        "full_name": full_name if isinstance(full_name, str) else ""})
+                self.cache[key] = location
+                self.counts["parsed"] += 1
+
+            is_USA_arr[idx], country_arr[idx], state_arr[idx] = location
+
+        self.counts["rows"] += len(codes)
+        self.counts["empty"] += int((codes == -1).sum())
+
+        return pd.DataFrame({"is_USA": is_USA_arr.take(codes),
+                             "country": country_arr.take(codes),
+                             "state": state_arr.take(codes)},
+                            index=country_codes.index)
+
+    def hit_rate(self):
+        """
+        Gets the share of the rows with a place whose location information came from the cache
+
+        Returns:
+            hit_rate: share of cache hits (float, 0 to 1)
+        """
+        num_lookups = self.counts["rows"] - self.counts["empty"]
+
+        if num_lookups == 0:
+            return 0.0
+
+        return (num_lookups - self.counts["parsed"]) / num_lookups
+
+
+def get_place_decoder():
     """
-    Removes emojis from a text
+    Returns the place decoder of this process, building it on first use (so that
+    its cache is reused across chunks)
 
-    Args:
-        text: tweet/text to clean (str)
     Returns:
-        clean_text: tweet/text without emojis (str)
+        decoder: PlaceDecoder
     """
+    global _PLACE_DECODER
+
+    if _PLACE_DECODER is None:
+        _PLACE_DECODER = PlaceDecoder()
 
-    text = text.encode("utf-8")
-    allchars = [str for str in text.decode('utf-8')]
-    emoji_list = [c for c in allchars if c in emoji.UNICODE_EMOJI]
-    clean_text = ' '.join([str for str in text.decode(
-        'utf-8').split() if not any(i in str for i in emoji_list)])
-    return clean_text
+    return _PLACE_DECODER
 
 
-def clean_text(text):
+def get_text_analyzer():
     """
-    Removes punctuation, does string split (tokenization) and removes links
-    Args:
-        text: tweet/text to clean (str)
+    Returns the text analyzer of this process, building it on first use (so that
+    each worker process only loads the stopwords once)
+
     Returns:
-        tokenized_text_arr: tokenized and cleaned text (list of strings)
+        analyzer: TweetTextAnalyzer
     """
+    global _TEXT_ANALYZER
+
+    if _TEXT_ANALYZER is None:
+        _TEXT_ANALYZER = TweetTextAnalyzer()
 
-    PUNCTUATION = '''!()-[]{};:'"\,<>./?@$%^&*_~'''  # keep hashtags
-    STOPWORDS = stopwords.words("english")
+    return _TEXT_ANALYZER
 
-    # remove punctuation
-    text_no_punctuation = ""
 
-    for char in text:
-        if char not in PUNCTUATION:
-            text_no_punctuation = text_no_punctuation + char
+def preprocess_tweets_df(tweets_df):
+    """
+    Runs the location, date and text stages on a df of hydrated tweets.
+    Each row is processed independently of the others, so this can be run on any
+    chunk of rows.
 
-    # remove emojis
-    text_no_punctuation = remove_emoji(text_no_punctuation)
+    Arg:
+        tweets_df: pandas df of hydrated tweets (full or projected tweets)
+    Returns:
+        preprocessed_df: copy of 'tweets_df' with the LOCATION_COLUMNS, DATE_COLUMNS and
+        TEXT_COLUMNS added
+    """
+    preprocessed_df = tweets_df.copy()
 
-    # remove \n and \t
-    text_no_punctuation = re.sub(r'\n', '', text_no_punctuation)
-    text_no_punctuation = re.sub(r'\t', '', text_no_punctuation)
+    # get location information (projected tweets already have the place's fields as cols)
+    if is_projected(preprocessed_df.columns):
+        locations_df = get_place_decoder().decode_flat_columns(preprocessed_df["place_country_code"],
+                                                               preprocessed_df["place_full_name"])
+    else:
+        locations_df = get_place_decoder().decode_column(
+            preprocessed_df["place"])
 
-    # remove escape sequences
-    text_no_escape = ""
+    # get date info (timestamps that can't be parsed get null date info)
+    dates_df = parse_dates_column(preprocessed_df["created_at"])
 
-    for char in text_no_punctuation:
-        try:
-            char.encode('ascii')
-            # this'll catch chars that don't have an ascii equivalent (e.g., emojis)
-            text_no_escape = text_no_escape + char
-        except:
-            pass
+    # get tokenized text and hashtags
+    try:
+        text_df = get_text_analyzer().analyze_series(
+            preprocessed_df["full_text"])
+    except Exception as e:
+        print("Error in parsing the text column")
+        print(f"The error was: {e}\n")
+        raise ValueError(
+            "Please address error in parsing the text column")
 
-    # add space between # and another char before it (e.g., split yes#baseball into yes #baseball)
-    text_no_escape = re.sub(r"([a-zA-Z0-9]){1}#", r"\1 #", text_no_escape)
+    for stage_df in [locations_df, dates_df, text_df]:
+        for col in stage_df.columns:
+            preprocessed_df[col] = stage_df[col]
 
-    # string split
-    text_arr = text_no_escape.split(' ')
+    return preprocessed_df
 
-    tokenized_text_arr = []
 
-    for word in text_arr:
+def _preprocess_tweets_chunk(tweets_df):
+    """
+    Runs 'preprocess_tweets_df' in a worker process. Also returns the counts of the
+    worker's place decoder for this chunk, so they can be added up in the main process.
 
-        word = word.lower()
+    Arg:
+        tweets_df: pandas df of hydrated tweets
+    Returns:
+        preprocessed_df: pandas df, output of 'preprocess_tweets_df'
+        place_counts: counts of the place decoder for this chunk (Counter)
+    """
+    decoder = get_place_decoder()
+    counts_before = decoder.counts.copy()
 
-        if "http" not in word and word.strip() != '' and word not in STOPWORDS:
-            tokenized_text_arr.append(word)
+    preprocessed_df = preprocess_tweets_df(tweets_df)
 
-    return tokenized_text_arr
+    return (preprocessed_df, decoder.counts - counts_before)
 
 
-def parse_hashtags(text):
+def preprocess_tweets_parallel(tweets_df, num_workers, chunk_size=None, executor=None):
     """
-    Extracts both (1) the hashtags in a piece of text as well as 
-    (2) the parts of the text that don't have a hashtag
+    Splits a df of hydrated tweets into chunks of rows and runs 'preprocess_tweets_df'
+    on them in a pool of processes. The chunks are merged back in their original order,
+    so the result is the same as running 'preprocess_tweets_df' on the whole df.
 
     Args:
-        text: tweet/piece of text (str)
-    Return:
-        hashtag_arr: array of hashtags (list of strings)
-        non_hashtag_arr: array of non-hashtag words (list of strings)
-    """
-    hashtag_arr = []
-    non_hashtag_arr = []
-
-    tokenized_text_arr = text.split(' ')
-
-    for word in tokenized_text_arr:
-        if '#' in word:
-            # how many hashtags are in the word?
-            num_hashtags = 0
-            for char in word:
-                if char == '#':
-                    num_hashtags += 1
-
-            # if multiple hashtag words are squished together, split them on '#' and return the resulting words
-            if num_hashtags > 1:
-                word_arr = word.split('#')
-                for inner_word in word_arr:
-                    if inner_word != '#':
-                        hashtag_arr.append("#" + inner_word)
-            # else, if only one hashtag, add as is
-            else:
-                hashtag_arr.append(word)
+        tweets_df: pandas df of hydrated tweets
+        num_workers: number of worker processes (int)
+        chunk_size: number of rows per chunk (int); defaults to splitting the df into
+        4 chunks per worker, to balance the load between workers
+        executor: pool of processes to reuse across calls (ProcessPoolExecutor); if not
+        given, a pool is started and shut down within this call
+    Returns:
+        preprocessed_df: pandas df, same as the output of 'preprocess_tweets_df'
+    """
+    num_rows = tweets_df.shape[0]
+
+    if chunk_size is None:
+        chunk_size = max(1, -(-num_rows // (num_workers * 4)))
+
+    chunks = [tweets_df.iloc[start:start + chunk_size]
+              for start in range(0, num_rows, chunk_size)]
+
+    if len(chunks) <= 1:
+        return preprocess_tweets_df(tweets_df)
+
+    # 'map' returns the results in the same order as the chunks
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            results = list(executor.map(_preprocess_tweets_chunk, chunks))
+    else:
+        results = list(executor.map(_preprocess_tweets_chunk, chunks))
 
-        else:
-            non_hashtag_arr.append(word)
+    # add up the place decoder counts of the workers
+    decoder = get_place_decoder()
+    for _, place_counts in results:
+        decoder.counts.update(place_counts)
 
-    return (hashtag_arr, non_hashtag_arr)
+    return pd.concat([preprocessed_df for preprocessed_df, _ in results])
 
 
-def count_hashtags(text):
+def is_jsonl_file(path):
     """
-    Counts the number of hashtags in a piece of text
+    Arg:
+        path: path (str) of a file of hydrated tweets
+    Returns:
+        is_jsonl: is it a JSONL file (one tweet JSON per line, possibly compressed), as written by
+        'hydrate_tweets.py', rather than a .csv file? (bool)
+    """
+    return path.endswith(tuple([".jsonl"] + [".jsonl" + extension
+                                             for extension in COMPRESSION_EXTENSIONS.values()]))
+
+
+def read_hydrated_tweets(path, chunk_size=None):
+    """
+    Reads a file of hydrated tweets (.csv, or JSONL chunk written by 'hydrate_tweets.py', either
+    possibly gzip or zstd compressed), keeping the TWEET_COLUMNS cols, in that order. Files of projected tweets (see
+    'tweet_projection.py') keep the PROJECTED_TWEET_COLUMNS cols instead, with their dtypes.
+
     Args:
-        text: tweet/piece of text (str)
-    Return:
-        count: number of hashtags (#s) in text
+        path: path (str) of the file
+        chunk_size: number of rows (int) per chunk; if None, the whole file is read at once
+    Returns:
+        tweets: pandas df of hydrated tweets, or (if 'chunk_size' is given) an iterator of dfs
+        of at most 'chunk_size' tweets. In JSONL files of full tweets, nested fields (e.g. "place") are dicts.
     """
-    text_arr = text.split(' ')
-    count = 0
+    if chunk_size is not None:
+        return _read_hydrated_tweet_chunks(path, chunk_size)
 
-    for word in text_arr:
-        if '#' in word:
-            count += 1
+    source = _open_hydrated_tweets(path)
 
-    return count
+    try:
+        return _select_tweet_columns(_read_tweets_file(path, source))
+    finally:
+        if source is not path:
+            source.close()
 
 
-def try_literal_eval(text):
+def _read_hydrated_tweet_chunks(path, chunk_size):
     """
-    Tries to use ast's literal_eval function to 
-    evaluate a string into its literal representation (e.g., 'dict')
+    Generator of the chunks of 'read_hydrated_tweets': the file is opened when the first chunk
+    is read, and closed after the last one, or when the generator is closed before that
+
+    Args:
+        path: path (str) of the file
+        chunk_size: number of rows (int) per chunk
+    Yields:
+        tweets_df: pandas df of at most 'chunk_size' hydrated tweets
+    """
+    source = _open_hydrated_tweets(path)
+
+    try:
+        reader = _read_tweets_file(path, source, chunk_size)
 
+        try:
+            for chunk_df in reader:
+                yield _select_tweet_columns(chunk_df)
+        finally:
+            reader.close()
+    finally:
+        if source is not path:
+            source.close()
+
+
+def _open_hydrated_tweets(path):
+    """
     Arg:
-        text: string representation
+        path: path (str) of a file of hydrated tweets
     Returns:
-        eval: literal representation of parsed string
+        source: file object of the decompressed content for zstd files (to be closed by the
+        caller), 'path' itself otherwise, as pandas decompresses gzip files itself
+    """
+    if infer_compression(path) == "zstd":
+        return open_compressed(path, "rb")
+
+    return path
+
+
+def _read_tweets_file(path, source, chunk_size=None):
     """
+    Args:
+        path: path (str) of the file of hydrated tweets
+        source: 'path', or file object of its content
+        chunk_size: number of rows (int) per chunk; if None, the whole file is read at once
+    Returns:
+        tweets: pandas df of the tweets, as read from the file, or a reader of chunks of dfs
+    """
+    if is_jsonl_file(path):
+        # keep the raw values (e.g. don't parse "created_at" into dates)
+        return pd.read_json(source, lines=True, chunksize=chunk_size,
+                            dtype=False, convert_dates=False)
+
+    return pd.read_csv(source, usecols=TWEET_COLUMNS, chunksize=chunk_size)
+
+
+def _select_tweet_columns(tweets_df):
+    """
+    Arg:
+        tweets_df: pandas df of hydrated tweets, as read from a file
+    Returns:
+        tweets_df: the df with the PROJECTED_TWEET_COLUMNS cols (and dtypes) if the tweets are
+        projected, the TWEET_COLUMNS cols otherwise
+    """
+    if is_projected(tweets_df.columns):
+        return tweets_df.reindex(columns=PROJECTED_TWEET_COLUMNS).astype(PROJECTED_TWEET_DTYPES)
+
+    return tweets_df.reindex(columns=TWEET_COLUMNS)
+
+
+def drop_processed_tweets(tweets_df, processed_IDs):
+    """
+    Drops the tweets that have already been preprocessed
+
+    Args:
+        tweets_df: pandas df of hydrated tweets
+        processed_IDs: sorted array of tweet IDs that have already been preprocessed (numpy int64 array)
+    Returns:
+        new_tweets_df: the rows of 'tweets_df' whose "id" isn't in 'processed_IDs'
+    """
+    is_processed = isin_sorted(tweets_df["id"].to_numpy(dtype=np.int64),
+                               processed_IDs)
+
+    return tweets_df[~is_processed]
+
+
+def new_hydrated_partitions(hydrated_manifest, manifest):
+    """
+    Args:
+        hydrated_manifest: PartitionManifest of the partitions of hydrated tweets
+        manifest: PartitionManifest of the partitions of preprocessed tweets, each listing the
+        names of the hydrated partitions it was preprocessed from (in "hydrated_partitions")
+    Returns:
+        partitions: the entries of the hydrated partitions that haven't been preprocessed yet,
+        in the order of their manifest (list of dicts)
+    """
+    consumed = {name for partition in manifest.partitions
+                for name in partition.get("hydrated_partitions", [])}
+
+    return [partition for partition in hydrated_manifest.partitions
+            if partition["name"] not in consumed]
+
+
+def preprocess_tweets_csv_streaming(input_path, output_path, chunk_size, num_workers=1, output_format="csv",
+                                    processed_IDs=None):
+    """
+    Preprocesses files of hydrated tweets in fixed-size chunks of rows, appending
+    each preprocessed chunk to the output file as soon as it is done. Only one chunk
+    is held in memory at a time, so memory use doesn't grow with the size of the files.
+    The output is the same as preprocessing the whole files at once.
+
+    Args:
+        input_path: path (str) to the file of hydrated tweets (.csv or JSONL), or a list of paths
+        output_path: path (str) of the preprocessed file to write
+        chunk_size: number of rows (int) to read and preprocess at a time
+        num_workers: number of processes (int) to preprocess each chunk with
+        output_format: format of the output file, "csv" or "parquet" (str)
+        processed_IDs: sorted array of tweet IDs to skip, because they have already been
+        preprocessed (numpy int64 array)
+    Returns:
+        num_rows: number of tweets preprocessed (int)
+        num_bad_timestamps: number of tweets whose timestamp couldn't be parsed (int)
+        tweet_IDs: IDs of the tweets preprocessed (numpy int64 array)
+    """
+    num_rows = 0
+    num_bad_timestamps = 0
+    tweet_IDs_list = []
+
+    executor = ProcessPoolExecutor(
+        max_workers=num_workers) if num_workers > 1 else None
+    parquet_writer = PreprocessedTweetsParquetWriter(
+        output_path) if output_format == "parquet" else None
+
+    input_paths = [input_path] if isinstance(input_path, str) else input_path
+    readers = (chunk_df for path in input_paths
+               for chunk_df in read_hydrated_tweets(path, chunk_size))
+
+    columns = None
+
+    # number of rows read so far, across files: each file's row index starts at 0, so the rows
+    # are numbered by their offset in all the files, as in 'pd.concat(..., ignore_index=True)'
+    row_offset = 0
+
     try:
-        eval = ast.literal_eval(text)
-    except Exception as e:
-        eval = None
+        for chunk_df in readers:
+            chunk_df.index = pd.RangeIndex(row_offset, row_offset + chunk_df.shape[0])
+            row_offset += chunk_df.shape[0]
+
+            # all the chunks are appended to one file, so they must have the same cols
+            if columns is None:
+                columns = list(chunk_df.columns)
+            elif list(chunk_df.columns) != columns:
+                raise ValueError(
+                    "Please preprocess files of full tweets and files of projected tweets separately")
 
-    return eval
+            if processed_IDs is not None:
+                chunk_df = drop_processed_tweets(chunk_df, processed_IDs)
+
+                if chunk_df.shape[0] == 0:
+                    continue
+
+            if executor is not None:
+                preprocessed_df = preprocess_tweets_parallel(
+                    chunk_df, num_workers, executor=executor)
+            else:
+                preprocessed_df = preprocess_tweets_df(chunk_df)
+
+            if parquet_writer is not None:
+                parquet_writer.write(preprocessed_df)
+            else:
+                # first chunk creates the file (with header), the rest are appended
+                preprocessed_df.to_csv(output_path,
+                                       mode="w" if num_rows == 0 else "a",
+                                       header=num_rows == 0)
+
+            num_rows += preprocessed_df.shape[0]
+            num_bad_timestamps += int(preprocessed_df["date"].isna().sum())
+            tweet_IDs_list.append(
+                preprocessed_df["id"].to_numpy(dtype=np.int64))
+
+            print(f"Preprocessed {num_rows} tweets so far...")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if parquet_writer is not None:
+            parquet_writer.close()
+
+    tweet_IDs = np.concatenate(
+        tweet_IDs_list) if tweet_IDs_list else np.array([], dtype=np.int64)
+
+    return (num_rows, num_bad_timestamps, tweet_IDs)
 
 
 if __name__ == "__main__":
 
+    # get args
+    parser = argparse.ArgumentParser(
+        description="Cleans and preprocesses hydrated tweets")
+    parser.add_argument("--input", nargs="+", default=None,
+                        help="local files of hydrated tweets to preprocess (.csv, or .jsonl.gz chunks "
+                        "written by 'hydrate_tweets.py', optionally .gz / .zst compressed); by default, "
+                        "the chunks listed in the manifest of the hydrated tweets (of the partitions of "
+                        "new tweets in incremental mode)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes to preprocess the tweets with (default: 1)")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="stream the hydrated tweets in chunks of this many rows, "
+                        "instead of loading the whole file into memory")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                        help="format of the preprocessed tweets file (default: csv)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only preprocess tweets that haven't been preprocessed yet, "
+                        "and write them as a new partition")
+    parser.add_argument("--compression", choices=list(COMPRESSION_EXTENSIONS), default=None,
+                        help="compress the preprocessed tweets .csv file as it is uploaded "
+                        "(its S3 key gets the extension of the compression, e.g. '.csv.zst')")
+    args = parser.parse_args()
+
+    if args.compression is not None and args.format == "parquet":
+        parser.error(
+            "--compression only applies to the csv format (Parquet files are compressed by column)")
+
     # change dir to this file's directory
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
@@ -236,160 +699,281 @@ if __name__ == "__main__":
 
     # initialize paths
     AWS_TWEET_DIR = "tweet_scrapes/"
-    HYDRATED_TWEETS_PATH = "./../../tweets/hydrated_tweets/"
     PREPROCESSED_TWEETS_PATH = "./../../tweets/preprocessed_tweets/"
 
-    # full paths of files
-    HYDRATED_TWEETS_FILENAME = "hydrated_tweets_2020-03-20_2021-02-09.csv"
-    PREPROCESSED_TWEETS_FILENAME = "preprocessed_tweets_2020-03-20_2021-02-09.csv"
-    LOCAL_HYDRATED_TWEETS_PATH = HYDRATED_TWEETS_PATH + HYDRATED_TWEETS_FILENAME
+    # full paths of files (the hydrated tweets are the chunks listed in the manifest of their
+    # dir, written by 'hydrate_tweets.py')
+    MANIFEST_FILENAME = "manifest.json"
+    PREPROCESSED_TWEETS_FILENAME = f"preprocessed_tweets_2020-03-20_2021-02-09.{args.format}"
     LOCAL_PREPROCESSED_TWEETS_PATH = PREPROCESSED_TWEETS_PATH + \
         PREPROCESSED_TWEETS_FILENAME
 
-    AWS_HYDRATED_TWEETS_PATH = AWS_TWEET_DIR + \
-        "hydrated_tweets/" + HYDRATED_TWEETS_FILENAME
+    AWS_HYDRATED_MANIFEST_PATH = AWS_TWEET_DIR + \
+        "hydrated_tweets/hydrated_tweets_2020-03-20_2021-02-09/" + MANIFEST_FILENAME
     AWS_PREPROCESSED_TWEETS_PATH = AWS_TWEET_DIR + \
         "preprocessed_tweets/" + PREPROCESSED_TWEETS_FILENAME
 
-    # load tweets from AWS, use subset of cols
-    # for now, can choose to use local version of file, rather than manually load it
+    # paths for incremental mode (one partition of new tweets per run, tracked by a manifest that
+    # lists the hydrated partitions each one was preprocessed from, and the store of the IDs of the
+    # tweets preprocessed so far, both kept in AWS too so that a run can start on any machine)
+    PARTITIONS_PATH = PREPROCESSED_TWEETS_PATH + "partitions/"
+    PROCESSED_IDS_FILENAME = "processed_tweet_IDs.npy"
+    LOCAL_MANIFEST_PATH = PARTITIONS_PATH + MANIFEST_FILENAME
+    LOCAL_PROCESSED_IDS_PATH = PARTITIONS_PATH + PROCESSED_IDS_FILENAME
+    AWS_PARTITIONS_PATH = AWS_TWEET_DIR + "preprocessed_tweets/partitions/"
+    AWS_MANIFEST_PATH = AWS_PARTITIONS_PATH + MANIFEST_FILENAME
+    AWS_PROCESSED_IDS_PATH = AWS_PARTITIONS_PATH + PROCESSED_IDS_FILENAME
+
+    # record per-stage metrics of the run
+    METRICS_PATH = "./../../tweets/run_metrics/"
+    metrics = RunMetrics("preprocess_tweets.py", METRICS_PATH)
+    metrics.info.update(workers=args.workers, chunksize=args.chunksize,
+                        format=args.format, incremental=args.incremental,
+                        compression=args.compression)
+    metrics.save_on_exit()
+
+    if args.incremental:
+        os.makedirs(PARTITIONS_PATH, exist_ok=True)
+
+        # get the manifest and the store of processed IDs of the last run, wherever it ran
+        with metrics.stage("restore") as stage:
+            try:
+                with stage.s3_transfer(num_transfers=2):
+                    for local_file, s3_file in [(LOCAL_MANIFEST_PATH, AWS_MANIFEST_PATH),
+                                                (LOCAL_PROCESSED_IDS_PATH, AWS_PROCESSED_IDS_PATH)]:
+                        restore_from_AWS(local_file,
+                                         s3_file,
+                                         "s3",
+                                         AWS_BUCKET,
+                                         AWS_ACCESS,
+                                         AWS_SECRET)
+            except Exception as e:
+                print("Error in loading the manifest and processed tweet IDs from AWS")
+                print(e)
+                raise ValueError(
+                    "Please fix the error in loading the manifest and processed tweet IDs from AWS")
+
+            stage.bytes_read = file_size(LOCAL_MANIFEST_PATH) + \
+                file_size(LOCAL_PROCESSED_IDS_PATH)
+
+        manifest = PartitionManifest(LOCAL_MANIFEST_PATH)
+        processed_store = TweetIDStore(LOCAL_PROCESSED_IDS_PATH)
+        processed_IDs = processed_store.ids
+
+        print(
+            f"{len(manifest.partitions)} partitions and {len(processed_IDs)} tweets have already been preprocessed")
 
-    use_local = True
-    if use_local:
-        tweets_df = pd.read_csv(LOCAL_HYDRATED_TWEETS_PATH)
+        PARTITION_FILENAME = f"preprocessed_tweets_{datetime.datetime.utcnow().strftime('%Y-%m-%dT%H%M%S')}.{args.format}"
+        LOCAL_PREPROCESSED_TWEETS_PATH = PARTITIONS_PATH + PARTITION_FILENAME
+        AWS_PREPROCESSED_TWEETS_PATH = AWS_PARTITIONS_PATH + PARTITION_FILENAME
+
+        # the partitions of new tweets of 'hydrate_tweets.py --incremental' (only the ones that
+        # aren't listed in the manifest yet are downloaded, and the tweets that have already been
+        # preprocessed are dropped)
+        AWS_HYDRATED_MANIFEST_PATH = AWS_TWEET_DIR + \
+            "hydrated_tweets/partitions/" + MANIFEST_FILENAME
     else:
-        tweets_df = pd.read_csv(AWS_HYDRATED_TWEETS_PATH)
-
-    tweets_df = tweets_df[["user", "created_at", "id",
-                           "full_text", "geo", "coordinates",
-                           "place", "retweet_count", "favorite_count"]]
-
-    print(f"Parsing {tweets_df.shape[0]} tweets today...")
-
-    # change place col to be read as dict, not str
-    tweets_df["place"] = tweets_df["place"].apply(
-        lambda x: try_literal_eval(x))
-
-    # initialize lists to hold information
-    is_USA_list = []
-    country_location_list = []
-    state_location_list = []
-    dates_list = []
-    year_list = []
-    month_list = []
-    day_list = []
-    hour_list = []
-    tokenized_text_list = []
-    hashtags_list = []
-    non_hashtags_list = []
-    hashtag_counts_list = []
-
-    # loop through the location column, get location information
-    for idx, location_dict in enumerate(tweets_df["place"]):
+        processed_IDs = None
 
-        try:
-            is_USA, country, state = parse_location(location_dict)
+    AWS_PREPROCESSED_TWEETS_PATH = compressed_path(AWS_PREPROCESSED_TWEETS_PATH,
+                                                   args.compression)
 
-            is_USA_list.append(is_USA)
-            country_location_list.append(country)
-            state_location_list.append(state)
-        except Exception as e:
-            print("Error in looping through locations column and getting locations")
-            print(f"Error happened at index {idx}\n")
-            print(f"The location was: {location_dict}\n")
-            print(f"The error was: {e}\n")
-            if type(location_dict) == int:
-                is_USA_list.append("N/A")
-                country_location_list.append("N/A")
-                state_location_list.append("N/A")
-                continue
-            else:
+    # load tweets from AWS, use subset of cols
+    if args.input is not None:
+        hydrated_tweets_paths = args.input
+        hydrated_partitions = []
+    else:
+        # get the chunks of hydrated tweets listed in their manifest through the local cache of
+        # S3 objects (only downloaded if 'hydrate_tweets.py' didn't run on this machine, or they
+        # have changed since)
+        with metrics.stage("download") as stage:
+            try:
+                with stage.s3_transfer():
+                    hydrated_manifest = PartitionManifest.from_json(
+                        load_fileobj_from_AWS(AWS_HYDRATED_MANIFEST_PATH,
+                                              "s3",
+                                              AWS_BUCKET,
+                                              AWS_ACCESS,
+                                              AWS_SECRET).getvalue())
+
+                # in incremental mode, only the partitions that haven't been preprocessed yet
+                hydrated_partitions = new_hydrated_partitions(hydrated_manifest, manifest) \
+                    if args.incremental else hydrated_manifest.partitions
+
+                with stage.s3_transfer(num_transfers=len(hydrated_partitions)):
+                    hydrated_tweets_paths = [fetch_from_AWS(partition["s3_key"],
+                                                            "s3",
+                                                            AWS_BUCKET,
+                                                            AWS_ACCESS,
+                                                            AWS_SECRET)
+                                             for partition in hydrated_partitions]
+            except Exception as e:
+                print("Error in loading the hydrated tweets from AWS")
+                print(e)
                 raise ValueError(
-                    "Please address error in looping through locations column")
+                    "Please run 'hydrate_tweets.py' first, or give the files of hydrated tweets with '--input'")
 
-    # loop through the dates column, get date info
-    for idx, timestamp in enumerate(tweets_df["created_at"]):
+            stage.rows_in = sum(partition["num_rows"]
+                                for partition in hydrated_partitions)
+            stage.bytes_read = sum(file_size(path)
+                                   for path in hydrated_tweets_paths)
 
-        try:
-            date, year, month, day, hour = parse_dates(timestamp)
+            print(
+                f"Loaded {len(hydrated_tweets_paths)} of the {len(hydrated_manifest.partitions)} chunks of hydrated tweets from {AWS_HYDRATED_MANIFEST_PATH}")
+
+        if len(hydrated_tweets_paths) == 0:
+            print("No hydrated tweets to preprocess")
+            print(
+                f"Finished with the execution of 'preprocess_tweets.py' at (in UTC time): {datetime.datetime.utcnow()}")
+            sys.exit(0)
+
+    if args.chunksize is not None:
+        # stream chunks of tweets from the hydrated file into the local preprocessed .csv file
+        print(f"Parsing tweets in chunks of {args.chunksize}...")
 
-            dates_list.append(date)
-            year_list.append(year)
-            month_list.append(month)
-            day_list.append(day)
-            hour_list.append(hour)
+        try:
+            # reading, preprocessing and writing are interleaved, so they are one stage
+            with metrics.stage("preprocess") as stage:
+                stage.bytes_read = sum(file_size(path)
+                                       for path in hydrated_tweets_paths)
+                num_rows, num_bad_timestamps, tweet_IDs = preprocess_tweets_csv_streaming(hydrated_tweets_paths,
+                                                                                          LOCAL_PREPROCESSED_TWEETS_PATH,
+                                                                                          args.chunksize,
+                                                                                          args.workers,
+                                                                                          args.format,
+                                                                                          processed_IDs)
+                stage.rows_out = num_rows
+                stage.bytes_written = file_size(LOCAL_PREPROCESSED_TWEETS_PATH)
         except Exception as e:
-            print("Error in looping through dates column and getting dates")
-            print(f"Error happened at index {idx}\n")
-            print(f"The timestamp was: {timestamp}\n")
-            print(f"The error was: {e}\n")
+            print("Problem with streaming tweets into local preprocessed file")
+            print(e)
+            raise ValueError(
+                "Please address issue with streaming tweets into local preprocessed file")
 
-            dates_list.append("N/A")
-            year_list.append("N/A")
-            month_list.append("N/A")
-            day_list.append("N/A")
-            hour_list.append("N/A")
+        print(f"Parsed {num_rows} tweets today")
 
-    # loop through the text column, get parsed text
-    for idx, text in enumerate(tweets_df["full_text"]):
+    else:
+        with metrics.stage("load") as stage:
+            tweets_dfs = [read_hydrated_tweets(path)
+                          for path in hydrated_tweets_paths]
 
-        try:
-            # cleaned, tokenized text
-            tokenized_text_arr = clean_text(text)
-            tokenized_text_list.append(tokenized_text_arr)
+            if len(set(is_projected(df.columns) for df in tweets_dfs)) > 1:
+                raise ValueError(
+                    "Please preprocess files of full tweets and files of projected tweets separately")
 
-            # get hashtags
-            hashtag_arr, non_hashtag_arr = parse_hashtags(text)
-            hashtags_list.append(hashtag_arr)
-            non_hashtags_list.append(non_hashtag_arr)
+            tweets_df = pd.concat(tweets_dfs, ignore_index=True)
 
-            # get hashtag counts
-            hashtag_count = count_hashtags(text)
-            hashtag_counts_list.append(hashtag_count)
+            stage.rows_in = tweets_df.shape[0]
+            stage.bytes_read = sum(file_size(path)
+                                   for path in hydrated_tweets_paths)
 
+            if processed_IDs is not None:
+                tweets_df = drop_processed_tweets(tweets_df, processed_IDs)
+
+            stage.rows_out = tweets_df.shape[0]
+
+        num_rows = tweets_df.shape[0]
+        tweet_IDs = tweets_df["id"].to_numpy(dtype=np.int64)
+
+        print(f"Parsing {num_rows} tweets today...")
+
+        # get location, date and text information
+        with metrics.stage("preprocess") as stage:
+            stage.rows_in = num_rows
+
+            if num_rows > 0 and args.workers > 1:
+                tweets_df = preprocess_tweets_parallel(tweets_df, args.workers)
+            elif num_rows > 0:
+                tweets_df = preprocess_tweets_df(tweets_df)
+
+            stage.rows_out = tweets_df.shape[0]
+
+        num_bad_timestamps = int(
+            tweets_df["date"].isna().sum()) if num_rows > 0 else 0
+
+        # export df as local file (if there are any tweets to export)
+        try:
+            with metrics.stage("export") as stage:
+                if num_rows > 0 and args.format == "parquet":
+                    write_preprocessed_tweets(
+                        tweets_df, LOCAL_PREPROCESSED_TWEETS_PATH)
+                elif num_rows > 0:
+                    tweets_df.to_csv(LOCAL_PREPROCESSED_TWEETS_PATH)
+
+                stage.rows_in = stage.rows_out = num_rows
+                stage.bytes_written = file_size(LOCAL_PREPROCESSED_TWEETS_PATH)
         except Exception as e:
-            print("Error in looping through text column and getting parsed text")
-            print(f"Error happened at index {idx}\n")
-            print(f"The text was: {text}\n")
-            print(f"The error was: {e}\n")
+            print("Problem with exporting tweets df as local file")
+            print(e)
             raise ValueError(
-                "Please address error in looping through text column")
-
-    # add lists as columns to our df
-    tweets_df["is_USA"] = is_USA_list
-    tweets_df["country"] = country_location_list
-    tweets_df["state"] = state_location_list
-    tweets_df["date"] = dates_list
-    tweets_df["year"] = year_list
-    tweets_df["month"] = month_list
-    tweets_df["day"] = day_list
-    tweets_df["hour"] = hour_list
-    tweets_df["tokenized_text"] = tokenized_text_list
-    tweets_df["hashtags_list"] = hashtags_list
-    tweets_df["non_hashtags_list"] = non_hashtags_list
-    tweets_df["hashtag_count"] = hashtag_counts_list
-
-    # export df as local .csv file
-    try:
-        tweets_df.to_csv(LOCAL_PREPROCESSED_TWEETS_PATH)
-    except Exception as e:
-        print("Problem with exporting tweets df as local file")
-        print(e)
-        raise ValueError(
-            "Please address issue with exporting tweets df as local file")
+                "Please address issue with exporting tweets df as local file")
+
+    if num_bad_timestamps > 0:
+        print(f"{num_bad_timestamps} timestamps could not be parsed, their date info is null")
+
+    place_decoder = get_place_decoder()
+    print(
+        f"Parsed {place_decoder.counts['parsed']} distinct places, place cache hit rate: {place_decoder.hit_rate():.1%}")
+
+    metrics.info.update(num_rows=int(num_rows), num_bad_timestamps=num_bad_timestamps,
+                        place_cache_hit_rate=place_decoder.hit_rate())
+
+    if num_rows == 0:
+        if not args.incremental:
+            raise ValueError(
+                f"No tweets to preprocess in {', '.join(hydrated_tweets_paths)}")
+
+        if os.path.exists(LOCAL_PREPROCESSED_TWEETS_PATH):
+            os.remove(LOCAL_PREPROCESSED_TWEETS_PATH)
+
+        print("No new tweets to preprocess today")
+        print(
+            f"Finished with the execution of 'preprocess_tweets.py' at (in UTC time): {datetime.datetime.utcnow()}")
+        sys.exit(0)
 
     # export df to AWS bucket
     try:
-        # save to AWS
-        save_to_AWS(LOCAL_PREPROCESSED_TWEETS_PATH,
-                    AWS_PREPROCESSED_TWEETS_PATH,
-                    "s3",
-                    AWS_BUCKET,
-                    AWS_ACCESS,
-                    AWS_SECRET)
-
-        # remove local version
-        os.remove(LOCAL_PREPROCESSED_TWEETS_PATH)
+        with metrics.stage("upload") as stage:
+            # save to AWS
+            stage.rows_in = stage.rows_out = num_rows
+
+            # the bytes actually uploaded (fewer than the local file's, with '--compression')
+            with stage.s3_transfer():
+                stage.bytes_written += save_to_AWS(LOCAL_PREPROCESSED_TWEETS_PATH,
+                                                   AWS_PREPROCESSED_TWEETS_PATH,
+                                                   "s3",
+                                                   AWS_BUCKET,
+                                                   AWS_ACCESS,
+                                                   AWS_SECRET,
+                                                   compression=args.compression)
+
+            # 'save_to_AWS' raises if the upload failed, so the local version is only removed, and
+            # the new partition only recorded (its tweet IDs as processed, and its manifest entry),
+            # once it has been exported; otherwise its tweets are preprocessed again on the next run
+            os.remove(LOCAL_PREPROCESSED_TWEETS_PATH)
+
+            if args.incremental:
+                processed_store.merge(tweet_IDs)
+
+                manifest.add_partition(PARTITION_FILENAME,
+                                       s3_key=AWS_PREPROCESSED_TWEETS_PATH,
+                                       num_rows=int(num_rows),
+                                       min_id=int(tweet_IDs.min()),
+                                       max_id=int(tweet_IDs.max()),
+                                       hydrated_partitions=[partition["name"]
+                                                            for partition in hydrated_partitions])
+                manifest.save()
+
+                # the manifest last, as it records which hydrated partitions have been consumed
+                with stage.s3_transfer(num_transfers=2):
+                    for local_file, s3_file in [(LOCAL_PROCESSED_IDS_PATH, AWS_PROCESSED_IDS_PATH),
+                                                (LOCAL_MANIFEST_PATH, AWS_MANIFEST_PATH)]:
+                        stage.bytes_written += save_state_to_AWS(local_file,
+                                                                 s3_file,
+                                                                 "s3",
+                                                                 AWS_BUCKET,
+                                                                 AWS_ACCESS,
+                                                                 AWS_SECRET)
     except Exception as e:
         print("Error in exporting the local files to AWS")
         print(e)
@@ -0,0 +1,191 @@
+"""
+
+    run_metrics.py
+
+    Instrumentation for the backend scripts. A run is split into named stages (e.g. "load",
+    "preprocess", "upload"), and for each stage we record its wall time, the rows that went
+    in and out, the bytes read and written, the time spent transferring to/from S3 and
+    the number of errors. At the end of the run, one JSON metrics record is written.
+
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import datetime
+from contextlib import contextmanager
+
+
+def file_size(path):
+    """
+    Arg:
+        path: path (str) of a local file
+    Returns:
+        size: size of the file in bytes (int), 0 if the file doesn't exist
+    """
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+class StageMetrics:
+    """
+    Metrics of one stage of a run. Rows and bytes are set (or incremented) by the code of the stage,
+    the timings are recorded by 'RunMetrics.stage' and 's3_transfer'.
+
+    Arg:
+        name: name of the stage (str)
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.wall_seconds = 0.0
+        self.rows_in = 0
+        self.rows_out = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.s3_seconds = 0.0
+        self.s3_transfers = 0
+        self.errors = 0
+        self.error_messages = []
+
+    def add_error(self, error):
+        """
+        Counts an error of the stage (e.g. one that was caught and didn't stop the run)
+
+        Arg:
+            error: the exception (or a description of the error)
+        """
+        self.errors += 1
+        self.error_messages.append(f"{type(error).__name__}: {error}"
+                                   if isinstance(error, BaseException) else str(error))
+
+    @contextmanager
+    def s3_transfer(self, num_transfers=1):
+        """
+        Context manager that adds the time spent in its block to the S3 transfer time of the stage
+
+        Arg:
+            num_transfers: number of transfers (int) made in the block, e.g. by 'aws_helpers.upload_many'
+        """
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.s3_seconds += time.perf_counter() - start
+            self.s3_transfers += num_transfers
+
+    def to_dict(self):
+        return {"name": self.name,
+                "wall_seconds": round(self.wall_seconds, 6),
+                "rows_in": int(self.rows_in),
+                "rows_out": int(self.rows_out),
+                "bytes_read": int(self.bytes_read),
+                "bytes_written": int(self.bytes_written),
+                "s3_seconds": round(self.s3_seconds, 6),
+                "s3_transfers": self.s3_transfers,
+                "errors": self.errors,
+                "error_messages": self.error_messages}
+
+
+class RunMetrics:
+    """
+    Metrics of one run of a script, made of the metrics of its stages
+
+    Args:
+        script: name of the script (str), e.g. "preprocess_tweets.py"
+        output_dir: directory (str) to write the JSON metrics record to
+    """
+
+    def __init__(self, script, output_dir):
+        self.script = script
+        self.output_dir = output_dir
+        self.started_at = datetime.datetime.utcnow()
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.info = {}
+        self.saved_path = None
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Context manager that times a stage of the run. The same stage can be entered several
+        times (e.g. once per file), its metrics are then added up.
+        An exception raised in the block is counted as an error of the stage, and re-raised.
+
+        Arg:
+            name: name of the stage (str)
+        Yields:
+            stage: the StageMetrics of the stage, to record rows and bytes in
+        """
+        if name not in self.stages:
+            self.stages[name] = StageMetrics(name)
+
+        stage = self.stages[name]
+        start = time.perf_counter()
+
+        try:
+            yield stage
+        except BaseException as e:
+            # sys.exit(0) is a normal end of the run, not an error
+            if not (isinstance(e, SystemExit) and not e.code):
+                stage.add_error(e)
+            raise
+        finally:
+            stage.wall_seconds += time.perf_counter() - start
+
+    def num_errors(self):
+        """
+        Returns:
+            num_errors: total number of errors over all the stages (int)
+        """
+        return sum(stage.errors for stage in self.stages.values())
+
+    def to_dict(self):
+        """
+        Returns:
+            record: the metrics record of the run (dict)
+        """
+        return {"script": self.script,
+                "started_at": self.started_at.isoformat(),
+                "finished_at": datetime.datetime.utcnow().isoformat(),
+                "wall_seconds": round(time.perf_counter() - self.start, 6),
+                "status": "failed" if self.num_errors() > 0 else "succeeded",
+                "errors": self.num_errors(),
+                "info": self.info,
+                "stages": [stage.to_dict() for stage in self.stages.values()]}
+
+    def save(self):
+        """
+        Writes the metrics record of the run to a JSON file in 'output_dir', named after the
+        script and the start time of the run
+
+        Returns:
+            path: path (str) of the JSON file
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        script_name = os.path.splitext(os.path.basename(self.script))[0]
+        path = os.path.join(self.output_dir,
+                            f"{script_name}_{self.started_at.strftime('%Y-%m-%dT%H%M%S')}.json")
+
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+        self.saved_path = path
+
+        return path
+
+    def save_on_exit(self):
+        """
+        Makes sure the metrics record is written when the script exits, whether it
+        finishes, calls sys.exit or fails with an exception
+        """
+        atexit.register(self._save_on_exit)
+
+    def _save_on_exit(self):
+        try:
+            path = self.save()
+            print(f"Saved the run metrics to {path}")
+        except Exception as e:
+            print("Unable to save the run metrics", file=sys.stderr)
+            print(e, file=sys.stderr)
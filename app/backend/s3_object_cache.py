@@ -0,0 +1,170 @@
+"""
+
+    s3_object_cache.py
+
+    Local cache of S3 objects, on top of 'file_cache.FileCache' (so with a size cap and LRU
+    eviction). Objects are keyed by "s3://<bucket>/<key>" and stored with their ETag: a cached
+    object is only used if its ETag is still the one in S3. Cached copies keep the extension of
+    their key (e.g. ".jsonl.gz"), so their format can be told from their name. Reads go through
+    the cache (an object is only downloaded if it isn't cached, or has changed), and uploaded
+    files can be moved into the cache rather than deleted, so that the next stage or run doesn't
+    download them again.
+
+"""
+import os
+import threading
+import posixpath
+from file_cache import FileCache, DEFAULT_MAX_BYTES
+
+
+def object_cache_key(bucket, key):
+    """
+    Args:
+        bucket: name of S3 bucket (str)
+        key: path (str) of file within the S3 bucket
+    Returns:
+        cache_key: key (str) of the object in the cache
+    """
+    return f"s3://{bucket}/{key}"
+
+
+def object_suffix(key):
+    """
+    Arg:
+        key: path (str) of file within the S3 bucket
+    Returns:
+        suffix: extension(s) (str) of the file, e.g. ".jsonl.gz", that its cached copy keeps
+    """
+    filename = posixpath.basename(key)
+
+    return filename[filename.index("."):] if "." in filename else ""
+
+
+class S3ObjectCache:
+    """
+    Read-through / write-through cache of S3 objects
+
+    Args:
+        cache_dir: directory (str) of the cache (created if it doesn't exist)
+        max_bytes: size cap of the cache, in bytes (int)
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.files = FileCache(cache_dir, max_bytes)
+
+    @property
+    def counts(self):
+        """
+        Counts of the cache: hits, misses, evictions, downloaded_bytes
+        """
+        return self.files.counts
+
+    @staticmethod
+    def etag(s3, bucket, key):
+        """
+        Args:
+            s3: S3 client (see 'aws_helpers.get_client')
+            bucket: name of S3 bucket (str)
+            key: path (str) of file within the S3 bucket
+        Returns:
+            etag: current ETag (str) of the object in S3
+        """
+        return s3.head_object(Bucket=bucket, Key=key)["ETag"]
+
+    def get(self, s3, bucket, key, revalidate=True):
+        """
+        Looks up an object in the cache
+
+        Args:
+            s3: S3 client
+            bucket: name of S3 bucket (str)
+            key: path (str) of file within the S3 bucket
+            revalidate: check that the cached object still has the ETag of the object in S3 (bool)
+        Returns:
+            path: path (str) of the cached object (to be read, not modified), None if the object
+            isn't cached or has changed in S3
+        """
+        cache_key = object_cache_key(bucket, key)
+        entry = self.files.entry(cache_key)
+
+        if entry is not None and revalidate and entry.get("etag") != self.etag(s3, bucket, key):
+            # the object has changed since it was cached
+            self.files.remove(cache_key)
+
+        path = self.files.get(cache_key)
+
+        # record the use of the object, for the LRU eviction of later runs
+        if path is not None:
+            self.files.save()
+
+        return path
+
+    def fetch(self, s3, bucket, key, transfer_config=None):
+        """
+        Gets a local copy of an object: the cached one if it is up to date, otherwise the object
+        is downloaded into the cache
+
+        Args:
+            s3: S3 client
+            bucket: name of S3 bucket (str)
+            key: path (str) of file within the S3 bucket
+            transfer_config: boto3 TransferConfig of the download (optional)
+        Returns:
+            path: path (str) of the cached object (to be read, not modified)
+        """
+        path = self.get(s3, bucket, key)
+
+        if path is not None:
+            return path
+
+        etag = self.etag(s3, bucket, key)
+        tmp_path = os.path.join(self.files.cache_dir,
+                                f"download_{os.getpid()}_{threading.get_ident()}.tmp")
+        kwargs = {"Config": transfer_config} if transfer_config is not None else {}
+
+        s3.download_file(Bucket=bucket, Key=key, Filename=tmp_path, **kwargs)
+
+        with self.files.lock:
+            self.files.counts["downloaded_bytes"] += os.path.getsize(tmp_path)
+
+        return self.files.put(object_cache_key(bucket, key), tmp_path,
+                              suffix=object_suffix(key), etag=etag)
+
+    def add(self, s3, bucket, key, local_file):
+        """
+        Moves a file that has just been uploaded into the cache (the file at 'local_file' is consumed)
+
+        Args:
+            s3: S3 client
+            bucket: name of S3 bucket (str)
+            key: path (str) of the uploaded file within the S3 bucket
+            local_file: path (str) of the local file
+        Returns:
+            path: path (str) of the cached object
+        """
+        return self.files.put(object_cache_key(bucket, key), local_file,
+                              suffix=object_suffix(key), etag=self.etag(s3, bucket, key))
+
+    def prune(self, max_bytes=None):
+        """
+        Evicts the least recently used objects until the cache fits in 'max_bytes'
+
+        Arg:
+            max_bytes: size cap (int); the cache's own cap if None
+        Returns:
+            evicted: keys of the evicted objects (list of str)
+        """
+        evicted = self.files.evict(max_bytes)
+        self.files.save()
+
+        return evicted
+
+    def total_bytes(self):
+        """
+        Returns:
+            total_bytes: size of the cached objects, in bytes (int)
+        """
+        return self.files.total_bytes()
+
+    def __len__(self):
+        return len(self.files)
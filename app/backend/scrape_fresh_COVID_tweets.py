@@ -6,18 +6,36 @@
     batch of COVID tweets. These tweets won't be preprocessed in any way, they're 
     just meant to be displayed on the dashboard's frontend. 
 
-    This script is meant to be run hourly as a cron job
+    This script is meant to be run hourly as a cron job. With '--collect', it instead runs
+    as a long-running collector: one stream stays open, the most recent tweets are kept in
+    memory and a snapshot of them is uploaded every few minutes.
 """
 import os
 import time
+import argparse
 import datetime
 import boto3
 import pandas as pd
 from twarc import Twarc
-from aws_helpers import save_to_AWS
+from aws_helpers import save_df_to_AWS
+from fresh_tweet_collector import FreshTweetCollector
 
 if __name__ == "__main__":
 
+    # get args
+    parser = argparse.ArgumentParser(
+        description="Scrapes a fresh sample of COVID tweets for the dashboard")
+    parser.add_argument("--collect", action="store_true",
+                        help="keep the stream open and upload snapshots of the most recent tweets "
+                        "at regular intervals, instead of scraping one batch")
+    parser.add_argument("--buffer-size", type=int, default=1000,
+                        help="number of most recent tweets in each snapshot, with '--collect' (default: 1000)")
+    parser.add_argument("--flush-interval", type=float, default=300,
+                        help="number of seconds between snapshots, with '--collect' (default: 300)")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="number of seconds to collect for, with '--collect' (default: until stopped)")
+    args = parser.parse_args()
+
     # change dir to this file's directory
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
@@ -32,61 +50,82 @@ if __name__ == "__main__":
     AWS_SECRET = os.environ["AWS_SECRET"]
 
     # initialize paths
-    # year-month-day hour (military time, in UTC time)
-    FRESH_TWEETS_FILENAME = f"fresh_hourly_tweets_{datetime.datetime.utcnow().strftime('%Y-%m-%d %H')}.csv"
+    AWS_TWEET_DIR = "tweet_scrapes/"
+    AWS_FRESH_TWEETS_DIR = AWS_TWEET_DIR + "hourly_tweets/"
 
-    LOCAL_FRESH_TWEETS_DIR = "./../../tweets/hourly_tweets/"
-    LOCAL_FRESH_TWEETS_PATH = LOCAL_FRESH_TWEETS_DIR + FRESH_TWEETS_FILENAME
+    # in '--collect' mode, each snapshot is also uploaded under a fixed name, so the
+    # most recent one can always be found
+    LATEST_FRESH_TWEETS_FILENAME = "fresh_tweets_latest.csv"
 
-    AWS_TWEET_DIR = "tweet_scrapes/"
-    AWS_FRESH_TWEETS_PATH = AWS_TWEET_DIR + \
-        "hourly_tweets/" + FRESH_TWEETS_FILENAME
+    def save_snapshot(tweets):
+        """
+        Exports a snapshot of fresh tweets to AWS (serialized in memory, with no local file)
+
+        Arg:
+            tweets: fresh tweets (list of dicts)
+        """
+        # year-month-day hour (military time, in UTC time); later snapshots of the same hour replace earlier ones
+        FRESH_TWEETS_FILENAME = f"fresh_hourly_tweets_{datetime.datetime.utcnow().strftime('%Y-%m-%d %H')}.csv"
+
+        # transform into pandas df
+        df = pd.DataFrame(tweets)
+
+        # export to AWS bucket
+        AWS_FRESH_TWEETS_PATHS = [AWS_FRESH_TWEETS_DIR + FRESH_TWEETS_FILENAME]
+
+        if args.collect:
+            AWS_FRESH_TWEETS_PATHS.append(
+                AWS_FRESH_TWEETS_DIR + LATEST_FRESH_TWEETS_FILENAME)
+
+        for AWS_FRESH_TWEETS_PATH in AWS_FRESH_TWEETS_PATHS:
+            save_df_to_AWS(df,
+                           AWS_FRESH_TWEETS_PATH,
+                           "s3",
+                           AWS_BUCKET,
+                           AWS_ACCESS,
+                           AWS_SECRET)
 
     # connect to Twitter API
     t = Twarc(CONSUMER_KEY, CONSUMER_SECRET,
               ACCESS_TOKEN, ACCESS_TOKEN_SECRET)
 
-    # scrape fresh tweets (filter allows you to get tweets as they happen)
-    JSON_list = []
+    # scrape fresh tweets (filter allows you to get tweets as they happen), from one stream
     search_terms = ["covid", "covid19", "vaccine", "coronavirus"]
     search_query = ','.join(search_terms)
     num_tweets = 10
 
-    for i in range(num_tweets):
-        try:
-            tweet = next(
-                t.filter(track=search_query))
+    if args.collect:
+        collector = FreshTweetCollector(lambda: t.filter(track=search_query),
+                                        save_snapshot,
+                                        buffer_size=args.buffer_size,
+                                        flush_interval=args.flush_interval)
+    else:
+        # a single snapshot of the first 'num_tweets' tweets
+        collector = FreshTweetCollector(lambda: t.filter(track=search_query),
+                                        save_snapshot,
+                                        buffer_size=num_tweets,
+                                        flush_interval=None)
 
-            JSON_list.append(tweet)
+    try:
+        try:
+            if args.collect:
+                print(
+                    f"Collecting fresh tweets, with a snapshot of the last {args.buffer_size} every {args.flush_interval} seconds...")
+                collector.run(duration=args.duration)
+            else:
+                collector.run(max_tweets=num_tweets)
         except Exception as e:
             print("Error in scraping fresh tweets")
             print(e)
             raise ValueError("Please resolve scraping issue.")
 
-    # transform into pandas df
-    df = pd.DataFrame(JSON_list)
+        if collector.counts["snapshot_errors"] > 0:
+            raise ValueError(
+                "Please fix the error in exporting the local files to AWS")
 
-    # save locally
-    df.to_csv(LOCAL_FRESH_TWEETS_PATH)
-
-    # export to AWS bucket
-    try:
-        # save to AWS
-        save_to_AWS(LOCAL_FRESH_TWEETS_PATH,
-                    AWS_FRESH_TWEETS_PATH,
-                    "s3",
-                    AWS_BUCKET,
-                    AWS_ACCESS,
-                    AWS_SECRET)
-
-        # remove local version of file
-        os.remove(LOCAL_FRESH_TWEETS_PATH)
-    except Exception as e:
-        print("Error in exporting the local files to AWS")
-        print(e)
-        print("------------------")
-        raise ValueError(
-            "Please fix the error in exporting the local files to AWS")
+        print(
+            f"Collected {collector.counts['tweets']} tweets over {collector.counts['connections']} connections, "
+            f"flushed {collector.counts['snapshots']} snapshots")
     finally:
         print(
             f"Finished with the execution of 'scrape_fresh_COVID_tweets.py' at (in UTC time): {datetime.datetime.utcnow()}")
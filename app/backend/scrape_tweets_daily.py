@@ -10,6 +10,7 @@
 
 """
 import os
+from concurrent.futures import ThreadPoolExecutor
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 import numpy as np
@@ -18,7 +19,20 @@ import time
 import datetime
 import boto3
 import aws_helpers
-from aws_helpers import save_to_AWS
+from aws_helpers import upload_many, cache_uploaded_file
+from run_metrics import RunMetrics, file_size
+from file_cache import FileCache, fetch_url, IEEE_CACHE_PATH, IEEE_CACHE_MAX_BYTES
+from tweet_id_store import TweetIDStore
+from tweet_id_file import write_tweet_IDs
+
+# cols of the IEEE .csv files (they have no header)
+IEEE_CSV_COLUMNS = ["tweet_id", "sentiment_score"]
+
+# dtypes of the cols of the IEEE .csv files
+IEEE_CSV_DTYPES = {"tweet_id": np.int64, "sentiment_score": np.float64}
+
+# max number of IEEE .csv files that are downloaded at the same time
+MAX_DOWNLOAD_WORKERS = 8
 
 
 def get_links_from_website(website, driver_path, username, password):
@@ -89,47 +103,93 @@ def get_links_from_website(website, driver_path, username, password):
     return (filename_list, links_list)
 
 
-def get_tweetIDs_to_hydrate(link):
+def read_IEEE_csv(link, usecols=("tweet_id",), cache=None):
     """
+    Downloads and parses one IEEE .csv file
 
-        Takes a link to a .csv file and returns both the original .csv file (with tweet ID + sentiment score) and list of tweet IDs
+    Args:
+        link: path or URL (str) of the .csv file
+        usecols: cols (tuple of str) to parse, out of IEEE_CSV_COLUMNS
+        cache: FileCache of the downloaded files (optional); if given, the file is
+        only downloaded if it isn't cached or has changed since it was cached
+    Returns:
+        df: pandas df with the 'usecols' cols ("tweet_id" is int64)
+    """
+    usecols = list(usecols)
 
-        Args:
-            link (str): path to .csv file
-        Returns:
-            df: pandas df, with cols = ["tweet_id", "sentiment_score"] (sentiment score calculated by paper referenced in the 
-            IEEE link)
-            tweet_IDs: list (str), with the IDs for each tweet
+    if cache is not None:
+        link = fetch_url(cache, link)
+
+    return pd.read_csv(link, names=IEEE_CSV_COLUMNS, usecols=usecols,
+                       dtype={col: IEEE_CSV_DTYPES[col] for col in usecols})[usecols]
+
+
+def download_IEEE_csvs(links, max_workers=MAX_DOWNLOAD_WORKERS, usecols=("tweet_id",), cache=None):
     """
+    Downloads and parses IEEE .csv files concurrently, with at most 'max_workers'
+    downloads at a time. A file that can't be downloaded doesn't stop the others.
 
-    df = pd.read_csv(link, names=["tweet_id", "sentiment_score"])
+    Args:
+        links: paths or URLs (list of str) of the .csv files
+        max_workers: max number of files (int) downloaded at the same time
+        usecols: cols (tuple of str) to parse, out of IEEE_CSV_COLUMNS
+        cache: FileCache of the downloaded files (optional)
+    Returns:
+        dfs: pandas dfs of the files that were downloaded, in the order of 'links'
+        failures: dict of link (str) -> exception, for the files that couldn't be downloaded
+    """
+    dfs = []
+    failures = {}
 
-    df.drop_duplicates(inplace=True)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(read_IEEE_csv, link, usecols, cache)
+                   for link in links]
 
-    tweet_IDs = list(df["tweet_id"])
+        for link, future in zip(links, futures):
+            try:
+                dfs.append(future.result())
+            except Exception as e:
+                failures[link] = e
 
-    return (df, tweet_IDs)
+    return (dfs, failures)
+
+
+def merge_IEEE_dfs(dfs, usecols=("tweet_id",)):
+    """
+    Concatenates the dfs of several IEEE .csv files and drops the duplicate rows
+    (across all the files at once)
+
+    Args:
+        dfs: pandas dfs (list) returned by 'download_IEEE_csvs'
+        usecols: cols (tuple of str) of the dfs
+    Returns:
+        merged_df: pandas df of the distinct rows of 'dfs'
+        tweet_IDs: distinct tweet IDs (numpy int64 array), in order of first appearance
+    """
+    if len(dfs) == 0:
+        merged_df = pd.DataFrame({col: pd.Series([], dtype=IEEE_CSV_DTYPES[col])
+                                  for col in usecols})
+    else:
+        merged_df = pd.concat(dfs, ignore_index=True)
+
+    merged_df = merged_df.drop_duplicates(ignore_index=True)
+    tweet_IDs = pd.unique(merged_df["tweet_id"].to_numpy(dtype=np.int64))
+
+    return (merged_df, tweet_IDs)
 
 
 def save_tweet_IDs(tweet_IDs, filepath):
     """
-    Save a list of tweet IDs as a file (.csv)
+    Save a list of tweet IDs as a binary tweet ID file (see 'tweet_id_file.py')
     Args:
-        tweet_IDs: list (str) of tweet IDs
+        tweet_IDs: tweet IDs (list or numpy array of int)
         filepath: path (str) to save IDs
 
     Returns: 
         None
     """
 
-    last_line = len(tweet_IDs) - 1
-
-    with open(filepath, "w") as f:
-        for idx, tweet in enumerate(tweet_IDs):
-            if idx != last_line:
-                f.write(f"{tweet}, \n")
-            else:
-                f.write(f"{tweet}")
+    write_tweet_IDs(filepath, tweet_IDs)
 
     return None
 
@@ -154,71 +214,130 @@ if __name__ == "__main__":
     WEBSITE = "https://ieee-dataport.org/open-access/coronavirus-covid-19-geo-tagged-tweets-dataset"
 
     # local filenames of exports
-    ID_FILENAME = "scraped_tweet_IDs_2020-03-20_2021-02-09.csv"
+    ID_FILENAME = "scraped_tweet_IDs_2020-03-20_2021-02-09.bin"
     DF_FILENAME = "scraped_tweet_IDs_and_scores_2020-03-20_2021-02-09.csv"
     LOCAL_EXPORT_ID_PATH = ID_PATH + ID_FILENAME
     LOCAL_EXPORT_DF_PATH = LOCAL_TWEET_PATH + DF_FILENAME
     AWS_EXPORT_ID_PATH = AWS_TWEET_DIR + "tweet_IDs/" + ID_FILENAME
     AWS_EXPORT_DF_PATH = AWS_TWEET_DIR + "raw_IEEE_tweet_scrapes/" + DF_FILENAME
 
+    # store of all the tweet IDs scraped so far (kept locally, and uploaded after each run)
+    ID_STORE_FILENAME = "scraped_tweet_IDs.npy"
+    LOCAL_ID_STORE_PATH = ID_PATH + ID_STORE_FILENAME
+    AWS_ID_STORE_PATH = AWS_TWEET_DIR + "tweet_IDs/" + ID_STORE_FILENAME
+
+    # record per-stage metrics of the run
+    METRICS_PATH = "./../../tweets/run_metrics/"
+    metrics = RunMetrics("scrape_tweets_daily.py", METRICS_PATH)
+    metrics.save_on_exit()
+
     # scrape filenames and links to .csv files
-    try:
-        filename_list, links_list = get_links_from_website(WEBSITE,
-                                                           DRIVER_PATH,
-                                                           IEEE_USERNAME,
-                                                           IEEE_PASSWORD)
-    except Exception as e:
-        print("Something wrong with scraping filenames and links on IEEE website.")
-        print(e)
+    with metrics.stage("scrape_links") as stage:
+        try:
+            filename_list, links_list = get_links_from_website(WEBSITE,
+                                                               DRIVER_PATH,
+                                                               IEEE_USERNAME,
+                                                               IEEE_PASSWORD)
+            stage.rows_out = len(links_list)
+        except Exception as e:
+            print("Something wrong with scraping filenames and links on IEEE website.")
+            print(e)
+            stage.add_error(e)
 
-    # load tweets from list of links
-    tweet_df_list = []
-    tweet_IDs_list = []
-
-    for link in links_list:
-        tweet_df, tweet_IDs = get_tweetIDs_to_hydrate(link)
-        tweet_df_list.append(tweet_df)
-        tweet_IDs_list.append(tweet_IDs)
-
-    # concatenate both the tweet IDs list and the tweet df list, each as one list or one df
-    if len(tweet_IDs_list) > 1:
-        merged_IDs = []
-        for lst in tweet_IDs_list:
-            for ID in lst:
-                merged_IDs.append(ID)
-    else:
-        merged_IDs = tweet_IDs_list[0]
+    # load tweets from list of links, several files at a time
+    # (the sentiment scores are kept too, for the export of the raw IEEE scrapes)
+    with metrics.stage("download") as stage:
+        IEEE_cache = FileCache(IEEE_CACHE_PATH, IEEE_CACHE_MAX_BYTES)
 
-    if len(tweet_df_list) > 1:
-        merged_tweet_dfs = pd.concat(tweet_df_list)
-    else:
-        merged_tweet_dfs = tweet_df_list[0]
+        tweet_df_list, failures = download_IEEE_csvs(links_list,
+                                                     MAX_DOWNLOAD_WORKERS,
+                                                     IEEE_CSV_COLUMNS,
+                                                     IEEE_cache)
+        IEEE_cache.save()
+
+        stage.rows_in = len(links_list)
+        stage.rows_out = sum(tweet_df.shape[0] for tweet_df in tweet_df_list)
+        stage.bytes_read = IEEE_cache.counts["downloaded_bytes"]
+
+        print(
+            f"Downloaded {IEEE_cache.counts['misses']} of the {len(links_list)} IEEE .csv files, the rest were cached")
+        metrics.info.update(IEEE_cache_hits=IEEE_cache.counts["hits"],
+                            IEEE_cache_misses=IEEE_cache.counts["misses"],
+                            IEEE_cache_evictions=IEEE_cache.counts["evictions"])
+
+        for link, e in failures.items():
+            print(f"Error in downloading {link}")
+            print(e)
+            stage.add_error(e)
+
+    if len(failures) > 0 or len(tweet_df_list) == 0:
+        raise ValueError(
+            f"Please fix the errors in downloading {len(failures)} of the {len(links_list)} IEEE .csv files")
+
+    # concatenate the tweet dfs into one df, and get the distinct tweet IDs
+    with metrics.stage("merge") as stage:
+        merged_tweet_dfs, merged_IDs = merge_IEEE_dfs(tweet_df_list,
+                                                      IEEE_CSV_COLUMNS)
+
+        stage.rows_in = sum(tweet_df.shape[0] for tweet_df in tweet_df_list)
+        stage.rows_out = len(merged_IDs)
 
     # export
-    save_tweet_IDs(merged_IDs, LOCAL_EXPORT_ID_PATH)
-    merged_tweet_dfs.to_csv(LOCAL_EXPORT_DF_PATH)
+    with metrics.stage("export") as stage:
+        save_tweet_IDs(merged_IDs, LOCAL_EXPORT_ID_PATH)
+        merged_tweet_dfs.to_csv(LOCAL_EXPORT_DF_PATH)
+
+        # add the IDs to the store of scraped IDs
+        ID_store = TweetIDStore(LOCAL_ID_STORE_PATH)
+        num_new_IDs = ID_store.merge(merged_IDs)
+
+        print(
+            f"Scraped {num_new_IDs} new tweet IDs ({len(ID_store)} tweet IDs in total)")
+        metrics.info["num_new_IDs"] = num_new_IDs
+
+        stage.rows_in = len(merged_IDs)
+        stage.rows_out = num_new_IDs
+        stage.bytes_written = file_size(LOCAL_EXPORT_ID_PATH) + \
+            file_size(LOCAL_EXPORT_DF_PATH) + file_size(LOCAL_ID_STORE_PATH)
 
     # export to AWS
     try:
-        # export list of IDs
-        save_to_AWS(LOCAL_EXPORT_ID_PATH,
-                    AWS_EXPORT_ID_PATH,
-                    "s3",
-                    AWS_BUCKET,
-                    AWS_ACCESS,
-                    AWS_SECRET)
-
-        # export df of IDs + sentiment scores
-        save_to_AWS(LOCAL_EXPORT_DF_PATH,
-                    AWS_EXPORT_DF_PATH,
-                    "s3",
-                    AWS_BUCKET,
-                    AWS_ACCESS,
-                    AWS_SECRET)
-
-        # remove local versions
-        os.remove(LOCAL_EXPORT_ID_PATH)
-        os.remove(LOCAL_EXPORT_DF_PATH)
+        with metrics.stage("upload") as stage:
+            # export list of IDs, df of IDs + sentiment scores and store of scraped IDs (the local
+            # version of the store is kept, to merge into on the next run), all at the same time
+            uploads = [(LOCAL_EXPORT_ID_PATH, AWS_EXPORT_ID_PATH),
+                       (LOCAL_EXPORT_DF_PATH, AWS_EXPORT_DF_PATH),
+                       (LOCAL_ID_STORE_PATH, AWS_ID_STORE_PATH)]
+
+            with stage.s3_transfer(num_transfers=len(uploads)):
+                uploaded, failures = upload_many(uploads,
+                                                 "s3",
+                                                 AWS_BUCKET,
+                                                 AWS_ACCESS,
+                                                 AWS_SECRET)
+
+            stage.bytes_written = sum(result["num_bytes"]
+                                      for result in uploaded.values())
+            metrics.info["upload_seconds"] = {s3_file: round(result["seconds"], 3)
+                                              for s3_file, result in uploaded.items()}
+
+            if len(failures) > 0:
+                for s3_file, e in failures.items():
+                    print(f"Error in uploading {s3_file}")
+                    print(e)
+
+                raise ValueError(
+                    f"{len(failures)} of the {len(uploads)} files couldn't be uploaded")
+
+            # move the local versions into the local cache of S3 objects (rather than deleting
+            # them), so that 'hydrate_tweets.py' doesn't download the file of IDs again
+            for local_file, s3_file in uploads[:2]:
+                cache_uploaded_file(local_file,
+                                    s3_file,
+                                    "s3",
+                                    AWS_BUCKET,
+                                    AWS_ACCESS,
+                                    AWS_SECRET)
 
     except Exception as e:
         print("Error in exporting the local files to AWS")
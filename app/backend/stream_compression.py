@@ -0,0 +1,226 @@
+"""
+
+    stream_compression.py
+
+    Streaming (de)compression of stored artifacts, with gzip or zstd (zstd needs the optional
+    'zstandard' package). Content is (de)compressed block by block as it is read or written, so
+    an artifact can be compressed on its way to S3, or decompressed on its way back, without a
+    temporary uncompressed file or the whole artifact in memory.
+
+"""
+import io
+import zlib
+import gzip
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# compressions, and the extensions they are inferred from
+COMPRESSION_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+
+# default compression levels (those of the gzip and zstd command line tools)
+DEFAULT_COMPRESSION_LEVELS = {"gzip": 6, "zstd": 3}
+
+# size of the blocks that content is (de)compressed in
+BLOCK_SIZE = 1024 * 1024
+
+# wbits of zlib for gzip streams
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def infer_compression(path, compression="infer"):
+    """
+    Arg:
+        path: path (str) of a file, e.g. within the S3 bucket
+        compression: "infer" (from the extension of 'path'), None, or one of COMPRESSION_EXTENSIONS (str)
+    Returns:
+        compression: None, or one of COMPRESSION_EXTENSIONS (str)
+    """
+    if compression != "infer":
+        if compression is not None and compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(
+                f"Unknown compression '{compression}', must be one of {list(COMPRESSION_EXTENSIONS)}")
+
+        return compression
+
+    for name, extension in COMPRESSION_EXTENSIONS.items():
+        if path.endswith(extension):
+            return name
+
+    return None
+
+
+def compressed_path(path, compression):
+    """
+    Args:
+        path: path (str) of an uncompressed file
+        compression: None, or one of COMPRESSION_EXTENSIONS (str)
+    Returns:
+        path: path (str) of the file, with the extension of the compression
+    """
+    return path + COMPRESSION_EXTENSIONS[compression] if compression is not None else path
+
+
+def _check_available(compression):
+    if compression == "zstd" and zstandard is None:
+        raise ValueError(
+            "Please install the 'zstandard' package to use zstd compression")
+
+
+def _compressor(compression, level=None):
+    """
+    Returns:
+        compressor: object with 'compress(data)' and 'flush()', both returning compressed bytes
+    """
+    _check_available(compression)
+    level = DEFAULT_COMPRESSION_LEVELS[compression] if level is None else level
+
+    if compression == "gzip":
+        return zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+
+    return zstandard.ZstdCompressor(level=level).compressobj()
+
+
+def _decompressor(compression):
+    """
+    Returns:
+        decompressor: object with 'decompress(data)', 'eof' and 'unused_data' (for one gzip
+        member or zstd frame)
+    """
+    _check_available(compression)
+
+    if compression == "gzip":
+        return zlib.decompressobj(GZIP_WBITS)
+
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+class CompressingReader(io.RawIOBase):
+    """
+    Readable stream of the compressed content of a binary file-like object: the content is
+    compressed block by block as the stream is read (e.g. by an upload)
+
+    Args:
+        fileobj: binary file-like object to read the uncompressed content from
+        compression: one of COMPRESSION_EXTENSIONS (str)
+        level: compression level (int); DEFAULT_COMPRESSION_LEVELS if None
+    """
+
+    def __init__(self, fileobj, compression, level=None):
+        self.fileobj = fileobj
+        self.compressor = _compressor(compression, level)
+        self.buffer = bytearray()
+        self.done = False
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while not self.done and (size is None or size < 0 or len(self.buffer) < size):
+            block = self.fileobj.read(BLOCK_SIZE)
+
+            if block:
+                self.bytes_in += len(block)
+                self.buffer += self.compressor.compress(block)
+            else:
+                self.buffer += self.compressor.flush()
+                self.done = True
+
+        if size is None or size < 0:
+            size = len(self.buffer)
+
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        self.bytes_out += len(data)
+
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+
+        return len(data)
+
+
+class DecompressingWriter(io.RawIOBase):
+    """
+    Writable stream that decompresses what is written to it, block by block, into a binary
+    file-like object (e.g. the target of a download). It isn't seekable, so a download writes
+    to it in order. Closing it checks that the compressed content was complete (the underlying
+    file-like object is left open).
+
+    Args:
+        fileobj: binary file-like object to write the decompressed content to
+        compression: one of COMPRESSION_EXTENSIONS (str)
+    """
+
+    def __init__(self, fileobj, compression):
+        self.fileobj = fileobj
+        self.compression = compression
+        self.decompressor = _decompressor(compression)
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = bytes(b)
+        self.bytes_in += len(data)
+
+        while data:
+            out = self.decompressor.decompress(data)
+            self.fileobj.write(out)
+            self.bytes_out += len(out)
+
+            # a file can hold several gzip members / zstd frames, one after the other
+            data = self.decompressor.unused_data if self.decompressor.eof else b""
+
+            if data:
+                self.decompressor = _decompressor(self.compression)
+
+        return len(b)
+
+    def close(self):
+        if not self.closed and self.bytes_in > 0 and not self.decompressor.eof:
+            super().close()
+            raise ValueError(
+                f"The {self.compression} content is truncated")
+
+        super().close()
+
+
+def open_compressed(path, mode="rb", compression="infer", level=None):
+    """
+    Opens a local file, (de)compressing it as it is read or written
+
+    Args:
+        path: path (str) of the file
+        mode: "rb", "wb", "rt" or "wt" (str)
+        compression: "infer" (from the extension of 'path'), None, or one of COMPRESSION_EXTENSIONS (str)
+        level: compression level (int) when writing; DEFAULT_COMPRESSION_LEVELS if None
+    Returns:
+        f: file object (text, in utf-8, for the "t" modes)
+    """
+    compression = infer_compression(path, compression)
+    _check_available(compression)
+
+    if compression == "gzip":
+        level = DEFAULT_COMPRESSION_LEVELS["gzip"] if level is None else level
+        return gzip.open(path, mode, compresslevel=level,
+                         encoding="utf-8" if "t" in mode else None)
+
+    if compression is None:
+        return open(path, mode, encoding="utf-8" if "t" in mode else None)
+
+    if mode.startswith("r"):
+        f = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+    else:
+        level = DEFAULT_COMPRESSION_LEVELS["zstd"] if level is None else level
+        f = zstandard.ZstdCompressor(level=level).stream_writer(open(path, "wb"))
+
+    return io.TextIOWrapper(f, encoding="utf-8") if "t" in mode else f
@@ -0,0 +1,36 @@
+"""
+
+    conftest.py
+
+    Shared setup of the tests: makes the scripts of the backend importable (like the benchmarks
+    do), and has the fake clock that the rate limiters and the collector are tested with.
+
+"""
+import os
+import sys
+import threading
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+
+class FakeClock:
+    """
+    Clock whose time only moves when 'sleep' is called, and records the sleeps. Each thread
+    has its own time, so threads that wait at the same time (e.g. the credential sets of a
+    HydrationScheduler) don't move each other's clock.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.sleeps = []
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        return getattr(self.local, "now", 0.0)
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.sleeps.append(seconds)
+
+        self.local.now = self() + seconds
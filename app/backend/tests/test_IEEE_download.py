@@ -0,0 +1,166 @@
+"""
+
+    test_IEEE_download.py
+
+    Tests of the download of the IEEE .csv files ('scrape_tweets_daily.py' and 'file_cache.py'),
+    against a local HTTP server: cached files are revalidated with conditional requests (a
+    "304 Not Modified" answer means no download), and a file that can't be downloaded doesn't
+    stop the others.
+
+"""
+import hashlib
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import pytest
+from file_cache import FileCache, fetch_url
+from scrape_tweets_daily import download_IEEE_csvs, merge_IEEE_dfs
+
+
+class IEEEServer:
+    """
+    Local HTTP server of .csv files (in 'files', path -> bytes), with ETags. Records the
+    requests it gets (path, If-None-Match header, status) in 'requests'.
+    """
+
+    def __init__(self, files):
+        self.files = files
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                content = server.files.get(self.path)
+                etag = f'"{hashlib.sha256(content).hexdigest()}"' if content is not None else None
+                if_none_match = self.headers.get("If-None-Match")
+
+                if content is None:
+                    status = 404
+                elif if_none_match == etag:
+                    status = 304
+                else:
+                    status = 200
+
+                server.requests.append((self.path, if_none_match, status))
+
+                self.send_response(status)
+                if etag is not None:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length",
+                                 str(len(content)) if status == 200 else "0")
+                self.end_headers()
+
+                if status == 200:
+                    self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = HTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       kwargs={"poll_interval": 0.05}, daemon=True)
+        self.thread.start()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.httpd.server_port}{path}"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    server = IEEEServer({"/a.csv": b"1,0.5\n2,-0.25\n",
+                         "/b.csv": b"2,-0.25\n3,0.0\n"})
+    yield server
+    server.close()
+
+
+def test_cached_file_is_revalidated_not_downloaded(server, tmp_path):
+    cache = FileCache(str(tmp_path / "cache"))
+
+    path = fetch_url(cache, server.url("/a.csv"))
+    cached_path = fetch_url(cache, server.url("/a.csv"))
+
+    assert cached_path == path
+    assert open(path, "rb").read() == b"1,0.5\n2,-0.25\n"
+
+    # the second request is conditional, and answered with "304 Not Modified"
+    assert [status for _, _, status in server.requests] == [200, 304]
+    assert server.requests[1][1] is not None
+    assert cache.counts["misses"] == 1
+    assert cache.counts["hits"] == 1
+
+
+def test_changed_file_is_downloaded_again(server, tmp_path):
+    cache = FileCache(str(tmp_path / "cache"))
+    fetch_url(cache, server.url("/a.csv"))
+
+    server.files["/a.csv"] = b"1,0.5\n2,-0.25\n4,1.0\n"
+    path = fetch_url(cache, server.url("/a.csv"))
+
+    assert open(path, "rb").read() == b"1,0.5\n2,-0.25\n4,1.0\n"
+    assert [status for _, _, status in server.requests] == [200, 200]
+    assert cache.counts["misses"] == 2
+
+
+def test_cache_without_revalidation_makes_no_request(server, tmp_path):
+    cache = FileCache(str(tmp_path / "cache"))
+    fetch_url(cache, server.url("/a.csv"))
+    fetch_url(cache, server.url("/a.csv"), revalidate=False)
+
+    assert len(server.requests) == 1
+
+
+def test_file_evicted_after_the_lookup_is_downloaded_again(server, tmp_path, monkeypatch):
+    cache = FileCache(str(tmp_path / "cache"))
+    fetch_url(cache, server.url("/a.csv"))
+    get = cache.get
+
+    # e.g. evicted by another thread between the lookup of the entry and the 'get'
+    def get_after_eviction(key):
+        cache.remove(key)
+        return get(key)
+
+    monkeypatch.setattr(cache, "get", get_after_eviction)
+    path = fetch_url(cache, server.url("/a.csv"), revalidate=False)
+
+    assert open(path, "rb").read() == b"1,0.5\n2,-0.25\n"
+    assert [(if_none_match, status) for _, if_none_match, status in server.requests] == \
+        [(None, 200), (None, 200)]
+
+
+def test_cache_index_survives_a_restart(server, tmp_path):
+    cache = FileCache(str(tmp_path / "cache"))
+    fetch_url(cache, server.url("/a.csv"))
+    cache.save()
+
+    # e.g. the next daily run
+    cache = FileCache(str(tmp_path / "cache"))
+    fetch_url(cache, server.url("/a.csv"))
+
+    assert [status for _, _, status in server.requests] == [200, 304]
+
+
+def test_failed_download_does_not_stop_the_others(server, tmp_path):
+    cache = FileCache(str(tmp_path / "cache"))
+    links = [server.url("/a.csv"), server.url("/missing.csv"), server.url("/b.csv")]
+
+    dfs, failures = download_IEEE_csvs(links, max_workers=2, cache=cache)
+
+    assert list(failures) == [server.url("/missing.csv")]
+    assert [df["tweet_id"].tolist() for df in dfs] == [[1, 2], [2, 3]]
+
+    merged_df, tweet_IDs = merge_IEEE_dfs(dfs)
+
+    assert tweet_IDs.tolist() == [1, 2, 3]
+    assert tweet_IDs.dtype == np.int64
+
+
+def test_download_with_scores(server):
+    dfs, failures = download_IEEE_csvs([server.url("/a.csv")],
+                                       usecols=("tweet_id", "sentiment_score"))
+
+    assert failures == {}
+    assert dfs[0]["sentiment_score"].tolist() == [0.5, -0.25]
@@ -0,0 +1,199 @@
+"""
+
+    test_aws_helpers.py
+
+    Tests of the transfers of 'aws_helpers.py' against the filesystem backend (FilesystemClient,
+    used when AWS_FILESYSTEM_ROOT is set): files, buffers and dfs make the round trip to the
+    bucket and back unchanged, uncompressed or compressed with gzip or zstd on the way.
+
+"""
+import os
+import io
+import gzip
+import pandas as pd
+import pytest
+from aws_helpers import save_to_AWS, load_from_AWS, save_fileobj_to_AWS, load_fileobj_from_AWS, \
+    save_df_to_AWS, load_df_from_AWS, exists_in_AWS, upload_many, download_many, FilesystemClient, \
+    restore_from_AWS, save_state_to_AWS, get_object_cache
+from stream_compression import BLOCK_SIZE, compressed_path, zstandard
+
+AWS_BUCKET = "bucket"
+AWS_ARGS = ("s3", AWS_BUCKET, "access", "secret")
+
+# first bytes of the compressed objects
+MAGIC_NUMBERS = {"gzip": b"\x1f\x8b", "zstd": b"\x28\xb5\x2f\xfd"}
+
+COMPRESSIONS = [None, "gzip",
+                pytest.param("zstd", marks=pytest.mark.skipif(zstandard is None,
+                                                              reason="needs the 'zstandard' package"))]
+
+
+@pytest.fixture
+def s3_root(tmp_path, monkeypatch):
+    """
+    Returns:
+        root: directory (str) that the objects are stored under ("<root>/<bucket>/<key>")
+    """
+    root = str(tmp_path / "s3")
+    monkeypatch.setenv("AWS_FILESYSTEM_ROOT", root)
+
+    return root
+
+
+def stored_bytes(root, s3_file):
+    with open(os.path.join(root, AWS_BUCKET, *s3_file.split("/")), "rb") as f:
+        return f.read()
+
+
+def check_stored(root, s3_file, compression, content):
+    stored = stored_bytes(root, s3_file)
+
+    if compression is None:
+        assert stored == content
+    else:
+        assert stored.startswith(MAGIC_NUMBERS[compression])
+        assert stored != content
+
+
+# several blocks of (compressible) content
+CONTENT = b"".join(f"{i},tweet number {i}\n".encode("utf-8")
+                   for i in range(3 * BLOCK_SIZE // 20))
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_file_round_trip(s3_root, tmp_path, compression):
+    local_file = tmp_path / "tweets.csv"
+    local_file.write_bytes(CONTENT)
+    s3_file = compressed_path("tweet_scrapes/tweets.csv", compression)
+
+    num_bytes = save_to_AWS(str(local_file), s3_file, *AWS_ARGS, compression=compression)
+    load_from_AWS(str(tmp_path / "loaded.csv"), s3_file, *AWS_ARGS, compression=compression)
+
+    check_stored(s3_root, s3_file, compression, CONTENT)
+    assert num_bytes == len(stored_bytes(s3_root, s3_file))
+    assert (tmp_path / "loaded.csv").read_bytes() == CONTENT
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_fileobj_round_trip(s3_root, compression):
+    s3_file = compressed_path("tweet_scrapes/tweets.csv", compression)
+
+    num_bytes = save_fileobj_to_AWS(io.BytesIO(CONTENT), s3_file, *AWS_ARGS)
+    buffer = load_fileobj_from_AWS(s3_file, *AWS_ARGS)
+
+    check_stored(s3_root, s3_file, compression, CONTENT)
+    assert num_bytes == len(stored_bytes(s3_root, s3_file))
+    assert buffer.getvalue() == CONTENT
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_df_round_trip(s3_root, compression):
+    df = pd.DataFrame({"id": [1, 2, 3], "full_text": ["covid", "vaccine, mask", "é 😷"]})
+    s3_file = compressed_path("tweet_scrapes/tweets.csv", compression)
+
+    save_df_to_AWS(df, s3_file, *AWS_ARGS, index=False)
+
+    pd.testing.assert_frame_equal(load_df_from_AWS(s3_file, *AWS_ARGS), df)
+
+
+def test_compression_can_be_given_for_any_key(s3_root):
+    save_fileobj_to_AWS(io.BytesIO(CONTENT), "tweets.csv", *AWS_ARGS, compression="gzip")
+
+    assert gzip.decompress(stored_bytes(s3_root, "tweets.csv")) == CONTENT
+    assert load_fileobj_from_AWS("tweets.csv", *AWS_ARGS, compression="gzip").getvalue() == CONTENT
+    assert load_fileobj_from_AWS("tweets.csv", *AWS_ARGS, compression=None).getvalue() != CONTENT
+
+
+@pytest.mark.parametrize("compression", [c for c in COMPRESSIONS if c is not None])
+def test_truncated_object_is_an_error(s3_root, compression):
+    s3_file = compressed_path("tweets.csv", compression)
+    save_fileobj_to_AWS(io.BytesIO(CONTENT), s3_file, *AWS_ARGS)
+
+    path = os.path.join(s3_root, AWS_BUCKET, s3_file)
+    stored = stored_bytes(s3_root, s3_file)
+
+    with open(path, "wb") as f:
+        f.write(stored[:len(stored) // 2])
+
+    with pytest.raises(ValueError):
+        load_fileobj_from_AWS(s3_file, *AWS_ARGS)
+
+
+def test_missing_object(s3_root, tmp_path):
+    assert not exists_in_AWS("missing.csv", *AWS_ARGS)
+
+    with pytest.raises(ValueError):
+        load_from_AWS(str(tmp_path / "missing.csv"), "missing.csv", *AWS_ARGS)
+
+
+def test_failed_upload_is_an_error(s3_root, tmp_path):
+    with pytest.raises(ValueError):
+        save_to_AWS(str(tmp_path / "missing.csv"), "tweets.csv", *AWS_ARGS)
+
+    assert not exists_in_AWS("tweets.csv", *AWS_ARGS)
+
+
+def test_upload_and_download_many(s3_root, tmp_path):
+    local_file = tmp_path / "tweets.csv"
+    local_file.write_bytes(CONTENT)
+    df = pd.DataFrame({"id": [1, 2]})
+
+    uploaded, failures = upload_many([(str(local_file), "a/tweets.csv"),
+                                      (df, "a/ids.csv.gz"),
+                                      (io.BytesIO(b"covid"), "a/text.txt"),
+                                      (str(tmp_path / "missing.csv"), "a/missing.csv")],
+                                     *AWS_ARGS)
+
+    assert sorted(uploaded) == ["a/ids.csv.gz", "a/text.txt", "a/tweets.csv"]
+    assert list(failures) == ["a/missing.csv"]
+
+    downloaded, failures = download_many([("a/tweets.csv", str(tmp_path / "loaded.csv")),
+                                          ("a/ids.csv.gz", None),
+                                          ("a/text.txt", None),
+                                          ("a/missing.csv", None)],
+                                         *AWS_ARGS)
+
+    assert (tmp_path / "loaded.csv").read_bytes() == CONTENT
+    assert downloaded["a/ids.csv.gz"]["buffer"].getvalue() == df.to_csv().encode("utf-8")
+    assert downloaded["a/text.txt"]["buffer"].getvalue() == b"covid"
+    assert list(failures) == ["a/missing.csv"]
+
+
+def test_etag_changes_when_an_object_is_rewritten(s3_root):
+    client = FilesystemClient(s3_root)
+
+    save_fileobj_to_AWS(io.BytesIO(b"covid"), "tweets.txt", *AWS_ARGS)
+    etag = client.head_object(Bucket=AWS_BUCKET, Key="tweets.txt")["ETag"]
+
+    save_fileobj_to_AWS(io.BytesIO(b"covid vaccine"), "tweets.txt", *AWS_ARGS)
+
+    assert client.head_object(Bucket=AWS_BUCKET, Key="tweets.txt")["ETag"] != etag
+
+
+def test_state_is_restored_on_a_fresh_machine(s3_root, tmp_path, monkeypatch):
+    monkeypatch.setattr("aws_helpers._OBJECT_CACHE", None)
+    monkeypatch.setenv("S3_CACHE_DIR", str(tmp_path / "s3_cache"))
+
+    state_file = tmp_path / "first" / "state.json"
+    state_file.parent.mkdir()
+
+    assert not restore_from_AWS(str(state_file), "state.json", *AWS_ARGS)
+    assert not state_file.exists()
+
+    state_file.write_bytes(b'{"partitions": ["a"]}')
+    assert save_state_to_AWS(str(state_file), "state.json", *AWS_ARGS) == len(b'{"partitions": ["a"]}')
+
+    # the local file is kept, and its copy is cached: restoring it downloads nothing
+    assert state_file.read_bytes() == b'{"partitions": ["a"]}'
+    assert restore_from_AWS(str(state_file), "state.json", *AWS_ARGS)
+    assert get_object_cache().counts["downloaded_bytes"] == 0
+
+    # on a fresh machine, the copy in AWS replaces the local file
+    fresh_file = tmp_path / "fresh" / "state.json"
+    fresh_file.parent.mkdir()
+    fresh_file.write_bytes(b'{"partitions": []}')
+    monkeypatch.setattr("aws_helpers._OBJECT_CACHE", None)
+    monkeypatch.setenv("S3_CACHE_DIR", str(tmp_path / "fresh_s3_cache"))
+
+    assert restore_from_AWS(str(fresh_file), "state.json", *AWS_ARGS)
+    assert fresh_file.read_bytes() == b'{"partitions": ["a"]}'
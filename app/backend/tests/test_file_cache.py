@@ -0,0 +1,95 @@
+"""
+
+    test_file_cache.py
+
+    Tests of 'file_cache.py': the least recently used files are evicted first (content shared
+    by several keys is only counted, and deleted, once), and caches of several processes sharing
+    a directory don't lose each other's entries when they save the index.
+
+"""
+from concurrent.futures import ProcessPoolExecutor
+from file_cache import FileCache
+
+
+def put_bytes(cache, tmp_path, key, content):
+    path = tmp_path / f"{key}.tmp"
+    path.write_bytes(content)
+
+    return cache.put(key, str(path))
+
+
+def test_least_recently_used_files_are_evicted_first(tmp_path):
+    cache = FileCache(str(tmp_path / "cache"), max_bytes=10 ** 6)
+
+    for key in ["a", "b", "c", "d"]:
+        put_bytes(cache, tmp_path, key, key.encode("utf-8") * 10)
+
+    cache.get("a")
+
+    assert cache.evict(max_bytes=20) == ["b", "c"]
+    assert sorted(cache.index) == ["a", "d"]
+    assert cache.total_bytes() == 20
+    assert cache.counts["evictions"] == 2
+
+
+def test_shared_content_is_deleted_with_its_last_key(tmp_path):
+    cache = FileCache(str(tmp_path / "cache"), max_bytes=10 ** 6)
+
+    shared_path = put_bytes(cache, tmp_path, "a", b"covid" * 10)
+    put_bytes(cache, tmp_path, "b", b"covid" * 10)
+    put_bytes(cache, tmp_path, "c", b"vaccine" * 10)
+
+    # removing "a" frees nothing, as "b" has the same content
+    assert cache.total_bytes() == 120
+    assert cache.evict(max_bytes=70) == ["a", "b"]
+    assert not (tmp_path / "cache" / "objects" / shared_path.split("/")[-1]).exists()
+    assert cache.total_bytes() == 70
+
+
+def test_saves_of_several_caches_are_merged(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    first, second = FileCache(cache_dir), FileCache(cache_dir)
+
+    put_bytes(first, tmp_path, "a", b"covid")
+    put_bytes(first, tmp_path, "b", b"vaccine")
+    put_bytes(second, tmp_path, "c", b"mask")
+    first.remove("a")
+    first.save()
+
+    # "c" saved by the second cache is kept, "a" removed by the first one isn't merged back
+    assert sorted(FileCache(cache_dir).index) == ["b", "c"]
+
+
+def test_saves_drop_files_evicted_by_another_cache(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    first = FileCache(cache_dir)
+    put_bytes(first, tmp_path, "a", b"covid")
+
+    second = FileCache(cache_dir)
+    second.remove("a")
+    second.save()
+    first.save()
+
+    assert len(FileCache(cache_dir)) == 0
+
+
+def put_keys(cache_dir, tmp_dir, prefix, num_keys):
+    cache = FileCache(cache_dir)
+
+    for i in range(num_keys):
+        path = f"{tmp_dir}/{prefix}_{i}.tmp"
+
+        with open(path, "wb") as f:
+            f.write(f"{prefix} {i}".encode("utf-8"))
+
+        cache.put(f"{prefix}_{i}", path)
+
+
+def test_processes_sharing_a_cache_keep_all_entries(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    FileCache(cache_dir)
+
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(put_keys, [cache_dir] * 4, [str(tmp_path)] * 4, "wxyz", [25] * 4))
+
+    assert len(FileCache(cache_dir)) == 100
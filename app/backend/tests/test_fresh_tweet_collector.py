@@ -0,0 +1,145 @@
+"""
+
+    test_fresh_tweet_collector.py
+
+    Tests of 'fresh_tweet_collector.py' with a fake stream of tweets: the stream is reopened
+    after an error, with a wait that doubles after each consecutive error, and the collector
+    gives up after too many errors in a row.
+
+"""
+import pytest
+from conftest import FakeClock
+from fresh_tweet_collector import FreshTweetCollector
+
+
+class FakeStream:
+    """
+    Opens fake streams of tweets, one per connection. Each connection follows a script: a list
+    of tweets (dicts) to yield, and exceptions to raise (e.g. a dropped connection); a connection
+    whose script runs out ends the stream. Once the scripts run out, connections fail.
+    """
+
+    def __init__(self, scripts):
+        self.scripts = list(scripts)
+        self.closed = 0
+
+    def __call__(self):
+        script = self.scripts.pop(0) if self.scripts else [ConnectionError("no more connections")]
+
+        def stream():
+            try:
+                for item in script:
+                    if isinstance(item, Exception):
+                        raise item
+
+                    yield item
+            finally:
+                self.closed += 1
+
+        return stream()
+
+
+def tweets(*ids):
+    return [{"id": tweet_id} for tweet_id in ids]
+
+
+def test_stream_is_reopened_after_an_error():
+    clock = FakeClock()
+    snapshots = []
+    stream = FakeStream([tweets(1, 2) + [ConnectionError("stream dropped")],
+                         tweets(3, 4, 5)])
+    collector = FreshTweetCollector(stream, snapshots.append, flush_interval=None,
+                                    reconnect_wait=5, clock=clock, sleep=clock.sleep)
+
+    assert collector.run() == 5
+    assert clock.sleeps == [5]
+    assert collector.counts["connections"] == 2
+    assert collector.counts["stream_errors"] == 1
+    assert [tweet["id"] for tweet in snapshots[-1]] == [1, 2, 3, 4, 5]
+
+
+def test_reconnect_wait_doubles_after_consecutive_errors():
+    clock = FakeClock()
+    stream = FakeStream([[ConnectionError("refused")],
+                         [ConnectionError("refused")],
+                         [ConnectionError("refused")],
+                         tweets(1)])
+    collector = FreshTweetCollector(stream, lambda snapshot: None, flush_interval=None,
+                                    reconnect_wait=5, clock=clock, sleep=clock.sleep)
+
+    assert collector.run() == 1
+    assert clock.sleeps == [5, 10, 20]
+
+
+def test_reconnect_wait_is_reset_by_a_tweet():
+    clock = FakeClock()
+    stream = FakeStream([[ConnectionError("refused")],
+                         tweets(1) + [ConnectionError("stream dropped")],
+                         tweets(2)])
+    collector = FreshTweetCollector(stream, lambda snapshot: None, flush_interval=None,
+                                    reconnect_wait=5, clock=clock, sleep=clock.sleep)
+
+    assert collector.run() == 2
+    assert clock.sleeps == [5, 5]
+
+
+def test_collector_gives_up_after_max_reconnects():
+    clock = FakeClock()
+    stream = FakeStream([])
+    collector = FreshTweetCollector(stream, lambda snapshot: None, max_reconnects=2,
+                                    reconnect_wait=1, clock=clock, sleep=clock.sleep)
+
+    with pytest.raises(ConnectionError):
+        collector.run()
+
+    assert clock.sleeps == [1, 2]
+    assert collector.counts["connections"] == 3
+    assert collector.counts["stream_errors"] == 3
+
+
+def test_stream_is_closed_when_the_run_ends():
+    stream = FakeStream([tweets(*range(10))])
+    collector = FreshTweetCollector(stream, lambda snapshot: None, flush_interval=None)
+
+    assert collector.run(max_tweets=3) == 3
+    assert stream.closed == 1
+
+
+def test_buffer_keeps_the_most_recent_tweets():
+    snapshots = []
+    stream = FakeStream([tweets(*range(10))])
+    collector = FreshTweetCollector(stream, snapshots.append, buffer_size=3, flush_interval=None)
+
+    collector.run()
+
+    assert [[tweet["id"] for tweet in snapshot] for snapshot in snapshots] == [[7, 8, 9]]
+
+
+def test_snapshots_are_flushed_at_intervals():
+    clock = FakeClock()
+    snapshots = []
+
+    # a tweet every second
+    def open_stream():
+        for tweet in tweets(*range(10)):
+            clock.sleep(1)
+            yield tweet
+
+    collector = FreshTweetCollector(open_stream, snapshots.append, flush_interval=4,
+                                    clock=clock, sleep=clock.sleep)
+    collector.run()
+
+    # after the 4th and 8th tweets, and at the end of the run
+    assert [len(snapshot) for snapshot in snapshots] == [4, 8, 10]
+    assert collector.counts["snapshots"] == 3
+
+
+def test_failed_snapshot_does_not_stop_the_collector():
+    def on_snapshot(snapshot):
+        raise OSError("upload failed")
+
+    collector = FreshTweetCollector(FakeStream([tweets(1, 2)]), on_snapshot, flush_interval=None)
+
+    assert collector.run() == 2
+    assert collector.counts["snapshot_errors"] == 1
+    assert collector.counts["snapshots"] == 0
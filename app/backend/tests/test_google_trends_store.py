@@ -0,0 +1,88 @@
+"""
+
+    test_google_trends_store.py
+
+    Tests of 'google_trends_store.py' against the filesystem backend of 'aws_helpers.py': each
+    day is written as its own partition, and reads only download the partitions of the dates
+    they ask for.
+
+"""
+import io
+import pandas as pd
+import pytest
+from google_trends_store import GoogleTrendsStore, TRENDS_KINDS
+
+AWS_ARGS = ("s3", "bucket", "access", "secret")
+PREFIX = "aggregate_google_API_data/partitions/"
+
+
+@pytest.fixture(autouse=True)
+def s3_root(tmp_path, monkeypatch):
+    monkeypatch.setenv("AWS_FILESYSTEM_ROOT", str(tmp_path / "s3"))
+
+
+def day_dfs(date, value):
+    return (pd.DataFrame({"date": [date], "covid": [value]}),
+            pd.DataFrame({"date": [date, date], "geoName": ["California", "New York"],
+                          "covid": [value, value + 1]}))
+
+
+def new_store(compression=None):
+    store = GoogleTrendsStore(PREFIX, *AWS_ARGS, compression=compression)
+    store.load()
+
+    return store
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_days_are_appended_as_partitions(compression):
+    store = new_store(compression)
+    assert store.is_empty()
+
+    for day, date in enumerate(["2021-02-08", "2021-02-09", "2021-02-10"]):
+        store.append_day(date, *day_dfs(date, day))
+        store.save()
+
+    # e.g. the next daily run
+    store = new_store(compression)
+
+    assert store.manifest.partition_names() == ["2021-02-08", "2021-02-09", "2021-02-10"]
+    assert store.read("interest_over_time")["covid"].tolist() == [0, 1, 2]
+    assert store.read("interest_by_region", start_date="2021-02-09")["covid"].tolist() == [1, 2, 2, 3]
+    assert [p["name"] for p in store.partitions(end_date="2021-02-08")] == ["2021-02-08"]
+
+
+def test_rewriting_a_day_replaces_its_partition():
+    store = new_store()
+    store.append_day("2021-02-09", *day_dfs("2021-02-09", 1))
+    store.append_day("2021-02-09", *day_dfs("2021-02-09", 5))
+    store.save()
+
+    store = new_store()
+
+    assert store.manifest.partition_names() == ["2021-02-09"]
+    assert store.read("interest_over_time")["covid"].tolist() == [5]
+
+
+def test_bootstrapped_partition_is_filtered_by_date():
+    store = new_store()
+
+    # legacy files were written with their index (read back as an "Unnamed: 0" col)
+    legacy_df = pd.read_csv(io.StringIO(pd.DataFrame({"date": ["2021-02-01", "2021-02-02", "2021-02-03"],
+                                                      "covid": [1, 2, 3]}).to_csv()))
+    store.bootstrap(legacy_df, legacy_df, "2021-02-01", "2021-02-03")
+    store.append_day("2021-02-04", *day_dfs("2021-02-04", 4))
+    store.save()
+
+    df = new_store().read("interest_over_time", start_date="2021-02-02", end_date="2021-02-04")
+
+    assert df["covid"].tolist() == [2, 3, 4]
+    assert list(df.columns) == ["date", "covid"]
+    assert new_store().manifest.partition_names() == ["2021-02-01_2021-02-03", "2021-02-04"]
+
+
+def test_empty_store_reads_an_empty_df():
+    store = new_store()
+
+    for kind in TRENDS_KINDS:
+        assert store.read(kind).empty
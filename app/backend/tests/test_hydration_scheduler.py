@@ -0,0 +1,228 @@
+"""
+
+    test_hydration_scheduler.py
+
+    Tests of 'hydration_scheduler.py': the batches of tweets come back in order, whatever the
+    number of credential sets and the order their lookups finish in, and each credential set
+    waits for its own rate limit.
+
+"""
+import time
+import bisect
+import threading
+import numpy as np
+import pytest
+from conftest import FakeClock
+from hydration_scheduler import HydrationScheduler, TokenBucket, LOOKUP_REQUESTS_PER_WINDOW, \
+    LOOKUP_WINDOW_SECONDS
+
+
+def fake_lookup(delays=None, record=None):
+    """
+    Args:
+        delays: dict of first tweet ID of a batch (int) -> seconds (float) its lookup takes
+        record: list that the batches looked up are appended to (optional)
+    Returns:
+        lookup: function that "hydrates" a batch of tweet IDs like the API: the tweets come back
+        in reverse order, and the tweets whose ID is a multiple of 7 are missing (deleted)
+    """
+    def lookup(batch):
+        if record is not None:
+            record.append(batch)
+
+        time.sleep((delays or {}).get(int(batch[0]), 0))
+
+        return [{"id": int(tweet_ID)} for tweet_ID in reversed(batch)
+                if int(tweet_ID) % 7 != 0]
+
+    return lookup
+
+
+class RateLimitedAPI:
+    """
+    Stub of the lookup API that enforces its rate limit per credential set, like Twitter: a
+    request is rejected (with a "429 Too Many Requests" error) if the credential set has already
+    made 'max_requests' requests in the 'window_seconds' before it
+    """
+
+    class TooManyRequests(Exception):
+        pass
+
+    def __init__(self, clock, max_requests=LOOKUP_REQUESTS_PER_WINDOW,
+                 window_seconds=LOOKUP_WINDOW_SECONDS):
+        self.clock = clock
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.requests = {}
+        self.lock = threading.Lock()
+
+    def lookup(self, credentials):
+        def lookup(batch):
+            now = self.clock()
+
+            with self.lock:
+                times = self.requests.setdefault(credentials, [])
+
+                # number of requests in the window (now - window_seconds, now]
+                in_window = len(times) - bisect.bisect_right(times, now - self.window_seconds)
+
+                if in_window >= self.max_requests:
+                    raise self.TooManyRequests(f"429 Too Many Requests ({credentials})")
+
+                times.append(now)
+
+            return [{"id": int(tweet_ID)} for tweet_ID in batch]
+
+        return lookup
+
+
+def test_batches_are_yielded_in_order():
+    tweet_IDs = np.arange(1, 251, dtype=np.int64)
+
+    # the first batches are the slowest, so later batches finish first
+    records = [[], []]
+    lookups = [fake_lookup({1: 0.2, 51: 0.1}, records[0]),
+               fake_lookup({26: 0.15}, records[1])]
+    scheduler = HydrationScheduler(lookups, burst=100)
+
+    try:
+        batches = list(scheduler.hydrate_batches(tweet_IDs, batch_size=25))
+    finally:
+        scheduler.close()
+
+    assert [end for end, _ in batches] == list(range(25, 251, 25))
+
+    for end, tweets in batches:
+        expected = [tweet_ID for tweet_ID in range(end, end - 25, -1)
+                    if tweet_ID % 7 != 0]
+        assert [tweet["id"] for tweet in tweets] == expected
+
+    # batch i goes to credential set i % 2
+    assert [int(batch[0]) for batch in records[0]] == list(range(1, 251, 50))
+    assert [int(batch[0]) for batch in records[1]] == list(range(26, 251, 50))
+    assert scheduler.counts == [5, 5]
+
+
+def test_hydrate_resumes_from_an_offset():
+    tweet_IDs = np.arange(1, 101, dtype=np.int64)
+    scheduler = HydrationScheduler([fake_lookup()], burst=100)
+
+    try:
+        batches = list(scheduler.hydrate_batches(tweet_IDs, start=60, batch_size=25))
+    finally:
+        scheduler.close()
+
+    assert [end for end, _ in batches] == [85, 100]
+    assert min(tweet["id"] for _, tweets in batches for tweet in tweets) == 61
+
+
+def test_hydrate_yields_the_tweets_batch_by_batch():
+    tweet_IDs = np.arange(1, 31, dtype=np.int64)
+    scheduler = HydrationScheduler([fake_lookup()], burst=100)
+
+    try:
+        tweets = list(scheduler.hydrate(tweet_IDs))
+    finally:
+        scheduler.close()
+
+    # batches of 100 IDs: one batch, in the order the lookup returned it, without deleted tweets
+    assert [tweet["id"] for tweet in tweets] == [tweet_ID for tweet_ID in range(30, 0, -1)
+                                                  if tweet_ID % 7 != 0]
+
+
+def test_credential_set_waits_for_its_rate_limit():
+    clock = FakeClock()
+
+    # 3 lookups per 2 seconds with a burst of 1: a token every second
+    scheduler = HydrationScheduler([fake_lookup()], requests_per_window=3, window_seconds=2,
+                                   clock=clock, sleep=clock.sleep)
+
+    try:
+        batches = list(scheduler.hydrate_batches(np.arange(1, 101, dtype=np.int64),
+                                                 batch_size=25))
+    finally:
+        scheduler.close()
+
+    assert len(batches) == 4
+    assert clock.sleeps == [1.0, 1.0, 1.0]
+    assert scheduler.wait_seconds == [3.0]
+
+
+def test_credential_sets_have_their_own_rate_limits():
+    clock = FakeClock()
+    scheduler = HydrationScheduler([fake_lookup(), fake_lookup()], requests_per_window=3,
+                                   window_seconds=2, clock=clock, sleep=clock.sleep)
+
+    try:
+        list(scheduler.hydrate_batches(np.arange(1, 101, dtype=np.int64), batch_size=25))
+    finally:
+        scheduler.close()
+
+    # 2 lookups per credential set: only the second one of each set waits
+    assert scheduler.counts == [2, 2]
+    assert scheduler.wait_seconds == [1.0, 1.0]
+
+
+@pytest.mark.parametrize("burst", [1, 100, LOOKUP_REQUESTS_PER_WINDOW - 1])
+def test_scheduler_never_goes_over_the_rate_limit(burst):
+    clock = FakeClock()
+    api = RateLimitedAPI(clock)
+    scheduler = HydrationScheduler([api.lookup("a"), api.lookup("b")], burst=burst,
+                                   clock=clock, sleep=clock.sleep)
+
+    # more than a window's worth of requests per credential set
+    try:
+        batches = list(scheduler.hydrate_batches(np.arange(1, 2 * 1000 + 1, dtype=np.int64),
+                                                 batch_size=1))
+    finally:
+        scheduler.close()
+
+    assert len(batches) == 2000
+    assert [len(api.requests[credentials]) for credentials in "ab"] == [1000, 1000]
+
+    # the requests over the first window's limit had to wait for the next window
+    assert api.requests["a"][-1] > LOOKUP_WINDOW_SECONDS
+
+
+def test_rate_limited_api_rejects_requests_over_the_limit():
+    clock = FakeClock()
+    lookup = RateLimitedAPI(clock, max_requests=2, window_seconds=10).lookup("a")
+
+    lookup(["1"])
+    lookup(["2"])
+
+    with pytest.raises(RateLimitedAPI.TooManyRequests):
+        lookup(["3"])
+
+    clock.sleep(10)
+    lookup(["3"])
+
+
+def test_token_bucket_allows_a_burst_then_waits():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=0.5, capacity=2, clock=clock, sleep=clock.sleep)
+
+    assert [bucket.acquire() for _ in range(4)] == [0.0, 0.0, 2.0, 2.0]
+
+
+def test_token_bucket_refills_while_idle():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, capacity=1, clock=clock, sleep=clock.sleep)
+
+    assert bucket.acquire() == 0.0
+
+    # time passes without requests (e.g. while tweets are being written)
+    clock.sleep(5)
+
+    assert bucket.acquire() == 0.0
+
+
+def test_scheduler_needs_credentials():
+    with pytest.raises(ValueError):
+        HydrationScheduler([])
+
+
+@pytest.mark.parametrize("burst", [0, LOOKUP_REQUESTS_PER_WINDOW])
+def test_burst_must_leave_room_to_refill(burst):
+    with pytest.raises(ValueError):
+        HydrationScheduler([fake_lookup()], burst=burst)
@@ -0,0 +1,68 @@
+"""
+
+    test_partition_manifest.py
+
+    Tests of 'partition_manifest.py': partitions added to a manifest are kept across saves, in
+    the order they were added, and a manifest can be sent to and read back from S3 as JSON.
+
+"""
+import json
+import pytest
+from partition_manifest import PartitionManifest
+
+
+def test_new_manifest_is_empty(tmp_path):
+    manifest = PartitionManifest(str(tmp_path / "manifest.json"))
+
+    assert manifest.partition_names() == []
+    assert not (tmp_path / "manifest.json").exists()
+
+
+def test_partitions_survive_a_save(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = PartitionManifest(path)
+    manifest.add_partition("preprocessed_tweets_1.csv", num_rows=10)
+    manifest.add_partition("preprocessed_tweets_2.csv", num_rows=20)
+    manifest.save()
+
+    manifest = PartitionManifest(path)
+
+    assert manifest.partition_names() == ["preprocessed_tweets_1.csv", "preprocessed_tweets_2.csv"]
+    assert manifest.has_partition("preprocessed_tweets_2.csv")
+    assert not manifest.has_partition("preprocessed_tweets_3.csv")
+    assert manifest.partitions[1]["num_rows"] == 20
+    assert "created_at" in manifest.partitions[1]
+
+
+def test_partition_with_the_same_name_is_replaced(tmp_path):
+    manifest = PartitionManifest(str(tmp_path / "manifest.json"))
+    manifest.add_partition("a.csv", num_rows=1)
+    manifest.add_partition("b.csv", num_rows=2)
+    manifest.add_partition("a.csv", num_rows=3)
+
+    assert manifest.partition_names() == ["b.csv", "a.csv"]
+    assert manifest.partitions[-1]["num_rows"] == 3
+
+
+def test_save_leaves_no_temporary_file(tmp_path):
+    manifest = PartitionManifest(str(tmp_path / "manifest.json"))
+    manifest.add_partition("a.csv")
+    manifest.save()
+
+    assert [path.name for path in tmp_path.iterdir()] == ["manifest.json"]
+    assert json.loads((tmp_path / "manifest.json").read_text())["partitions"][0]["name"] == "a.csv"
+
+
+def test_json_round_trip():
+    manifest = PartitionManifest()
+    manifest.add_partition("a.csv", s3_key="tweet_scrapes/a.csv")
+
+    loaded = PartitionManifest.from_json(manifest.to_json().encode("utf-8"))
+
+    assert loaded.partitions == manifest.partitions
+    assert loaded.path is None
+
+
+def test_manifest_without_a_path_cant_be_saved():
+    with pytest.raises(ValueError):
+        PartitionManifest().save()
@@ -0,0 +1,241 @@
+"""
+
+    test_preprocess_tweets.py
+
+    Tests of 'preprocess_tweets.py': preprocessing the tweets in chunks (in a pool of processes,
+    or streamed from the file) gives byte-identical output to preprocessing them all at once,
+    and the place decoder gives the same locations as 'parse_location'.
+
+"""
+import random
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pytest
+import preprocess_tweets
+from preprocess_tweets import TWEET_COLUMNS, LOCATION_COLUMNS, DATE_COLUMNS, parse_location, try_literal_eval, \
+    preprocess_tweets_df, preprocess_tweets_parallel, preprocess_tweets_csv_streaming, PlaceDecoder, \
+    read_hydrated_tweets, new_hydrated_partitions, parse_dates_column
+from benchmarks.reference_preprocessing import parse_dates
+from partition_manifest import PartitionManifest
+from stream_compression import open_compressed, zstandard
+
+PLACES = [None,
+          "{'id': '3b77caf94bfc81fe', 'country_code': 'US', 'full_name': 'Los Angeles, CA'}",
+          "{'id': '01a9a39529b27f36', 'country_code': 'US', 'full_name': 'Manhattan, NY'}",
+          "{'id': '96683cc9126741d1', 'country_code': 'US', 'full_name': 'United States'}",
+          "{'id': '3797791ff9c0e4c6', 'country_code': 'CA', 'full_name': 'Toronto, Ontario'}",
+          "{'id': '4e7c21fd2af027c6', 'country_code': 'GB', 'full_name': 'London, England'}"]
+
+TEXTS = ["Stay home, stay safe!! #COVID19 #StayHome https://t.co/abc123",
+         "The vaccine rollout in CA is finally picking up speed 💉🎉 #vaccine",
+         "Day 300 of #lockdown#quarantine... I've watched everything on Netflix 😂",
+         "@CDCgov new guidance: wear a mask indoors & keep 6ft apart.\nRead more: http://cdc.gov",
+         "¿Dónde puedo vacunarme? #COVID19 #vacuna"]
+
+
+def make_hydrated_tweets(num_tweets, seed=0):
+    """
+    Returns:
+        tweets_df: pandas df of hydrated tweets, with the TWEET_COLUMNS cols, as read from a .csv
+        file (every 10th tweet has a timestamp that can't be parsed)
+    """
+    rng = random.Random(seed)
+    timestamps = pd.date_range("2020-03-20", "2021-02-09", periods=num_tweets, tz="UTC")
+
+    return pd.DataFrame({
+        "user": [f"user_{rng.randint(0, 50)}" for _ in range(num_tweets)],
+        "created_at": ["not a timestamp" if i % 10 == 9 else
+                       timestamp.strftime("%a %b %d %H:%M:%S +0000 %Y")
+                       for i, timestamp in enumerate(timestamps)],
+        "id": np.arange(1_250_000_000_000_000_000, 1_250_000_000_000_000_000 + num_tweets),
+        "full_text": [rng.choice(TEXTS) for _ in range(num_tweets)],
+        "geo": [None] * num_tweets,
+        "coordinates": [None] * num_tweets,
+        "place": [rng.choice(PLACES) for _ in range(num_tweets)],
+        "retweet_count": [rng.randint(0, 1000) for _ in range(num_tweets)],
+        "favorite_count": [rng.randint(0, 1000) for _ in range(num_tweets)]},
+        columns=TWEET_COLUMNS)
+
+
+@pytest.fixture
+def tweets_df():
+    return make_hydrated_tweets(100)
+
+
+@pytest.fixture
+def tweets_csv(tmp_path, tweets_df):
+    path = tmp_path / "hydrated_tweets.csv"
+    tweets_df.to_csv(path, index=False)
+
+    return str(path)
+
+
+def read_tweets_csv(path):
+    # as the whole file is read by the script
+    return pd.read_csv(path, usecols=TWEET_COLUMNS)[TWEET_COLUMNS]
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 7, 50])
+def test_parallel_output_is_identical(tweets_df, chunk_size):
+    expected_df = preprocess_tweets_df(tweets_df)
+    preprocessed_df = preprocess_tweets_parallel(tweets_df, num_workers=2, chunk_size=chunk_size)
+
+    pd.testing.assert_frame_equal(preprocessed_df, expected_df)
+    assert preprocessed_df.to_csv() == expected_df.to_csv()
+
+
+def test_parallel_output_with_a_shared_pool_is_identical(tweets_df):
+    expected_df = preprocess_tweets_df(tweets_df)
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        for _ in range(2):
+            preprocessed_df = preprocess_tweets_parallel(tweets_df, num_workers=2, chunk_size=30,
+                                                         executor=executor)
+
+            assert preprocessed_df.to_csv() == expected_df.to_csv()
+
+
+@pytest.mark.parametrize("chunk_size, num_workers", [(1, 1), (33, 1), (100, 1), (1000, 1), (33, 2)])
+def test_streaming_output_is_identical(tmp_path, tweets_csv, chunk_size, num_workers):
+    output_path = tmp_path / "preprocessed_tweets.csv"
+    expected_df = preprocess_tweets_df(read_tweets_csv(tweets_csv))
+
+    num_rows, num_bad_timestamps, _ = preprocess_tweets_csv_streaming(tweets_csv, str(output_path),
+                                                                      chunk_size, num_workers)
+
+    assert output_path.read_bytes() == expected_df.to_csv().encode("utf-8")
+    assert num_rows == 100
+    assert num_bad_timestamps == 10
+
+
+def test_streaming_skips_processed_tweets(tmp_path, tweets_csv, tweets_df):
+    output_path = tmp_path / "preprocessed_tweets.csv"
+    processed_IDs = np.sort(tweets_df["id"].to_numpy()[::3])
+
+    num_rows, _, tweet_IDs = preprocess_tweets_csv_streaming(tweets_csv, str(output_path), 40,
+                                                             processed_IDs=processed_IDs)
+
+    assert num_rows == 66
+    assert tweet_IDs.tolist() == [tweet_ID for tweet_ID in tweets_df["id"]
+                                  if tweet_ID not in set(processed_IDs)]
+    assert pd.read_csv(output_path)["id"].tolist() == tweet_IDs.tolist()
+
+
+def test_streaming_several_files_is_identical(tmp_path):
+    paths = []
+    for seed, num_tweets in enumerate([30, 45]):
+        paths.append(str(tmp_path / f"hydrated_tweets_{seed}.csv"))
+        make_hydrated_tweets(num_tweets, seed).to_csv(paths[-1], index=False)
+
+    output_path = tmp_path / "preprocessed_tweets.csv"
+    expected_df = preprocess_tweets_df(pd.concat([read_tweets_csv(path) for path in paths],
+                                                 ignore_index=True))
+
+    preprocess_tweets_csv_streaming(paths, str(output_path), chunk_size=20)
+
+    assert output_path.read_bytes() == expected_df.to_csv().encode("utf-8")
+
+
+def test_only_new_hydrated_partitions_are_preprocessed():
+    hydrated_manifest, manifest = PartitionManifest(), PartitionManifest()
+
+    for name in ["a", "b", "c", "d"]:
+        hydrated_manifest.add_partition(name, num_rows=10)
+
+    manifest.add_partition("first", hydrated_partitions=["a", "b"])
+    assert [partition["name"] for partition in new_hydrated_partitions(hydrated_manifest, manifest)] == \
+        ["c", "d"]
+
+    manifest.add_partition("second", hydrated_partitions=["c", "d"])
+    assert new_hydrated_partitions(hydrated_manifest, manifest) == []
+
+
+def test_dates_column_matches_parse_dates(tweets_df):
+    timestamps = tweets_df["created_at"]
+    dates_df = parse_dates_column(timestamps)
+    is_parsed = timestamps != "not a timestamp"
+
+    assert list(dates_df.columns) == DATE_COLUMNS
+    assert list(dates_df[is_parsed].astype(object).itertuples(index=False, name=None)) == \
+        [parse_dates(timestamp) for timestamp in timestamps[is_parsed]]
+    assert dates_df[~is_parsed].isna().all().all()
+
+
+def test_dates_keep_their_format():
+    timestamps = pd.Series(["Tue Feb 09 23:59:59 +0000 2021", "Mon Oct 12 00:00:00 +0000 2020"])
+    dates_df = parse_dates_column(timestamps)
+
+    # the day isn't zero-padded in the date, the month is
+    assert dates_df["date"].tolist() == ["2021-02-9", "2020-10-12"]
+    assert dates_df["month"].tolist() == ["02", "10"]
+    assert dates_df[["day", "hour"]].values.tolist() == [[9, 23], [12, 0]]
+
+
+def test_place_decoder_matches_parse_location(tweets_df):
+    decoder = PlaceDecoder()
+    locations_df = decoder.decode_column(tweets_df["place"])
+
+    expected = [parse_location(try_literal_eval(place)) if isinstance(place, str)
+                else ("N/A", "N/A", "N/A") for place in tweets_df["place"]]
+
+    assert list(locations_df.columns) == LOCATION_COLUMNS
+    assert list(locations_df.itertuples(index=False, name=None)) == expected
+
+
+def test_place_decoder_parses_each_place_once(tweets_df):
+    decoder = PlaceDecoder()
+    decoder.decode_column(tweets_df["place"])
+    decoder.decode_column(tweets_df["place"])
+
+    num_distinct = tweets_df["place"].dropna().nunique()
+    num_empty = int(tweets_df["place"].isna().sum())
+
+    assert decoder.counts["parsed"] == num_distinct
+    assert decoder.counts["rows"] == 200
+    assert decoder.counts["empty"] == 2 * num_empty
+    assert decoder.hit_rate() == 1 - num_distinct / (200 - 2 * num_empty)
+
+
+def test_place_decoder_decodes_dicts(tweets_df):
+    places = tweets_df["place"].map(try_literal_eval)
+
+    assert PlaceDecoder().decode_column(places).equals(
+        PlaceDecoder().decode_column(tweets_df["place"]))
+
+
+@pytest.fixture
+def opened_files(monkeypatch):
+    """
+    Returns:
+        opened: file objects (list) opened by 'open_compressed' in 'preprocess_tweets.py'
+    """
+    opened = []
+
+    def spy_open_compressed(*args, **kwargs):
+        opened.append(open_compressed(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(preprocess_tweets, "open_compressed", spy_open_compressed)
+
+    return opened
+
+
+@pytest.mark.skipif(zstandard is None, reason="needs the 'zstandard' package")
+@pytest.mark.parametrize("chunk_size, num_chunks", [(None, None), (40, 3), (40, 1)])
+def test_zstd_file_is_closed_after_reading(tmp_path, tweets_df, opened_files, chunk_size, num_chunks):
+    path = str(tmp_path / "hydrated_tweets.csv.zst")
+    with open_compressed(path, "wt") as f:
+        tweets_df.to_csv(f, index=False)
+
+    if chunk_size is None:
+        read_df = read_hydrated_tweets(path)
+    else:
+        # the chunks are read only in part when 'num_chunks' is 1
+        chunks = read_hydrated_tweets(path, chunk_size)
+        read_df = pd.concat([next(chunks) for _ in range(num_chunks)])
+        chunks.close()
+
+    assert read_df["id"].tolist() == tweets_df["id"].tolist()[:read_df.shape[0]]
+    assert len(opened_files) == 1
+    assert opened_files[0].closed
@@ -0,0 +1,101 @@
+"""
+
+    test_run_metrics.py
+
+    Tests of 'run_metrics.py': the stages of a run add up their metrics, an exception raised in
+    a stage is counted as an error of the run, and the record of the run is written as JSON.
+
+"""
+import json
+import pytest
+from run_metrics import RunMetrics, StageMetrics, file_size
+
+
+def test_stage_metrics_add_up_over_several_entries(tmp_path):
+    metrics = RunMetrics("preprocess_tweets.py", str(tmp_path))
+
+    for num_rows in [10, 20]:
+        with metrics.stage("preprocess") as stage:
+            stage.rows_in += num_rows
+            stage.rows_out += num_rows - 1
+
+    with metrics.stage("upload") as stage:
+        stage.bytes_written += 100
+
+    record = metrics.to_dict()
+
+    assert [stage["name"] for stage in record["stages"]] == ["preprocess", "upload"]
+    assert record["stages"][0]["rows_in"] == 30
+    assert record["stages"][0]["rows_out"] == 28
+    assert record["stages"][1]["bytes_written"] == 100
+    assert record["status"] == "succeeded"
+    assert record["errors"] == 0
+
+
+def test_exception_in_a_stage_is_an_error(tmp_path):
+    metrics = RunMetrics("preprocess_tweets.py", str(tmp_path))
+
+    with pytest.raises(ValueError):
+        with metrics.stage("load"):
+            raise ValueError("Please address error in reading the file")
+
+    record = metrics.to_dict()
+
+    assert record["status"] == "failed"
+    assert record["errors"] == 1
+    assert record["stages"][0]["error_messages"] == ["ValueError: Please address error in reading the file"]
+
+
+def test_exit_without_an_error_code_is_not_an_error(tmp_path):
+    metrics = RunMetrics("hydrate_tweets.py", str(tmp_path))
+
+    with pytest.raises(SystemExit):
+        with metrics.stage("hydrate"):
+            raise SystemExit(0)
+
+    with pytest.raises(SystemExit):
+        with metrics.stage("upload"):
+            raise SystemExit(1)
+
+    assert metrics.num_errors() == 1
+
+
+def test_caught_errors_are_counted():
+    stage = StageMetrics("download")
+    stage.add_error(OSError("connection reset"))
+    stage.add_error("2 files could not be downloaded")
+
+    assert stage.to_dict()["errors"] == 2
+    assert stage.error_messages == ["OSError: connection reset", "2 files could not be downloaded"]
+
+
+def test_s3_transfers_are_counted():
+    stage = StageMetrics("upload")
+
+    with stage.s3_transfer():
+        pass
+
+    with stage.s3_transfer(num_transfers=3):
+        pass
+
+    assert stage.s3_transfers == 4
+    assert stage.s3_seconds >= 0
+
+
+def test_record_is_saved_as_json(tmp_path):
+    metrics = RunMetrics("app/backend/preprocess_tweets.py", str(tmp_path / "run_metrics"))
+    metrics.info["input"] = "hydrated_tweets.csv"
+
+    with metrics.stage("load") as stage:
+        stage.bytes_read += file_size(str(tmp_path / "missing.csv"))
+
+    path = metrics.save()
+
+    with open(path) as f:
+        record = json.load(f)
+
+    assert path.startswith(str(tmp_path / "run_metrics" / "preprocess_tweets_"))
+    assert path.endswith(".json")
+    assert record["script"] == "app/backend/preprocess_tweets.py"
+    assert record["info"] == {"input": "hydrated_tweets.csv"}
+    assert record["stages"][0]["bytes_read"] == 0
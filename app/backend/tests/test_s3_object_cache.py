@@ -0,0 +1,130 @@
+"""
+
+    test_s3_object_cache.py
+
+    Tests of 's3_object_cache.py' against the filesystem backend of 'aws_helpers.py': an object is
+    only downloaded if it isn't cached or has changed in S3, uploaded files are moved into the
+    cache, and the least recently used objects are evicted past the size cap.
+
+"""
+import os
+import pytest
+import aws_helpers
+from aws_helpers import FilesystemClient, fetch_from_AWS, cache_uploaded_file
+from s3_object_cache import S3ObjectCache, object_suffix
+
+AWS_BUCKET = "bucket"
+
+
+@pytest.fixture
+def s3(tmp_path):
+    return FilesystemClient(str(tmp_path / "s3"))
+
+
+def put_object(s3, key, content):
+    path = s3._path(AWS_BUCKET, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_cached_object_is_not_downloaded_again(s3, tmp_path):
+    cache = S3ObjectCache(str(tmp_path / "cache"))
+    put_object(s3, "tweet_scrapes/a.csv", b"1,covid\n")
+
+    path = cache.fetch(s3, AWS_BUCKET, "tweet_scrapes/a.csv")
+    cached_path = cache.fetch(s3, AWS_BUCKET, "tweet_scrapes/a.csv")
+
+    assert cached_path == path
+    assert read(path) == b"1,covid\n"
+    assert cache.counts["misses"] == 1
+    assert cache.counts["hits"] == 1
+    assert cache.counts["downloaded_bytes"] == 8
+
+
+def test_changed_object_is_downloaded_again(s3, tmp_path):
+    cache = S3ObjectCache(str(tmp_path / "cache"))
+    put_object(s3, "a.csv", b"1,covid\n")
+    cache.fetch(s3, AWS_BUCKET, "a.csv")
+
+    put_object(s3, "a.csv", b"1,covid\n2,vaccine\n")
+
+    assert cache.get(s3, AWS_BUCKET, "a.csv", revalidate=False) is not None
+    assert cache.get(s3, AWS_BUCKET, "a.csv") is None
+    assert read(cache.fetch(s3, AWS_BUCKET, "a.csv")) == b"1,covid\n2,vaccine\n"
+    assert len(cache) == 1
+    assert cache.total_bytes() == 18
+
+
+def test_uploaded_file_is_moved_into_the_cache(s3, tmp_path):
+    cache = S3ObjectCache(str(tmp_path / "cache"))
+    local_file = tmp_path / "a.csv"
+    local_file.write_bytes(b"1,covid\n")
+    s3.upload_file(str(local_file), AWS_BUCKET, "a.csv")
+
+    path = cache.add(s3, AWS_BUCKET, "a.csv", str(local_file))
+
+    assert not local_file.exists()
+    assert cache.fetch(s3, AWS_BUCKET, "a.csv") == path
+    assert cache.counts["downloaded_bytes"] == 0
+
+
+def test_least_recently_used_objects_are_evicted(s3, tmp_path):
+    cache = S3ObjectCache(str(tmp_path / "cache"), max_bytes=20)
+
+    for name in ["a", "b", "c"]:
+        put_object(s3, f"{name}.csv", name.encode("utf-8") * 8)
+        cache.fetch(s3, AWS_BUCKET, f"{name}.csv")
+
+    # "a" was evicted to make room for "c"; using "b" makes "c" the least recently used
+    cache.fetch(s3, AWS_BUCKET, "b.csv")
+    evicted = cache.prune(max_bytes=10)
+
+    assert cache.counts["evictions"] == 2
+    assert evicted == ["s3://bucket/c.csv"]
+    assert cache.get(s3, AWS_BUCKET, "b.csv") is not None
+    assert cache.total_bytes() == 8
+
+
+def test_cache_survives_a_restart(s3, tmp_path):
+    put_object(s3, "a.csv", b"1,covid\n")
+    S3ObjectCache(str(tmp_path / "cache")).fetch(s3, AWS_BUCKET, "a.csv")
+
+    # e.g. the next stage of the pipeline
+    cache = S3ObjectCache(str(tmp_path / "cache"))
+    cache.fetch(s3, AWS_BUCKET, "a.csv")
+
+    assert cache.counts["misses"] == 0
+
+
+def test_fetch_and_cache_uploaded_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("AWS_FILESYSTEM_ROOT", str(tmp_path / "s3"))
+    monkeypatch.setenv("S3_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(aws_helpers, "_OBJECT_CACHE", None)
+    aws_args = ("s3", AWS_BUCKET, "access", "secret")
+
+    local_file = tmp_path / "a.csv"
+    local_file.write_bytes(b"1,covid\n")
+    aws_helpers.save_to_AWS(str(local_file), "a.csv", *aws_args)
+    cached_path = cache_uploaded_file(str(local_file), "a.csv", *aws_args)
+
+    assert fetch_from_AWS("a.csv", *aws_args) == cached_path
+    assert cached_path.startswith(str(tmp_path / "cache"))
+
+    with pytest.raises(ValueError):
+        fetch_from_AWS("missing.csv", *aws_args)
+
+
+def test_cached_objects_keep_their_extension(s3, tmp_path):
+    cache = S3ObjectCache(str(tmp_path / "cache"))
+    put_object(s3, "chunks/tweets_00000.jsonl.gz", b"not really gzip")
+
+    assert cache.fetch(s3, AWS_BUCKET, "chunks/tweets_00000.jsonl.gz").endswith(".jsonl.gz")
+    assert object_suffix("tweet_scrapes/v1.2/manifest") == ""
+    assert object_suffix("preprocessed_tweets.csv.zst") == ".csv.zst"
@@ -0,0 +1,68 @@
+"""
+
+    test_tweet_id_file.py
+
+    Tests of 'tweet_id_file.py': tweet IDs make the round trip through the binary format
+    unchanged (compressed or not), and files in the old text format can still be read.
+
+"""
+import numpy as np
+import pytest
+from tweet_id_file import write_tweet_IDs, is_tweet_ID_file, TweetIDFile, HEADER_SIZE
+
+TWEET_IDS = np.array([1357034445237170176, 1242000000000000001, 1, 1357034445237170176],
+                     dtype=np.int64)
+
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_round_trip(tmp_path, compression):
+    path = str(tmp_path / "tweet_IDs.bin")
+    write_tweet_IDs(path, TWEET_IDS, compression=compression)
+
+    tweet_ID_file = TweetIDFile(path)
+
+    assert is_tweet_ID_file(path)
+    assert tweet_ID_file.compression == compression
+    assert tweet_ID_file.ids.tolist() == TWEET_IDS.tolist()
+    assert len(tweet_ID_file) == 4
+    assert tweet_ID_file[1] == 1242000000000000001
+    assert tweet_ID_file[1:3].tolist() == [1242000000000000001, 1]
+
+
+def test_uncompressed_file_is_memory_mapped(tmp_path):
+    path = str(tmp_path / "tweet_IDs.bin")
+    write_tweet_IDs(path, TWEET_IDS)
+
+    assert isinstance(TweetIDFile(path).ids, np.memmap)
+    assert (tmp_path / "tweet_IDs.bin").stat().st_size == HEADER_SIZE + 8 * len(TWEET_IDS)
+
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_empty_file(tmp_path, compression):
+    path = str(tmp_path / "tweet_IDs.bin")
+    write_tweet_IDs(path, [], compression=compression)
+
+    assert len(TweetIDFile(path)) == 0
+
+
+def test_text_file_can_still_be_read(tmp_path):
+    path = tmp_path / "tweet_IDs.txt"
+    path.write_text("".join(f"{tweet_ID}, \n" for tweet_ID in TWEET_IDS))
+
+    tweet_ID_file = TweetIDFile(str(path))
+
+    assert not is_tweet_ID_file(str(path))
+    assert tweet_ID_file.compression == "text"
+    assert tweet_ID_file.ids.tolist() == TWEET_IDS.tolist()
+
+
+def test_empty_text_file(tmp_path):
+    path = tmp_path / "tweet_IDs.txt"
+    path.write_text("")
+
+    assert len(TweetIDFile(str(path))) == 0
+
+
+def test_unknown_compression_is_an_error(tmp_path):
+    with pytest.raises(ValueError):
+        write_tweet_IDs(str(tmp_path / "tweet_IDs.bin"), TWEET_IDS, compression="gzip")
@@ -0,0 +1,58 @@
+"""
+
+    test_tweet_id_store.py
+
+    Tests of 'tweet_id_store.py': the IDs merged into a store are kept (sorted and distinct)
+    across runs, and only the IDs that aren't in the store yet are new.
+
+"""
+import numpy as np
+from tweet_id_store import TweetIDStore, isin_sorted
+
+
+def test_new_store_is_empty(tmp_path):
+    store = TweetIDStore(str(tmp_path / "tweet_IDs.npy"))
+
+    assert len(store) == 0
+    assert store.contains([1, 2]).tolist() == [False, False]
+    assert store.difference([2, 1, 2]).tolist() == [2, 1]
+
+
+def test_merged_IDs_survive_a_restart(tmp_path):
+    path = str(tmp_path / "tweet_IDs.npy")
+    store = TweetIDStore(path)
+
+    assert store.merge([30, 10, 20, 10]) == 3
+    assert store.merge(np.array([20, 40, 5], dtype=np.int64)) == 2
+
+    # e.g. the next daily run
+    store = TweetIDStore(path)
+
+    assert store.ids.tolist() == [5, 10, 20, 30, 40]
+    assert isinstance(store.ids, np.memmap)
+    assert [path.name for path in tmp_path.iterdir()] == ["tweet_IDs.npy"]
+
+
+def test_difference_keeps_the_order_of_the_new_IDs(tmp_path):
+    store = TweetIDStore(str(tmp_path / "tweet_IDs.npy"))
+    store.merge([10, 20, 30])
+
+    assert store.difference(["40", "10", "35", "40", "20", "1"]).tolist() == [40, 35, 1]
+    assert store.contains([10, 15, 30, 31]).tolist() == [True, False, True, False]
+
+
+def test_store_handles_large_tweet_IDs(tmp_path):
+    tweet_IDs = [1357034445237170176, 1242000000000000001, 1357034445237170177]
+    store = TweetIDStore(str(tmp_path / "tweet_IDs.npy"))
+    store.merge(tweet_IDs[:2])
+
+    assert store.difference(tweet_IDs).tolist() == [1357034445237170177]
+
+
+def test_isin_sorted_matches_np_isin():
+    rng = np.random.default_rng(0)
+    sorted_IDs = np.unique(rng.integers(0, 1000, size=300))
+    values = rng.integers(-10, 1010, size=500)
+
+    assert (isin_sorted(values, sorted_IDs) == np.isin(values, sorted_IDs)).all()
+    assert isin_sorted(values, np.array([], dtype=np.int64)).sum() == 0
@@ -0,0 +1,85 @@
+"""
+
+    test_tweet_projection.py
+
+    Tests of 'tweet_projection.py': projected tweets keep the fields that preprocessing uses, and
+    preprocessing them gives the same location, date and text columns as the full tweets.
+
+"""
+import json
+import pandas as pd
+from tweet_projection import PROJECTED_TWEET_COLUMNS, PROJECTED_TWEET_DTYPES, get_field, \
+    project_tweet, is_projected
+from preprocess_tweets import TWEET_COLUMNS, LOCATION_COLUMNS, DATE_COLUMNS, preprocess_tweets_df, \
+    read_hydrated_tweets
+from tweet_text import TEXT_COLUMNS
+
+PLACES = [None,
+          {"id": "3b77caf94bfc81fe", "country_code": "US", "full_name": "Los Angeles, CA"},
+          {"id": "96683cc9126741d1", "country_code": "US", "full_name": "United States"},
+          {"id": "3797791ff9c0e4c6", "country_code": "CA", "full_name": "Toronto, Ontario"}]
+
+
+def make_tweet(tweet_ID, place, coordinates=None):
+    # hydrated tweet, as returned by the Twitter API (with fewer fields)
+    return {"id": tweet_ID,
+            "created_at": "Tue Feb 09 20:19:24 +0000 2021",
+            "full_text": f"Tweet number {tweet_ID} #COVID19 #StayHome https://t.co/abc123",
+            "retweet_count": tweet_ID % 3,
+            "favorite_count": tweet_ID % 5,
+            "lang": "en",
+            "user": {"id": 1000 + tweet_ID, "screen_name": f"user_{tweet_ID}", "location": "CA",
+                     "description": "a long profile that projection drops"},
+            "geo": None,
+            "coordinates": coordinates,
+            "place": place,
+            "entities": {"hashtags": [{"text": "COVID19"}, {"text": "StayHome"}]}}
+
+
+TWEETS = [make_tweet(1357034445237170176 + i, PLACES[i % len(PLACES)],
+                     {"type": "Point", "coordinates": [-118.24, 34.05]} if i == 1 else None)
+          for i in range(8)]
+
+
+def test_get_field():
+    tweet = TWEETS[1]
+
+    assert get_field(tweet, ("place", "country_code")) == "US"
+    assert get_field(tweet, ("coordinates", "coordinates", 1)) == 34.05
+    assert get_field(TWEETS[0], ("place", "country_code")) is None
+    assert get_field(TWEETS[0], ("coordinates", "coordinates", 0)) is None
+    assert get_field(tweet, ("user", "missing")) is None
+
+
+def test_project_tweet():
+    projected_tweet = project_tweet(TWEETS[1])
+
+    assert list(projected_tweet) == PROJECTED_TWEET_COLUMNS
+    assert projected_tweet["user_screen_name"] == "user_1357034445237170177"
+    assert projected_tweet["place_full_name"] == "Los Angeles, CA"
+    assert projected_tweet["longitude"] == -118.24
+    assert is_projected(projected_tweet)
+    assert not is_projected(TWEETS[1])
+
+
+def test_preprocessed_projected_tweets_match_full_tweets():
+    full_df = pd.DataFrame(TWEETS)[TWEET_COLUMNS]
+    projected_df = pd.DataFrame([project_tweet(tweet) for tweet in TWEETS]).astype(
+        PROJECTED_TWEET_DTYPES)
+
+    derived_columns = LOCATION_COLUMNS + DATE_COLUMNS + TEXT_COLUMNS
+
+    pd.testing.assert_frame_equal(preprocess_tweets_df(projected_df)[derived_columns],
+                                  preprocess_tweets_df(full_df)[derived_columns])
+
+
+def test_projected_tweets_are_read_with_their_dtypes(tmp_path):
+    path = tmp_path / "hydrated_tweets.jsonl"
+    path.write_text("".join(json.dumps(project_tweet(tweet)) + "\n" for tweet in TWEETS))
+
+    tweets_df = read_hydrated_tweets(str(path))
+
+    assert list(tweets_df.columns) == PROJECTED_TWEET_COLUMNS
+    assert tweets_df.dtypes.astype(str).to_dict() == {column: str(pd.Series(dtype=dtype).dtype)
+                                                      for column, dtype in PROJECTED_TWEET_DTYPES.items()}
+    assert tweets_df["id"].tolist() == [tweet["id"] for tweet in TWEETS]
@@ -0,0 +1,92 @@
+"""
+
+    test_tweet_text.py
+
+    Tests of 'tweet_text.py': the normalizer and the analyzer give the same output as the
+    per-tweet functions they replace (see 'benchmarks/reference_preprocessing.py').
+
+"""
+import random
+import pandas as pd
+import pytest
+from benchmarks.reference_preprocessing import clean_text, parse_hashtags, count_hashtags
+from tweet_text import TweetTextNormalizer, TweetTextAnalyzer, TEXT_COLUMNS
+
+SAMPLE_TWEETS = [
+    "Stay home, stay safe!! #COVID19 #StayHome https://t.co/abc123",
+    "The vaccine rollout in CA is finally picking up speed 💉🎉 #vaccine",
+    "Day 300 of #lockdown#quarantine... I've watched everything on Netflix 😂",
+    "@CDCgov new guidance: wear a mask indoors & keep 6ft apart.\nRead more: http://cdc.gov",
+    "Cases in NY are up 12% this week (source: @nytimes) #coronavirus\t#NYC",
+    "¿Dónde puedo vacunarme? #COVID19 #vacuna",
+    "yes#baseball is back ## #",
+    "",
+    "   double  spaces   and a trailing space ",
+]
+
+# pieces that random tweets are made of
+WORDS = ["covid", "vaccine", "The", "a", "is", "MASK", "stay", "home", "NY", "cases",
+         "#COVID19", "#stay#home", "yes#baseball", "#", "http://t.co/x1", "https://cdc.gov",
+         "don't", "(source:", "@nytimes", "12%", "6ft.", "café", "naïve", "😷", "💉🎉", "vacuna!",
+         "¿qué?", "\n", "\t", "", "a-b", "[1]", "x_y", "~!", "\"quoted\"", "it's"]
+
+
+def random_tweets(num_tweets, seed=0):
+    rng = random.Random(seed)
+
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 20)))
+            for _ in range(num_tweets)]
+
+
+@pytest.mark.parametrize("text", SAMPLE_TWEETS)
+def test_normalizer_matches_clean_text(text):
+    assert TweetTextNormalizer().tokenize(text) == clean_text(text)
+
+
+def test_normalizer_matches_clean_text_on_random_tweets():
+    normalizer = TweetTextNormalizer()
+
+    for text in random_tweets(500):
+        assert normalizer(text) == clean_text(text), text
+
+
+def test_normalizer_drops_the_given_stopwords():
+    normalizer = TweetTextNormalizer(stopwords_list=["stay", "safe"])
+
+    assert normalizer.tokenize("Stay home, stay safe!") == ["home"]
+
+
+@pytest.mark.parametrize("text", SAMPLE_TWEETS)
+def test_analyzer_matches_the_reference_functions(text):
+    expected = (clean_text(text), *parse_hashtags(text), count_hashtags(text))
+
+    assert TweetTextAnalyzer().analyze(text) == expected
+
+
+def test_analyzer_matches_the_reference_functions_on_random_tweets():
+    analyzer = TweetTextAnalyzer()
+
+    for text in random_tweets(500, seed=1):
+        assert analyzer.analyze(text) == (clean_text(text), *parse_hashtags(text),
+                                          count_hashtags(text)), text
+
+
+def test_analyze_series():
+    texts = pd.Series(SAMPLE_TWEETS, index=range(10, 10 + len(SAMPLE_TWEETS)))
+    analyzer = TweetTextAnalyzer()
+
+    text_df = analyzer.analyze_series(texts)
+
+    assert list(text_df.columns) == TEXT_COLUMNS
+    assert text_df.index.equals(texts.index)
+    assert text_df["hashtag_count"].dtype == "int64"
+
+    for idx, text in texts.items():
+        assert tuple(text_df.loc[idx]) == analyzer.analyze(text)
+
+
+def test_analyze_empty_series():
+    text_df = TweetTextAnalyzer().analyze_series(pd.Series([], dtype=object))
+
+    assert list(text_df.columns) == TEXT_COLUMNS
+    assert len(text_df) == 0
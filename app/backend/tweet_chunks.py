@@ -0,0 +1,280 @@
+"""
+
+    tweet_chunks.py
+
+    Streaming output of hydrated tweets: tweets are written one at a time to gzip-compressed
+    JSONL files ("chunks") of at most N tweets each, and each finished chunk can be handed
+    to a background uploader while the next one is being written. Only the tweet being
+    written is held in memory, whatever the number of tweets.
+
+"""
+import os
+import gzip
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# default number of tweets per chunk
+DEFAULT_CHUNK_SIZE = 50000
+
+# extension of the chunk files
+CHUNK_EXTENSION = ".jsonl.gz"
+
+
+class JSONLChunkWriter:
+    """
+    Writes records (e.g. tweets, as dicts) to rotating, gzip-compressed JSONL chunk files named
+    "<prefix>_<chunk number>.jsonl.gz". A chunk is written to a temporary file and only renamed
+    to its final name once it is complete, so a chunk file with its final name is always complete.
+
+    Args:
+        directory: directory (str) to write the chunks to
+        prefix: prefix (str) of the chunk filenames
+        chunk_size: max number of records (int) per chunk
+        on_chunk_done: function called with (path, num_records) of each chunk once it is complete (optional)
+        auto_rotate: start a new chunk as soon as the current one is full (bool); if False,
+        the caller decides when to start a new chunk (with 'is_full' and 'rotate')
+        first_chunk: number (int) of the first chunk, e.g. to resume a previous run
+        compresslevel: gzip compression level (int)
+    """
+
+    def __init__(self, directory, prefix, chunk_size=DEFAULT_CHUNK_SIZE, on_chunk_done=None,
+                 auto_rotate=True, first_chunk=0, compresslevel=6):
+        self.directory = directory
+        self.prefix = prefix
+        self.chunk_size = chunk_size
+        self.on_chunk_done = on_chunk_done
+        self.auto_rotate = auto_rotate
+        self.compresslevel = compresslevel
+
+        self.chunk_number = first_chunk
+        self.file = None
+        self.chunk_records = 0
+        self.num_records = 0
+        self.chunks = []
+
+        os.makedirs(directory, exist_ok=True)
+
+    def chunk_path(self, chunk_number):
+        """
+        Arg:
+            chunk_number: number of a chunk (int)
+        Returns:
+            path: path (str) of the (complete) chunk file
+        """
+        return os.path.join(self.directory, f"{self.prefix}_{chunk_number:05d}{CHUNK_EXTENSION}")
+
+    def _open(self):
+        self.file = gzip.open(self.chunk_path(self.chunk_number) + ".tmp", "wt",
+                              encoding="utf-8", compresslevel=self.compresslevel)
+
+    def write(self, record):
+        """
+        Arg:
+            record: JSON-serializable record (e.g. a tweet, as a dict)
+        """
+        if self.file is None:
+            self._open()
+
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.chunk_records += 1
+        self.num_records += 1
+
+        if self.auto_rotate and self.is_full():
+            self.rotate()
+
+    def is_full(self):
+        """
+        Returns:
+            is_full: does the current chunk have 'chunk_size' records? (bool)
+        """
+        return self.chunk_records >= self.chunk_size
+
+    def rotate(self):
+        """
+        Completes the current chunk (if it has any records); the next record starts a new chunk
+
+        Returns:
+            path: path (str) of the completed chunk, None if there was no chunk to complete
+        """
+        if self.file is None:
+            return None
+
+        self.file.close()
+        self.file = None
+
+        path = self.chunk_path(self.chunk_number)
+        os.replace(path + ".tmp", path)
+
+        num_records = self.chunk_records
+        self.chunks.append({"path": path, "num_records": num_records})
+        self.chunk_number += 1
+        self.chunk_records = 0
+
+        if self.on_chunk_done is not None:
+            self.on_chunk_done(path, num_records)
+
+        return path
+
+    def close(self):
+        """
+        Completes the last chunk
+        """
+        self.rotate()
+
+    def discard(self):
+        """
+        Deletes the current, incomplete chunk (e.g. after an error)
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            os.remove(self.chunk_path(self.chunk_number) + ".tmp")
+            self.num_records -= self.chunk_records
+            self.chunk_records = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class BackgroundUploader:
+    """
+    Uploads files on background threads, so that uploads overlap with the work
+    that produces the files
+
+    Args:
+        upload_file: function that uploads one local file, called with its path (str)
+        max_workers: max number of uploads (int) at the same time
+        remove_after_upload: delete each local file once it has been uploaded (bool)
+    """
+
+    def __init__(self, upload_file, max_workers=2, remove_after_upload=True):
+        self.upload_file = upload_file
+        self.remove_after_upload = remove_after_upload
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.upload_seconds = 0.0
+        self.uploaded_bytes = 0
+
+    def _upload(self, path):
+        size = os.path.getsize(path)
+        start = time.perf_counter()
+
+        self.upload_file(path)
+
+        with self.lock:
+            self.upload_seconds += time.perf_counter() - start
+            self.uploaded_bytes += size
+
+        if self.remove_after_upload:
+            os.remove(path)
+
+    def submit(self, path, *args):
+        """
+        Starts uploading a file in the background. Extra args are ignored, so that 'submit'
+        can be used as the 'on_chunk_done' callback of a JSONLChunkWriter.
+
+        Arg:
+            path: path (str) of the local file
+        """
+        self.futures[path] = self.executor.submit(self._upload, path)
+
+    def wait(self):
+        """
+        Waits for all the uploads to finish
+
+        Returns:
+            uploaded: paths (list of str) of the files that were uploaded
+            failures: dict of path (str) -> exception, for the files that couldn't be uploaded
+        """
+        self.executor.shutdown(wait=True)
+
+        uploaded = []
+        failures = {}
+
+        for path, future in self.futures.items():
+            try:
+                future.result()
+                uploaded.append(path)
+            except Exception as e:
+                failures[path] = e
+
+        return (uploaded, failures)
+
+
+class ChunkCheckpoint:
+    """
+    Checkpoint of a long run that reads a list of inputs (e.g. tweet IDs) in order and writes
+    chunks: the offset of the next input to process, and the chunks completed so far.
+    A checkpoint is only resumed by a run with the same 'run_key' (e.g. the same list of inputs).
+
+    Args:
+        path: path (str) of the JSON checkpoint file (it doesn't have to exist yet)
+        run_key: JSON-serializable description (dict) of the run's inputs
+    """
+
+    def __init__(self, path, run_key):
+        self.path = path
+        self.run_key = run_key
+        self.next_offset = 0
+        self.chunks = []
+        self.info = {}
+        self.resumed = False
+
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                state = json.load(f)
+
+            if state["run_key"] == run_key:
+                self.next_offset = state["next_offset"]
+                self.chunks = state["chunks"]
+                self.info = state["info"]
+                self.resumed = True
+
+    def num_records(self):
+        """
+        Returns:
+            num_records: number of records (int) in the completed chunks
+        """
+        return sum(chunk["num_records"] for chunk in self.chunks)
+
+    def add_chunk(self, chunk, next_offset):
+        """
+        Records a completed chunk and the offset of the next input, and saves the checkpoint
+
+        Args:
+            chunk: the completed chunk (dict with "path" and "num_records")
+            next_offset: offset (int) of the first input that isn't in the completed chunks
+        """
+        self.chunks.append(chunk)
+        self.next_offset = next_offset
+        self.save()
+
+    def save(self):
+        """
+        Writes the checkpoint (atomically, through a temporary file)
+        """
+        tmp_path = self.path + ".tmp"
+
+        with open(tmp_path, "w") as f:
+            json.dump({"run_key": self.run_key,
+                       "next_offset": self.next_offset,
+                       "chunks": self.chunks,
+                       "info": self.info}, f, indent=2)
+
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        """
+        Deletes the checkpoint (once the run is complete)
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,120 @@
+"""
+
+    tweet_id_file.py
+
+    Compact binary file format for lists of tweet IDs: a 32-byte header followed by the IDs
+    as little-endian int64 (optionally zlib-compressed). Uncompressed files are memory-mapped
+    when read, so batches of IDs can be handed out without loading the whole file.
+    Files in the old text format ("{id}, \\n" per line) can still be read.
+
+"""
+import zlib
+import struct
+import numpy as np
+import pandas as pd
+
+# header: magic, format version, compression, number of IDs, padding to HEADER_SIZE bytes
+MAGIC = b"TWEETIDS"
+FORMAT_VERSION = 1
+HEADER_FORMAT = "<8sHHQ12x"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# compression codes stored in the header
+COMPRESSIONS = {None: 0, "zlib": 1}
+
+# dtype of the IDs in the file
+ID_DTYPE = np.dtype("<i8")
+
+
+def write_tweet_IDs(path, tweet_IDs, compression=None):
+    """
+    Writes tweet IDs to a binary tweet ID file
+
+    Args:
+        path: path (str) of the file to write
+        tweet_IDs: tweet IDs (array-like of int), written in the given order
+        compression: None or "zlib" (str); compressed files are smaller but can't be memory-mapped
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(
+            f"Unknown compression '{compression}', must be one of {list(COMPRESSIONS)}")
+
+    tweet_IDs = np.asarray(tweet_IDs, dtype=np.int64).astype(ID_DTYPE, copy=False)
+    data = tweet_IDs.tobytes()
+
+    if compression == "zlib":
+        data = zlib.compress(data)
+
+    with open(path, "wb") as f:
+        f.write(struct.pack(HEADER_FORMAT, MAGIC, FORMAT_VERSION,
+                            COMPRESSIONS[compression], len(tweet_IDs)))
+        f.write(data)
+
+
+def is_tweet_ID_file(path):
+    """
+    Arg:
+        path: path (str) of a file
+    Returns:
+        is_binary: is the file in the binary tweet ID format? (bool)
+    """
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _read_text_tweet_IDs(path):
+    """
+    Reads a file in the old text format (one "{id}, " per line)
+    """
+    try:
+        df = pd.read_csv(path, header=None, usecols=[0], dtype={0: np.int64})
+    except pd.errors.EmptyDataError:
+        return np.array([], dtype=np.int64)
+
+    return df[0].to_numpy()
+
+
+class TweetIDFile:
+    """
+    Reader of a tweet ID file, in the binary format (memory-mapped if uncompressed)
+    or in the old text format
+
+    Arg:
+        path: path (str) of the file
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        if not is_tweet_ID_file(path):
+            self.compression = "text"
+            self.ids = _read_text_tweet_IDs(path)
+            return
+
+        with open(path, "rb") as f:
+            magic, version, compression, num_IDs = struct.unpack(HEADER_FORMAT,
+                                                                 f.read(HEADER_SIZE))
+
+            if version > FORMAT_VERSION:
+                raise ValueError(
+                    f"{path} has format version {version}, only versions <= {FORMAT_VERSION} can be read")
+
+            codes = {code: name for name, code in COMPRESSIONS.items()}
+            self.compression = codes[compression]
+
+            if self.compression == "zlib":
+                self.ids = np.frombuffer(zlib.decompress(f.read()), dtype=ID_DTYPE)
+
+        if self.compression is None:
+            self.ids = np.memmap(path, dtype=ID_DTYPE, mode="r",
+                                 offset=HEADER_SIZE, shape=(num_IDs,)) if num_IDs > 0 \
+                else np.array([], dtype=ID_DTYPE)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, idx):
+        """
+        Returns the IDs at 'idx' (an int, or a slice, which is a zero-copy view)
+        """
+        return self.ids[idx]
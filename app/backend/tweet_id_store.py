@@ -0,0 +1,119 @@
+"""
+
+    tweet_id_store.py
+
+    Persistent set of tweet IDs, stored on disk as a sorted array of distinct int64 IDs (.npy file)
+    and memory-mapped when opened, so that large stores are only paged in as needed.
+    Used to keep track of the IDs that have been scraped, hydrated or preprocessed, so that
+    each run only pays for the new IDs.
+
+"""
+import os
+import numpy as np
+
+
+def to_tweet_ID_array(tweet_IDs):
+    """
+    Arg:
+        tweet_IDs: tweet IDs (list, numpy array or pandas Series of int or str)
+    Returns:
+        tweet_IDs: the tweet IDs as a numpy int64 array
+    """
+    return np.asarray(tweet_IDs, dtype=np.int64).ravel()
+
+
+def isin_sorted(values, sorted_IDs):
+    """
+    Vectorized membership test against a sorted array, in O(len(values) * log(len(sorted_IDs)))
+    (unlike np.isin, the (possibly memory-mapped) sorted array is never copied or re-sorted)
+
+    Args:
+        values: tweet IDs to look up (numpy int64 array)
+        sorted_IDs: sorted array of distinct tweet IDs (numpy int64 array)
+    Returns:
+        is_in: for each value, whether it is in 'sorted_IDs' (numpy bool array)
+    """
+    values = to_tweet_ID_array(values)
+
+    if len(sorted_IDs) == 0:
+        return np.zeros(len(values), dtype=bool)
+
+    positions = np.searchsorted(sorted_IDs, values)
+    positions[positions == len(sorted_IDs)] = 0
+
+    return sorted_IDs[positions] == values
+
+
+class TweetIDStore:
+    """
+    Set of tweet IDs, persisted as a sorted .npy file of distinct int64 IDs
+
+    Arg:
+        path: path (str) of the .npy file (it doesn't have to exist yet)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.ids = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return np.array([], dtype=np.int64)
+
+        return np.load(self.path, mmap_mode="r")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def contains(self, tweet_IDs):
+        """
+        Arg:
+            tweet_IDs: tweet IDs to look up (array-like of int)
+        Returns:
+            is_in: for each tweet ID, whether it is in the store (numpy bool array)
+        """
+        return isin_sorted(tweet_IDs, self.ids)
+
+    def difference(self, tweet_IDs):
+        """
+        Arg:
+            tweet_IDs: tweet IDs (array-like of int)
+        Returns:
+            new_IDs: the distinct tweet IDs that aren't in the store, in the order they first
+            appear in 'tweet_IDs' (numpy int64 array)
+        """
+        tweet_IDs = to_tweet_ID_array(tweet_IDs)
+        new_IDs = tweet_IDs[~self.contains(tweet_IDs)]
+
+        # keep the first occurrence of each ID
+        _, first_idx = np.unique(new_IDs, return_index=True)
+
+        return new_IDs[np.sort(first_idx)]
+
+    def merge(self, tweet_IDs):
+        """
+        Adds tweet IDs to the store, and writes the store to disk. The store is written to
+        a temporary file first, so an interrupted merge never leaves a half-written file behind.
+
+        Arg:
+            tweet_IDs: tweet IDs to add (array-like of int)
+        Returns:
+            num_added: number of IDs that weren't in the store yet (int)
+        """
+        new_IDs = np.unique(to_tweet_ID_array(tweet_IDs))
+        new_IDs = new_IDs[~self.contains(new_IDs)]
+
+        # both arrays are sorted, so the new IDs can be inserted in place, in linear time
+        merged_IDs = np.insert(np.asarray(self.ids),
+                               np.searchsorted(self.ids, new_IDs),
+                               new_IDs)
+
+        tmp_path = self.path + ".tmp.npy"
+        np.save(tmp_path, merged_IDs)
+
+        # drop the memory map of the old file before replacing it
+        self.ids = merged_IDs
+        os.replace(tmp_path, self.path)
+        self.ids = self._load()
+
+        return len(new_IDs)
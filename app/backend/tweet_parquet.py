@@ -0,0 +1,221 @@
+"""
+
+    tweet_parquet.py
+
+    Typed, columnar (Parquet) format for preprocessed tweets. Unlike the .csv output,
+    the tokenized text and hashtags are stored as lists of strings (no re-parsing needed),
+    country and state are dictionary-encoded and the date is a date (year, day and hour are
+    small integers), so files are smaller and readers can load only the columns they need.
+
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from tweet_projection import is_projected
+
+# cols derived by preprocessing, added to the cols of the hydrated tweets
+DERIVED_FIELDS = [
+    ("is_USA", pa.bool_()),
+    ("country", pa.dictionary(pa.int16(), pa.string())),
+    ("state", pa.dictionary(pa.int16(), pa.string())),
+    ("date", pa.date32()),
+    ("year", pa.int16()),
+    ("month", pa.string()),
+    ("day", pa.int8()),
+    ("hour", pa.int8()),
+    ("tokenized_text", pa.list_(pa.string())),
+    ("hashtags_list", pa.list_(pa.string())),
+    ("non_hashtags_list", pa.list_(pa.string())),
+    ("hashtag_count", pa.int32()),
+]
+
+# schema of the preprocessed tweets
+PREPROCESSED_TWEETS_SCHEMA = pa.schema([
+    ("user", pa.string()),
+    ("created_at", pa.string()),
+    ("id", pa.int64()),
+    ("full_text", pa.string()),
+    ("geo", pa.string()),
+    ("coordinates", pa.string()),
+    ("place", pa.string()),
+    ("retweet_count", pa.int64()),
+    ("favorite_count", pa.int64()),
+] + DERIVED_FIELDS)
+
+# schema of the preprocessed tweets, for projected tweets (see 'tweet_projection.py')
+PROJECTED_PREPROCESSED_TWEETS_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("created_at", pa.string()),
+    ("full_text", pa.string()),
+    ("retweet_count", pa.int64()),
+    ("favorite_count", pa.int64()),
+    ("lang", pa.string()),
+    ("user_id", pa.int64()),
+    ("user_screen_name", pa.string()),
+    ("user_location", pa.string()),
+    ("place_id", pa.string()),
+    ("place_country_code", pa.string()),
+    ("place_full_name", pa.string()),
+    ("longitude", pa.float64()),
+    ("latitude", pa.float64()),
+] + DERIVED_FIELDS)
+
+# pandas dtypes of the nullable integer cols, when read back
+PANDAS_INTEGER_DTYPES = {
+    pa.int8(): pd.Int8Dtype(),
+    pa.int16(): pd.Int16Dtype(),
+}
+
+# placeholder used in the .csv output for missing location info (stored as null here)
+MISSING_LOCATION = "N/A"
+
+
+def _to_string_array(series):
+    """
+    Converts a column of raw tweet fields (str, dict, NaN, ...) into strings,
+    keeping missing values as nulls
+
+    Arg:
+        series: pandas Series
+    Returns:
+        array: pyarrow string array
+    """
+    values = [None if value is None or (isinstance(value, float) and np.isnan(value))
+              else value if isinstance(value, str) else str(value)
+              for value in series]
+
+    return pa.array(values, type=pa.string())
+
+
+def preprocessed_tweets_schema(preprocessed_df):
+    """
+    Arg:
+        preprocessed_df: pandas df of preprocessed tweets
+    Returns:
+        schema: PROJECTED_PREPROCESSED_TWEETS_SCHEMA if the tweets are projected,
+        PREPROCESSED_TWEETS_SCHEMA otherwise (pyarrow Schema)
+    """
+    if is_projected(preprocessed_df.columns):
+        return PROJECTED_PREPROCESSED_TWEETS_SCHEMA
+
+    return PREPROCESSED_TWEETS_SCHEMA
+
+
+def preprocessed_tweets_to_table(preprocessed_df):
+    """
+    Converts a df of preprocessed tweets (output of 'preprocess_tweets_df') into
+    a pyarrow table with PREPROCESSED_TWEETS_SCHEMA (or PROJECTED_PREPROCESSED_TWEETS_SCHEMA,
+    for projected tweets)
+
+    Arg:
+        preprocessed_df: pandas df of preprocessed tweets
+    Returns:
+        table: pyarrow Table
+    """
+    schema = preprocessed_tweets_schema(preprocessed_df)
+    arrays = []
+
+    for field in schema:
+        series = preprocessed_df[field.name]
+
+        if pa.types.is_string(field.type):
+            array = _to_string_array(series)
+        elif field.name == "is_USA":
+            array = pa.array(series.where(series != MISSING_LOCATION, None),
+                             type=field.type, from_pandas=True)
+        elif pa.types.is_dictionary(field.type):
+            encoded = pa.array(series.where(series != MISSING_LOCATION, None),
+                               type=pa.string(), from_pandas=True).dictionary_encode()
+            array = pa.DictionaryArray.from_arrays(encoded.indices.cast(field.type.index_type),
+                                                   encoded.dictionary)
+        elif pa.types.is_date(field.type):
+            dates = pd.to_datetime(series, format="%Y-%m-%d")
+            array = pa.array(dates.values.astype("datetime64[D]"),
+                             type=field.type, from_pandas=True)
+        elif pa.types.is_list(field.type):
+            array = pa.array(list(series), type=field.type)
+        else:
+            array = pa.array(series, type=field.type, from_pandas=True)
+
+        arrays.append(array)
+
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class PreprocessedTweetsParquetWriter:
+    """
+    Writes dfs of preprocessed tweets to a Parquet file, one row group per df
+    (so that chunks can be appended as they are preprocessed). The schema of the file
+    is that of the first df (full or projected tweets).
+
+    Args:
+        path: path (str) of the Parquet file to write
+        compression: Parquet compression codec (str)
+    """
+
+    def __init__(self, path, compression="snappy"):
+        self.path = path
+        self.compression = compression
+        self.writer = None
+
+    def _open(self, schema):
+        self.writer = pq.ParquetWriter(self.path, schema,
+                                       compression=self.compression)
+
+    def write(self, preprocessed_df):
+        """
+        Appends a df of preprocessed tweets to the file
+
+        Arg:
+            preprocessed_df: pandas df of preprocessed tweets
+        """
+        table = preprocessed_tweets_to_table(preprocessed_df)
+
+        if self.writer is None:
+            self._open(table.schema)
+
+        self.writer.write_table(table)
+
+    def close(self):
+        # a file without any tweets still gets written, with the schema of full tweets
+        if self.writer is None:
+            self._open(PREPROCESSED_TWEETS_SCHEMA)
+
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def write_preprocessed_tweets(preprocessed_df, path):
+    """
+    Writes a df of preprocessed tweets to a Parquet file
+
+    Args:
+        preprocessed_df: pandas df of preprocessed tweets
+        path: path (str) of the Parquet file to write
+    """
+    with PreprocessedTweetsParquetWriter(path) as writer:
+        writer.write(preprocessed_df)
+
+
+def read_preprocessed_tweets(path, columns=None):
+    """
+    Reads preprocessed tweets from a Parquet file. Only the requested columns are read
+    from disk.
+
+    Args:
+        path: path (str) of the Parquet file (or a file-like object)
+        columns: names of the cols to read (list of str); reads all cols if None
+    Returns:
+        preprocessed_df: pandas df of preprocessed tweets; country and state are categoricals,
+        the date parts are nullable integers, the list cols hold arrays of strings and missing
+        location info is null
+    """
+    table = pq.read_table(path, columns=columns)
+
+    return table.to_pandas(types_mapper=PANDAS_INTEGER_DTYPES.get)
@@ -0,0 +1,91 @@
+"""
+
+    tweet_projection.py
+
+    Projection of hydrated tweets onto the few fields that preprocessing uses. A hydrated tweet
+    is a large nested JSON object (several KB, mostly the user profile and entities); its projection
+    is a flat record of typed fields (e.g. "place_country_code" rather than a nested "place" dict),
+    so the files of projected tweets are much smaller and need no parsing of nested fields.
+
+"""
+
+# fields of a projected tweet: name -> path of the field in the hydrated tweet
+PROJECTED_TWEET_FIELDS = {
+    "id": ("id",),
+    "created_at": ("created_at",),
+    "full_text": ("full_text",),
+    "retweet_count": ("retweet_count",),
+    "favorite_count": ("favorite_count",),
+    "lang": ("lang",),
+    "user_id": ("user", "id"),
+    "user_screen_name": ("user", "screen_name"),
+    "user_location": ("user", "location"),
+    "place_id": ("place", "id"),
+    "place_country_code": ("place", "country_code"),
+    "place_full_name": ("place", "full_name"),
+    "longitude": ("coordinates", "coordinates", 0),
+    "latitude": ("coordinates", "coordinates", 1),
+}
+
+# columns of projected tweets, in order
+PROJECTED_TWEET_COLUMNS = list(PROJECTED_TWEET_FIELDS)
+
+# pandas dtypes of the columns of projected tweets (nullable integers for the fields that can be missing)
+PROJECTED_TWEET_DTYPES = {
+    "id": "int64",
+    "created_at": object,
+    "full_text": object,
+    "retweet_count": "Int64",
+    "favorite_count": "Int64",
+    "lang": object,
+    "user_id": "Int64",
+    "user_screen_name": object,
+    "user_location": object,
+    "place_id": object,
+    "place_country_code": object,
+    "place_full_name": object,
+    "longitude": "float64",
+    "latitude": "float64",
+}
+
+
+def get_field(tweet, path):
+    """
+    Arg:
+        tweet: hydrated tweet (dict)
+        path: keys / indices (tuple) of a nested field, e.g. ("place", "country_code")
+    Returns:
+        value: value of the field, None if it (or any of its parents) is missing
+    """
+    value = tweet
+
+    for key in path:
+        if value is None:
+            return None
+
+        try:
+            value = value[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+
+    return value
+
+
+def project_tweet(tweet):
+    """
+    Arg:
+        tweet: hydrated tweet (dict), as returned by the Twitter API
+    Returns:
+        projected_tweet: flat dict of the PROJECTED_TWEET_COLUMNS fields (None for missing fields)
+    """
+    return {name: get_field(tweet, path) for name, path in PROJECTED_TWEET_FIELDS.items()}
+
+
+def is_projected(columns):
+    """
+    Arg:
+        columns: names of the cols of a df of hydrated tweets (iterable of str)
+    Returns:
+        is_projected: are the tweets projected (flat fields), rather than full tweets? (bool)
+    """
+    return "place_country_code" in set(columns)
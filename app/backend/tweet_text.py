@@ -0,0 +1,205 @@
+"""
+
+    tweet_text.py
+
+    Compiled, reusable text processing for tweets. Gives the same output as the original
+    'clean_text', 'parse_hashtags' and 'count_hashtags' (see benchmarks/reference_preprocessing.py),
+    but does all of its setup (stopwords, punctuation table, regexes, emoji set)
+    once instead of on every tweet.
+
+    Running this file directly compares the throughput of the normalizer against
+    'clean_text'.
+
+"""
+import re
+import time
+import emoji
+import pandas as pd
+from nltk.corpus import stopwords
+
+# punctuation removed from tweets (keep hashtags)
+PUNCTUATION = '''!()-[]{};:'"\\,<>./?@$%^&*_~'''
+
+# columns derived from the "full_text" field
+TEXT_COLUMNS = ["tokenized_text", "hashtags_list",
+                "non_hashtags_list", "hashtag_count"]
+
+
+class TweetTextNormalizer:
+    """
+    Cleans and tokenizes tweets. Build it once and reuse it for every tweet.
+
+    Args:
+        stopwords_list: words to drop from the tokenized text (defaults to nltk's english stopwords)
+    """
+
+    def __init__(self, stopwords_list=None):
+
+        if stopwords_list is None:
+            stopwords_list = stopwords.words("english")
+
+        self.stopwords = frozenset(stopwords_list)
+        self.punctuation_table = str.maketrans("", "", PUNCTUATION)
+
+        # 'remove_emoji' checks single characters against the emoji lookup, so only
+        # the single-character keys can ever match
+        self.emoji_chars = frozenset(
+            key for key in emoji.UNICODE_EMOJI if len(key) == 1)
+
+        # add space between # and another char before it (e.g., split yes#baseball into yes #baseball)
+        self.hashtag_boundary_regex = re.compile(r"([a-zA-Z0-9])#")
+
+    def tokenize(self, text):
+        """
+        Removes punctuation, emojis, non-ascii characters and links, does string split
+        (tokenization) and removes stopwords
+
+        Args:
+            text: tweet/text to clean (str)
+        Returns:
+            tokenized_text_arr: tokenized and cleaned text (list of strings)
+        """
+
+        # remove punctuation, split on whitespace (this also removes \n and \t)
+        words = text.translate(self.punctuation_table).split()
+
+        # remove words that have emojis in them
+        if self.emoji_chars:
+            words = [word for word in words if self.emoji_chars.isdisjoint(word)]
+
+        # remove chars that don't have an ascii equivalent
+        text_no_escape = " ".join(words).encode(
+            "ascii", "ignore").decode("ascii")
+
+        text_no_escape = self.hashtag_boundary_regex.sub(
+            r"\1 #", text_no_escape)
+
+        stopwords_set = self.stopwords
+
+        return [word for word in text_no_escape.lower().split(" ")
+                if word and "http" not in word and word not in stopwords_set]
+
+    __call__ = tokenize
+
+
+class TweetTextAnalyzer:
+    """
+    Gets the tokenized text, hashtags, non-hashtag words and hashtag count of tweets,
+    with a single scan of the words in each tweet.
+
+    Args:
+        normalizer: normalizer used to tokenize the text (TweetTextNormalizer, built if not given)
+    """
+
+    def __init__(self, normalizer=None):
+
+        if normalizer is None:
+            normalizer = TweetTextNormalizer()
+
+        self.normalizer = normalizer
+
+    def analyze(self, text):
+        """
+        Analyzes a single tweet
+
+        Args:
+            text: tweet/piece of text (str)
+        Returns:
+            tokenized_text: tokenized and cleaned text (list of strings)
+            hashtags_list: array of hashtags (list of strings)
+            non_hashtags_list: array of non-hashtag words (list of strings)
+            hashtag_count: number of words with a hashtag (#) in them (int)
+        """
+        words = text.split(" ")
+        hashtags_list = []
+        non_hashtags_list = []
+
+        for word in words:
+            if "#" not in word:
+                non_hashtags_list.append(word)
+            elif word.count("#") > 1:
+                # if multiple hashtag words are squished together, split them on '#'
+                hashtags_list.extend(
+                    ["#" + inner_word for inner_word in word.split("#")])
+            else:
+                hashtags_list.append(word)
+
+        hashtag_count = len(words) - len(non_hashtags_list)
+
+        return (self.normalizer.tokenize(text), hashtags_list, non_hashtags_list, hashtag_count)
+
+    def analyze_series(self, texts):
+        """
+        Analyzes a whole column of tweets
+
+        Args:
+            texts: "full_text" column of the tweets df (pandas Series of str)
+        Returns:
+            text_df: pandas df, indexed like 'texts', with one col per name in TEXT_COLUMNS
+        """
+        results = list(zip(*map(self.analyze, texts))) or [()] * len(TEXT_COLUMNS)
+
+        text_df = pd.DataFrame({col: pd.Series(list(values), index=texts.index, dtype=object)
+                                for col, values in zip(TEXT_COLUMNS[:-1], results)},
+                               index=texts.index)
+        text_df["hashtag_count"] = pd.Series(
+            results[-1], index=texts.index, dtype="int64")
+
+        return text_df
+
+
+def compare_throughput(texts, num_repeats=3):
+    """
+    Times the normalizer against the reference 'clean_text' (benchmarks/reference_preprocessing.py)
+    on the same texts
+
+    Args:
+        texts: tweets to tokenize (list of str)
+        num_repeats: number of timed passes over 'texts' (int); the fastest pass is kept
+    Returns:
+        results: dict with the tweets/sec of each implementation and the speedup
+    """
+    from benchmarks.reference_preprocessing import clean_text
+
+    normalizer = TweetTextNormalizer()
+
+    if [normalizer.tokenize(text) for text in texts] != [clean_text(text) for text in texts]:
+        raise ValueError("Normalizer output does not match 'clean_text'")
+
+    def best_time(func):
+        times = []
+        for _ in range(num_repeats):
+            start = time.perf_counter()
+            for text in texts:
+                func(text)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    clean_text_seconds = best_time(clean_text)
+    normalizer_seconds = best_time(normalizer.tokenize)
+
+    return {"num_tweets": len(texts),
+            "clean_text_tweets_per_sec": len(texts) / clean_text_seconds,
+            "normalizer_tweets_per_sec": len(texts) / normalizer_seconds,
+            "speedup": clean_text_seconds / normalizer_seconds}
+
+
+if __name__ == "__main__":
+
+    SAMPLE_TWEETS = [
+        "Stay home, stay safe!! #COVID19 #StayHome https://t.co/abc123",
+        "The vaccine rollout in CA is finally picking up speed 💉🎉 #vaccine",
+        "Day 300 of #lockdown#quarantine... I've watched everything on Netflix 😂",
+        "@CDCgov new guidance: wear a mask indoors & keep 6ft apart.\nRead more: http://cdc.gov",
+        "Cases in NY are up 12% this week (source: @nytimes) #coronavirus\t#NYC",
+        "¿Dónde puedo vacunarme? #COVID19 #vacuna",
+    ]
+
+    results = compare_throughput(SAMPLE_TWEETS * 2000)
+
+    print(f"Tokenized {results['num_tweets']} tweets")
+    print(
+        f"clean_text: {results['clean_text_tweets_per_sec']:,.0f} tweets/sec")
+    print(
+        f"TweetTextNormalizer: {results['normalizer_tweets_per_sec']:,.0f} tweets/sec")
+    print(f"Speedup: {results['speedup']:.1f}x")